@@ -0,0 +1,50 @@
+import time
+import logging
+import threading
+
+# Set up logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Registro de clientes boto3: una sola Session y un cliente por (servicio, región),
+# creados en el primer uso. Importar este módulo (o los que lo usan) no toca AWS,
+# así que los tests y las corridas locales no necesitan credenciales ni región.
+_session = None
+_clients = {}
+_lock = threading.Lock()
+
+# Reintentos y pool de conexiones (el hilo de notify_error y el flujo principal comparten clientes)
+_CONFIG_OPTIONS = {
+    "retries": {"max_attempts": 3, "mode": "standard"},
+    "max_pool_connections": 10,
+    "connect_timeout": 5,
+    "read_timeout": 30,
+}
+
+
+def _get_session():
+    global _session
+    if _session is None:
+        start = time.time()
+        # boto3 se importa acá: su import pesa en el cold start aunque no se use
+        import boto3
+        _session = boto3.session.Session()
+        logger.info(f"[aws] boto3 Session creada en {time.time() - start:.3f}s")
+    return _session
+
+
+def get_client(service_name, region_name=None):
+    """Devuelve el cliente compartido de service_name, creándolo la primera vez."""
+    key = (service_name, region_name)
+    client = _clients.get(key)
+    if client is not None:
+        return client
+    with _lock:
+        if key not in _clients:
+            from botocore.config import Config
+            start = time.time()
+            _clients[key] = _get_session().client(
+                service_name, region_name=region_name, config=Config(**_CONFIG_OPTIONS)
+            )
+            logger.info(f"[aws] Cliente {service_name} creado en {time.time() - start:.3f}s")
+        return _clients[key]
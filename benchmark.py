@@ -0,0 +1,334 @@
+import os
+import sys
+import json
+import math
+import time
+import random
+import logging
+import argparse
+import threading
+from collections import defaultdict
+from datetime import datetime
+from urllib.parse import urlsplit
+
+# Set up logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+# Benchmark end-to-end: corre lambda_handler por bucket_type contra mock_dgr_server.py
+# con datos sintéticos en Mongo y reporta p50/p95 por fase (carga del bucket, sesión,
+# fill_form_*, submit y total).
+#
+#   python benchmark.py --runs 5 --latency-ms 150 --jitter-ms 50
+#   python benchmark.py --runs 5 --json resultados.json
+#   python benchmark.py --runs 5 --baseline resultados.json --max-regression 20
+#
+# Mongo: MONGODB_URI apuntando a un mongod local (los datos se cargan en su base
+# "production" y se borran al terminar) o --mongo mongomock si está instalado (mongomock
+# no soporta todas las etapas de agregación: con load_bucket conviene un mongod).
+# S3/SQS/SNS: AWS_ENDPOINT_URL (localstack, moto_server). Sin endpoint, si moto está
+# instalado se levanta un moto_server local.
+
+BUCKET_TYPES = ["Persona", "ACF", "Automotor", "Inmueble", "Ampliación"]
+
+# Colecciones donde el benchmark deja documentos (se limpian al terminar)
+_SEEDED_COLLECTIONS = ["bucket", "persona_fisica", "persona_juridica", "automotores", "inmuebles", "ampliacion"]
+
+_NOMBRES = ["JUAN", "MARIA", "ANA", "PEDRO", "LUCIA", "DIEGO"]
+_APELLIDOS = ["PEREZ", "GONZALEZ", "RODRIGUEZ", "FERNANDEZ", "LOPEZ"]
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Datos sintéticos
+# ──────────────────────────────────────────────────────────────────────────────
+
+def _persona_fisica(rnd, bucket_id):
+    return {
+        "id_bucket": bucket_id, "benchmark": True,
+        "ci": str(rnd.randint(10000000, 59999999)),
+        "primerApellido": rnd.choice(_APELLIDOS), "segundoApellido": rnd.choice(_APELLIDOS),
+        "primerNombre": rnd.choice(_NOMBRES), "segundoNombre": rnd.choice(_NOMBRES),
+        "interdicciones": rnd.random() < 0.5, "comercio": rnd.random() < 0.5, "prendas": rnd.random() < 0.5,
+    }
+
+
+def _persona_juridica(rnd, bucket_id):
+    return {
+        "id_bucket": bucket_id, "benchmark": True,
+        "rut": str(rnd.randint(10 ** 11, 10 ** 12 - 1)),
+        "nombre": f"{rnd.choice(_APELLIDOS)} Y ASOCIADOS S.A.",
+        "interdicciones": True, "comercio": rnd.random() < 0.5, "prendas": rnd.random() < 0.5,
+        "acf": rnd.random() < 0.5,
+    }
+
+
+def _automotor(rnd, bucket_id):
+    from mock_dgr_server import DEPARTAMENTOS, LOCALIDADES, MARCAS, MODELOS, TIPOS_AUTOMOTOR
+    return {
+        "id_bucket": bucket_id, "benchmark": True,
+        "padronActual": str(rnd.randint(100000, 999999)),
+        "departamento": rnd.choice(DEPARTAMENTOS), "localidad": rnd.choice(LOCALIDADES),
+        "marca": rnd.choice(MARCAS), "modelo": rnd.choice(MODELOS), "tipoAutomotor": rnd.choice(TIPOS_AUTOMOTOR),
+        "placaMunicipal": f"SBA{rnd.randint(1000, 9999)}", "year": str(rnd.randint(1995, 2024)),
+        "padronAnterior1": str(rnd.randint(100000, 999999)),
+        "departamentoAnterior1": rnd.choice(DEPARTAMENTOS), "localidadAnterior1": rnd.choice(LOCALIDADES),
+    }
+
+
+def _inmueble(rnd, bucket_id):
+    from mock_dgr_server import DEPARTAMENTOS, LOCALIDADES
+    doc = {
+        "id_bucket": bucket_id, "benchmark": True,
+        "departamento": rnd.choice(DEPARTAMENTOS), "localidad": rnd.choice(LOCALIDADES),
+        "padronActual": str(rnd.randint(1000, 99999)), "seccionJudicial": str(rnd.randint(1, 24)),
+    }
+    # Padrones anteriores: 3 y 4 van directo, el 5 pasa por CargarOtro
+    for i in range(1, 4):
+        doc[f"padronAnterior{i}"] = str(rnd.randint(1000, 99999))
+        doc[f"localidadAnterior{i}"] = rnd.choice(LOCALIDADES)
+    return doc
+
+
+def seed(db, bucket_type, rnd, observations):
+    """Carga un bucket de bucket_type y devuelve el payload del mensaje SQS que lo procesa."""
+    from bson import ObjectId
+
+    bucket_id = ObjectId()
+    bucket = {"_id": bucket_id, "benchmark": True, "createdAt": datetime.utcnow()}
+    if bucket_type == "Ampliación":
+        # Una ampliación de un bucket ya enviado (la primera: no genera talón)
+        bucket["dgr_id"] = str(rnd.randint(2000000, 2999999))
+        db["bucket"].insert_one(bucket)
+        ampliacion_id = db["ampliacion"].insert_one(
+            {"id_bucket": bucket_id, "emisionAt": datetime.utcnow(), "benchmark": True}
+        ).inserted_id
+        return {"ampliacion_id": str(ampliacion_id), "bucket_type": bucket_type}
+
+    db["bucket"].insert_one(bucket)
+    builders = {
+        "Persona": [("persona_fisica", _persona_fisica), ("persona_juridica", _persona_juridica)],
+        "ACF": [("persona_juridica", _persona_juridica)],
+        "Automotor": [("automotores", _automotor)],
+        "Inmueble": [("inmuebles", _inmueble)],
+    }[bucket_type]
+    for collection, build in builders:
+        db[collection].insert_many([build(rnd, bucket_id) for _ in range(observations)])
+    return {"bucket_id": str(bucket_id), "bucket_type": bucket_type}
+
+
+def cleanup(db):
+    bucket_ids = [b["_id"] for b in db["bucket"].find({"benchmark": True}, {"_id": 1})]
+    ampliacion_ids = [a["_id"] for a in db["ampliacion"].find({"benchmark": True}, {"_id": 1})]
+    for collection in _SEEDED_COLLECTIONS:
+        db[collection].delete_many({"benchmark": True})
+    db["status"].delete_many({"id_bucket": {"$in": bucket_ids}})
+    db["status_ampliacion"].delete_many({"id_ampliacion": {"$in": ampliacion_ids}})
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Medición
+# ──────────────────────────────────────────────────────────────────────────────
+
+class PhaseTimer:
+    """Envuelve funciones para registrar cuánto tarda cada llamada, por bucket_type y fase."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.bucket_type = None
+        self.lock = threading.Lock()
+
+    def record(self, phase, seconds):
+        with self.lock:
+            self.samples[(self.bucket_type, phase)].append(seconds)
+
+    def wrap(self, owner, name, phase):
+        original = getattr(owner, name)
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.record(phase, time.perf_counter() - start)
+
+        setattr(owner, name, timed)
+
+
+def percentile(values, pct):
+    """Percentil por rango más cercano (con pocas corridas no interpola)."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def summarize(samples):
+    """{ "tipo/fase": {"n", "p50", "p95"} } ordenado por tipo y fase."""
+    return {
+        f"{bucket_type}/{phase}": {
+            "n": len(values),
+            "p50": round(percentile(values, 50), 3),
+            "p95": round(percentile(values, 95), 3),
+        }
+        for (bucket_type, phase), values in sorted(samples.items())
+    }
+
+
+def regressions(summary, baseline, max_regression):
+    """Fases cuyo p95 empeoró más de max_regression % respecto de baseline."""
+    found = []
+    for key, stats in summary.items():
+        before = baseline.get(key)
+        if before and before["p95"] > 0:
+            change = (stats["p95"] - before["p95"]) / before["p95"] * 100
+            if change > max_regression:
+                found.append((key, before["p95"], stats["p95"], change))
+    return found
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Entorno
+# ──────────────────────────────────────────────────────────────────────────────
+
+def _check_local_mongo(uri):
+    host = urlsplit(uri or "").hostname
+    if host not in ("localhost", "127.0.0.1", "::1"):
+        raise SystemExit(f"MONGODB_URI apunta a {host!r}: el benchmark escribe en 'production', usá un mongod local.")
+
+
+def _start_moto(port):
+    from moto.server import ThreadedMotoServer
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=port)
+    server.start()
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "benchmark")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "benchmark")
+    return server, f"http://127.0.0.1:{port}"
+
+
+def _prepare_aws():
+    """Crea el bucket, la cola y el tópico que usan submit y notify_error en el endpoint local."""
+    from aws_clients import get_client
+
+    get_client("s3").create_bucket(Bucket=os.environ["S3_BUCKET_NAME"])
+    os.environ["SQS_QUEUE_URL"] = get_client("sqs").create_queue(QueueName="benchmark-talones")["QueueUrl"]
+    os.environ["ERROR_SNS_TOPIC_ARN"] = get_client("sns", region_name="us-east-1").create_topic(
+        Name="benchmark-errores")["TopicArn"]
+
+
+def _print_summary(summary):
+    print(f"{'tipo/fase':<36}{'n':>4}{'p50 (s)':>10}{'p95 (s)':>10}")
+    for key, stats in summary.items():
+        print(f"{key:<36}{stats['n']:>4}{stats['p50']:>10.3f}{stats['p95']:>10.3f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark end-to-end de lambda_handler contra el mock de DGR.")
+    parser.add_argument("--types", default=",".join(BUCKET_TYPES), help="bucket_types a correr, separados por coma")
+    parser.add_argument("--runs", type=int, default=5, help="records por bucket_type")
+    parser.add_argument("--observations", type=int, default=2, help="observaciones por bucket")
+    parser.add_argument("--cold", action="store_true", help="descartar el Chrome entre records (arranque en frío)")
+    parser.add_argument("--mongo", choices=["uri", "mongomock"], default="uri",
+                        help="uri = MONGODB_URI (mongod local); mongomock = en memoria")
+    parser.add_argument("--base-url", help="usar un mock_dgr_server ya levantado en vez de uno propio")
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--viewer-error-rate", type=float, default=0)
+    parser.add_argument("--recordings", metavar="DIR")
+    parser.add_argument("--moto-port", type=int, default=5055)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", metavar="FILE", help="guardar el resumen en FILE")
+    parser.add_argument("--baseline", metavar="FILE", help="resumen previo (--json) contra el cual comparar p95")
+    parser.add_argument("--max-regression", type=float, default=20, help="%% de empeoramiento de p95 tolerado")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s %(message)s")
+
+    types = [t.strip() for t in args.types.split(",") if t.strip()]
+    unknown = [t for t in types if t not in BUCKET_TYPES]
+    if unknown:
+        parser.error(f"bucket_types desconocidos: {unknown}")
+
+    mock = None
+    if not args.base_url:
+        from mock_dgr_server import start_server
+        mock = start_server(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+                            viewer_error_rate=args.viewer_error_rate, recordings=args.recordings, seed=args.seed)
+    moto = None
+    if not os.environ.get("AWS_ENDPOINT_URL"):
+        try:
+            moto, os.environ["AWS_ENDPOINT_URL"] = _start_moto(args.moto_port)
+        except ImportError:
+            parser.error("definí AWS_ENDPOINT_URL (localstack/moto_server) o instalá moto")
+
+    # Todo lo que se lee al importar (DGR_BASE_URL, SQS_QUEUE_URL) tiene que estar antes del import
+    os.environ["DGR_BASE_URL"] = args.base_url or mock.base_url
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    os.environ.setdefault("DGR_USERNAME", "benchmark")
+    os.environ.setdefault("DGR_PASSWORD", "benchmark")
+    os.environ.setdefault("S3_BUCKET_NAME", "benchmark-talones")
+    os.environ.setdefault("NOTIFY_FLUSH_WINDOW_SECONDS", "1")
+    _prepare_aws()
+
+    import mongo
+    if args.mongo == "mongomock":
+        import mongomock
+        # El cliente compartido de mongo.py pasa a ser uno en memoria
+        mongo._client = mongomock.MongoClient()
+    else:
+        _check_local_mongo(os.environ.get("MONGODB_URI"))
+
+    import lambda_function
+    from session_manager import DriverSession, discard_driver
+
+    timer = PhaseTimer()
+    timer.wrap(lambda_function, "load_bucket", "mongo_load")
+    for name in ("fill_form_PF", "fill_form_PJ", "fill_form_AM", "fill_form_I", "fill_form_Ampliacion"):
+        timer.wrap(lambda_function, name, name.replace("fill_form_", "fill_"))
+    timer.wrap(lambda_function, "submit_form_and_generate_talon", "submit")
+    timer.wrap(DriverSession, "get", "session")
+
+    db = mongo.get_mongo_client()["production"]
+    rnd = random.Random(args.seed)
+    failures = defaultdict(int)
+    try:
+        for bucket_type in types:
+            timer.bucket_type = bucket_type
+            for run in range(args.runs):
+                payload = seed(db, bucket_type, rnd, args.observations)
+                event = {"Records": [{"messageId": f"{bucket_type}-{run}", "body": json.dumps(payload)}]}
+                start = time.perf_counter()
+                result = lambda_function.lambda_handler(event, None)
+                timer.record("total", time.perf_counter() - start)
+                failures[bucket_type] += len(result.get("batchItemFailures", []))
+                if args.cold:
+                    discard_driver()
+    finally:
+        discard_driver()
+        cleanup(db)
+        if moto:
+            moto.stop()
+        if mock:
+            mock.shutdown()
+
+    summary = summarize(timer.samples)
+    _print_summary(summary)
+    for bucket_type in types:
+        if failures[bucket_type]:
+            print(f"{bucket_type}: {failures[bucket_type]}/{args.runs} records fallaron")
+    if mock:
+        print(f"Requests al mock: {sum(mock.dgr.requests.values())}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(summary, json.load(f), args.max_regression)
+        for key, before, after, change in found:
+            print(f"REGRESIÓN {key}: p95 {before:.3f}s -> {after:.3f}s (+{change:.0f}%)")
+        if found:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+import os
+import sys
+import time
+import glob
+import random
+import shutil
+import logging
+import argparse
+import statistics
+from tempfile import mkdtemp
+
+# Set up logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+CHROME_BINARY = "/opt/chrome/chrome"
+# Perfil ya inicializado que se arma en el build de la imagen (ver Dockerfile)
+PROFILE_TEMPLATE_DIR = "/opt/chrome-profile"
+
+# Flags que evitan trabajo de arranque que no usamos (extensiones, sync, updates, etc.)
+FAST_START_FLAGS = [
+    "--disable-extensions",
+    "--disable-component-extensions-with-background-pages",
+    "--disable-background-networking",
+    "--disable-component-update",
+    "--disable-default-apps",
+    "--disable-sync",
+    "--disable-translate",
+    "--no-first-run",
+    "--no-default-browser-check",
+    "--mute-audio",
+    "--metrics-recording-only",
+]
+
+# Requests que no hacen falta para completar formularios, por categoría
+BLOCKED_URL_PATTERNS = {
+    "images": ["*.png", "*.jpg", "*.jpeg", "*.gif", "*.svg", "*.ico", "*.webp", "*.bmp"],
+    "fonts": ["*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot"],
+    "analytics": ["*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*", "*hotjar*"],
+}
+
+USER_AGENT_POOL_SIZE = 20
+_user_agent_pool = None
+
+
+def prepare_profile_dir():
+    """
+    Crea el user-data-dir del driver. Si existe el template (CHROME_PROFILE_TEMPLATE,
+    default /opt/chrome-profile) lo copia, así Chrome arranca con el perfil ya creado.
+    """
+    profile_dir = mkdtemp()
+    template = os.environ.get("CHROME_PROFILE_TEMPLATE", PROFILE_TEMPLATE_DIR)
+    if template and os.path.isdir(template):
+        start = time.time()
+        shutil.copytree(template, profile_dir, dirs_exist_ok=True)
+        logger.info(f"[browser] Perfil copiado desde {template} en {time.time() - start:.3f}s")
+    return profile_dir
+
+
+def get_user_agent():
+    """User-agent de Chrome al azar de un pool que se carga una vez por contenedor."""
+    global _user_agent_pool
+    if _user_agent_pool is None:
+        start = time.time()
+        from fake_useragent import UserAgent
+        ua = UserAgent()
+        _user_agent_pool = list({ua.chrome for _ in range(USER_AGENT_POOL_SIZE)})
+        logger.info(f"[browser] Pool de {len(_user_agent_pool)} user-agents cargado en {time.time() - start:.3f}s")
+    return random.choice(_user_agent_pool)
+
+
+def blocked_url_patterns():
+    """Patrones a bloquear según CHROME_BLOCKED_RESOURCES (default "images,fonts,analytics"; vacío = nada)."""
+    categories = os.environ.get("CHROME_BLOCKED_RESOURCES", "images,fonts,analytics")
+    patterns = []
+    for category in [c.strip() for c in categories.split(",") if c.strip()]:
+        patterns.extend(BLOCKED_URL_PATTERNS.get(category, []))
+    return patterns
+
+
+def block_resources(driver, patterns=None):
+    """Bloquea vía CDP las URLs que matchean los patrones (una lista vacía explícita desbloquea todo)."""
+    if patterns is None:
+        patterns = blocked_url_patterns()
+        if not patterns:
+            return
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+    except Exception as e:
+        logger.warning(f"[browser] No pude bloquear recursos: {e}")
+
+
+def build_profile_template(template_dir):
+    """Levanta Chrome una vez con template_dir como perfil y lo deja listo para copiar."""
+    from login import create_driver, quit_driver
+
+    os.makedirs(template_dir, exist_ok=True)
+    os.environ["CHROME_PROFILE_TEMPLATE"] = ""
+    driver = create_driver(user_data_dir=template_dir)
+    try:
+        driver.get("about:blank")
+    finally:
+        quit_driver(driver)
+    # Locks y sockets de la instancia que ya no existe
+    for lock in glob.glob(os.path.join(template_dir, "Singleton*")):
+        os.remove(lock)
+    logger.info(f"[browser] Template de perfil generado en {template_dir}")
+
+
+# Flags de create_driver antes de este módulo (sin FAST_START_FLAGS)
+BASELINE_FLAGS = [
+    "--headless=new",
+    "--no-sandbox",
+    "--disable-gpu",
+    "--window-size=1280x1696",
+    "--single-process",
+    "--disable-dev-shm-usage",
+    "--disable-dev-tools",
+    "--no-zygote",
+]
+
+
+def create_baseline_driver():
+    """
+    Reproduce el arranque anterior para comparar: Chrome completo, perfil vacío, los
+    flags de BASELINE_FLAGS, un UserAgent() nuevo por driver y sin bloqueo de recursos.
+    """
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+    from selenium.webdriver.chrome.options import Options
+    from fake_useragent import UserAgent
+
+    temp_dirs = [mkdtemp(), mkdtemp(), mkdtemp()]
+    options = Options()
+    options.binary_location = CHROME_BINARY
+    for flag in BASELINE_FLAGS:
+        options.add_argument(flag)
+    options.add_argument(f"--user-data-dir={temp_dirs[0]}")
+    options.add_argument(f"--data-path={temp_dirs[1]}")
+    options.add_argument(f"--disk-cache-dir={temp_dirs[2]}")
+    options.add_argument(f"user-agent={UserAgent().chrome}")
+    options.add_experimental_option("prefs", {
+        "download.default_directory": "/tmp",
+        "download.prompt_for_download": False,
+        "download.directory_upgrade": True,
+        "safebrowsing.enabled": True,
+        "plugins.always_open_pdf_externally": True
+    })
+    driver = webdriver.Chrome(service=Service("/opt/chromedriver"), options=options)
+    driver._temp_dirs = temp_dirs
+    driver.execute_cdp_cmd("Page.setDownloadBehavior", {"behavior": "allow", "downloadPath": "/tmp"})
+    return driver
+
+
+def benchmark_startup(factory, runs=3):
+    """Mide factory() (crear el driver) + primera navegación. Devuelve los tiempos en segundos."""
+    from login import quit_driver
+
+    timings = []
+    for _ in range(runs):
+        start = time.time()
+        driver = factory()
+        driver.get("about:blank")
+        timings.append(time.time() - start)
+        quit_driver(driver)
+    return timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Template de perfil de Chrome y benchmark de arranque.")
+    parser.add_argument("--build-template", metavar="DIR", help="generar el template de perfil en DIR")
+    parser.add_argument("--benchmark", type=int, metavar="RUNS", help="comparar arranque anterior vs. actual")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    if args.build_template:
+        build_profile_template(args.build_template)
+    if args.benchmark:
+        from login import create_driver
+        for name, factory in (("antes", create_baseline_driver), ("ahora", create_driver)):
+            timings = benchmark_startup(factory, args.benchmark)
+            print(f"{name}: mediana {statistics.median(timings):.2f}s "
+                  f"(min {min(timings):.2f}s, max {max(timings):.2f}s, {len(timings)} corridas)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,12 @@
+import os
+from urllib.parse import urlsplit
+
+# Base de las URLs de DGR. Se puede apuntar a otro host (ej. mock_dgr_server.py en
+# http://127.0.0.1:8765) con DGR_BASE_URL, sin tocar los fill_form_*.
+DGR_BASE_URL = os.environ.get("DGR_BASE_URL", "https://www.dgr.gub.uy").rstrip("/")
+DGR_HOST = urlsplit(DGR_BASE_URL).hostname
+
+
+def dgr_url(path):
+    """URL absoluta de DGR para path (ej. "/sr/principal.jsf")."""
+    return DGR_BASE_URL + path
@@ -0,0 +1,135 @@
+import os
+import json
+import time
+import shutil
+import ctypes
+import ctypes.util
+import logging
+import select
+import struct
+import tempfile
+
+from notify_error import notify_error
+
+# Set up logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+DOWNLOAD_ROOT = "/tmp"
+
+# Constantes de inotify (linux/inotify.h)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+def create_download_dir(prefix="talon_"):
+    """Crea un directorio de descarga exclusivo para este request dentro de /tmp."""
+    return tempfile.mkdtemp(prefix=prefix, dir=DOWNLOAD_ROOT)
+
+
+def remove_download_dir(download_dir):
+    shutil.rmtree(download_dir, ignore_errors=True)
+
+
+def set_download_dir(driver, download_dir):
+    """Redirige las descargas de Chrome al directorio indicado."""
+    driver.execute_cdp_cmd(
+        "Page.setDownloadBehavior",
+        {"behavior": "allow", "downloadPath": download_dir}
+    )
+    try:
+        driver.execute_cdp_cmd(
+            "Browser.setDownloadBehavior",
+            {"behavior": "allow", "downloadPath": download_dir}
+        )
+    except Exception as e:
+        logger.debug(f"[downloads] Browser.setDownloadBehavior no disponible: {e}")
+
+
+def _find_pdf(download_dir):
+    for fname in os.listdir(download_dir):
+        if fname.lower().endswith(".pdf"):
+            return os.path.join(download_dir, fname)
+    return None
+
+
+class _Inotify:
+    """Watcher mínimo de inotify vía ctypes (sin dependencias extra en la imagen de Lambda)."""
+
+    def __init__(self, path, mask):
+        libc_name = ctypes.util.find_library("c")
+        if not libc_name:
+            raise OSError("libc no encontrada")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 falló")
+        if self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask) < 0:
+            os.close(self.fd)
+            raise OSError(ctypes.get_errno(), "inotify_add_watch falló")
+
+    def read_names(self, timeout):
+        """Espera hasta timeout segundos y devuelve los nombres de archivo de los eventos."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        names, offset = [], 0
+        while offset < len(data):
+            _, _, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            names.append(data[offset:offset + length].rstrip(b"\0").decode(errors="replace"))
+            offset += length
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+
+def wait_for_download_to_complete(download_dir, click_timestamp, timeout=60):
+    """
+    Espera a que aparezca un .pdf terminado en download_dir (que debe ser exclusivo del
+    request, ver create_download_dir). Usa inotify y, si no está disponible, polling.
+    Retorna {"path": ruta_del_pdf} o {"path": None, ...} en timeout.
+    """
+    start_time = time.time()
+    logger.info(f"[wait_for_download] Iniciando. Observando {download_dir} desde timestamp={click_timestamp}")
+
+    watcher = None
+    try:
+        watcher = _Inotify(download_dir, IN_CLOSE_WRITE | IN_MOVED_TO)
+    except (OSError, AttributeError) as e:
+        logger.info(f"[wait_for_download] inotify no disponible ({e}). Uso polling.")
+
+    try:
+        # Puede que el PDF ya esté (descarga muy rápida antes de armar el watcher)
+        path = _find_pdf(download_dir)
+        while path is None and time.time() - start_time < timeout:
+            if watcher is not None:
+                names = watcher.read_names(timeout=0.5)
+                if any(n.lower().endswith(".pdf") for n in names):
+                    path = _find_pdf(download_dir)
+                    continue
+            else:
+                time.sleep(0.2)
+            path = _find_pdf(download_dir)
+    finally:
+        if watcher is not None:
+            watcher.close()
+
+    if path:
+        logger.info(f"[wait_for_download] Encontré PDF nuevo: {path} ({time.time() - start_time:.2f}s)")
+        return {"path": path}
+
+    final_list = os.listdir(download_dir)
+    logger.error(f"[wait_for_download] Timeout tras {timeout}s. Contenido final de {download_dir}: {final_list}")
+    notify_error(f"[wait_for_download] Timeout tras {timeout}s. Contenido final de {download_dir}: {final_list}")
+    return {
+        "path": None,
+        "statusCode": 500,
+        "body": json.dumps({'ERROR': "PDF download timed out"})
+    }
@@ -2,24 +2,20 @@ import logging
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait, Select
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException,StaleElementReferenceException
-from human_functions import human_click, human_type, human_select
+from selenium.common.exceptions import StaleElementReferenceException
+from human_functions import human_click, type_text, human_select
 from notify_error import notify_error
-import time
-import random
+from request_filter import navigate
+from tracing import span, traced
+from dgr_urls import dgr_url
+from waits import wait_for_field_value, mark_submit, wait_for_submit_outcome
+from locator_cache import cached_element
+from select_index import option_index
 
 # Set up logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-def pick_option_by_text(select_el, text_busqueda):
-    sel = Select(select_el)
-    wanted = text_busqueda.strip().upper()
-    for o in sel.options:
-        if o.text.strip().upper() == wanted:
-            return o, sel
-    return None, sel
-
 def force_change(driver, select_el, value):
     driver.execute_script("""
         const el = arguments[0];
@@ -33,7 +29,7 @@ def force_change(driver, select_el, value):
     """, select_el, value)
     
 
-def fill_form_AM(bucket_id, driver, client):
+def fill_form_AM(bucket_id, driver, client, observaciones=None):
     logger.info(f"Starting Automotor for Bucket ID: {bucket_id}")
     critical_errors = []     # Errores que implican fallo antes de iterar observaciones
     submission_errors = []   # Errores de cada envío de formulario
@@ -54,10 +50,10 @@ def fill_form_AM(bucket_id, driver, client):
     # 2) Intentar recuperar observaciones
     try:
         logger.info(f"Retrieving observations for bucket_id: {bucket_id}...")
-        filtro = {"id_bucket": bucket_id}
-        observaciones = automotores_db.find(filtro)
-        total = automotores_db.count_documents(filtro)
-        logger.info(f"Retrieved {total} observations for bucket_id: {bucket_id}.")
+        # Si el dispatcher ya las trajo (observations.load_bucket) no vuelvo a consultar
+        if observaciones is None:
+            observaciones = list(automotores_db.find({"id_bucket": bucket_id}))
+        logger.info(f"Retrieved {len(observaciones)} observations for bucket_id: {bucket_id}.")
     except Exception as e:
         msg = f"Critical: Error retrieving observations from MongoDB for bucket_id {bucket_id}. Error: {str(e)}"
         logger.error(msg)
@@ -67,7 +63,7 @@ def fill_form_AM(bucket_id, driver, client):
 
     # 3) Cargar la página del formulario
     try:
-        driver.get("http://www.dgr.gub.uy/etimbreapp/servlet/hsolicitudform?3")
+        navigate(driver, dgr_url("/etimbreapp/servlet/hsolicitudform?3"))
         logger.info("Logged in and navigated to the form page.")
     except Exception as e:
         msg = f"Critical: Error initializing the WebDriver or loading form for bucket_id {bucket_id}. Error: {str(e)}"
@@ -76,7 +72,7 @@ def fill_form_AM(bucket_id, driver, client):
         return {"status": "critical_error", "errors": critical_errors}
 
     # 4) Iterar cada observación
-    for observacion in observaciones:
+    for observacion in traced(observaciones, "fill_AM.observation"):
         observation_id = observacion.get('_id', 'desconocido')
         obs_errors = []   # Errores solo de esta observación
         logger.info(f"Processing observation ID: {observation_id}...")
@@ -104,10 +100,10 @@ def fill_form_AM(bucket_id, driver, client):
             try:
                 if padronActual:
                     logger.info(f"Entering Padron Actual: {padronActual}")
-                    field = driver.find_element(By.ID, "CTLPADRONAUT2")
+                    field = cached_element(driver, By.ID, "CTLPADRONAUT2")
                     human_click(driver, field)
                     field.clear()
-                    human_type(field, padronActual)
+                    type_text(driver, field, padronActual, form="AM", field="CTLPADRONAUT2")
                     logger.info(f"Successfully entered Padron Actual: {padronActual}")
             except Exception as e:
                 msg = f"[Obs {observation_id}] Error entering Padron Actual: {str(e)}"
@@ -118,9 +114,9 @@ def fill_form_AM(bucket_id, driver, client):
             try:
                 if departamento:
                     logger.info(f"Selecting Departamento: {departamento}")
-                    select_element = driver.find_element(By.NAME, "_DEPAUT")
+                    select_element = cached_element(driver, By.NAME, "_DEPAUT")
                     select = Select(select_element)
-                    human_select(select, departamento)
+                    human_select(select, departamento, cache_key="_DEPAUT")
                     logger.info(f"Successfully selected Departamento: {departamento}")
             except Exception as e:
                 msg = f"[Obs {observation_id}] Error selecting Departamento: {str(e)}"
@@ -132,10 +128,9 @@ def fill_form_AM(bucket_id, driver, client):
             try:
                 if localidad:
                     logger.info(f"Selecting localidad: {localidad}")
-                    select_element = driver.find_element(By.NAME, "CTLLOCAUT2")
+                    select_element = cached_element(driver, By.NAME, "CTLLOCAUT2")
                     select = Select(select_element)
-                    time.sleep(random.uniform(0.1, 0.3))
-                    human_select(select, localidad)
+                    human_select(select, localidad, cache_key=("CTLLOCAUT2", departamento))
                     logger.info(f"Successfully selected localidad: {localidad}")
             except Exception as e:
                 msg = f"[Obs {observation_id}] Error selecting localidad: {str(e)}"
@@ -154,26 +149,26 @@ def fill_form_AM(bucket_id, driver, client):
                     marca_sel = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, marca_css)))
                     human_click(driver, marca_sel)
 
-                    wait.until(lambda d: len(Select(d.find_element(By.CSS_SELECTOR, marca_css)).options) > 2)
+                    wait.until(lambda d: len(Select(cached_element(d, By.CSS_SELECTOR, marca_css)).options) > 2)
 
-                    opt, sel_obj = pick_option_by_text(marca_sel, marca)
-                    if not opt:
-                        opts = [o.text for o in sel_obj.options]
-                        msg = f"[Obs {observation_id}] Marca '{marca}' no encontrada. Opciones: {opts}"
+                    index = option_index(marca_sel)
+                    match = index.lookup(marca, fuzzy=False)
+                    if not match:
+                        msg = f"[Obs {observation_id}] Marca '{marca}' no encontrada. Opciones: {index.texts()}"
                         logger.error(msg)
                         obs_errors.append(msg)
                     else:
-                        value = opt.get_attribute("value")
-                        sel_obj.select_by_value(value)
+                        value = match[0]
+                        Select(marca_sel).select_by_value(value)
                         force_change(driver, marca_sel, value)
 
-                        wait.until(lambda d: d.find_element(By.CSS_SELECTOR, marca_css).get_attribute("value") == value)
+                        wait.until(lambda d: cached_element(d, By.CSS_SELECTOR, marca_css).get_attribute("value") == value)
                         logger.info(f"Successfully selected Marca: {marca} (value={value})")
 
             except StaleElementReferenceException as e:
                 # ¿Quedó bien seleccionada? Si sí → warning y seguimos.
                 try:
-                    sel_now = Select(driver.find_element(By.CSS_SELECTOR, marca_css))
+                    sel_now = Select(cached_element(driver, By.CSS_SELECTOR, marca_css))
                     txt_now = sel_now.first_selected_option.text.strip().upper()
                     if txt_now == marca.strip().upper():
                         logger.warning(f"Stale en Marca pero ya está seleccionada. Ignorando.")
@@ -200,20 +195,20 @@ def fill_form_AM(bucket_id, driver, client):
                     human_click(driver, modelo_sel)
 
                     # Esperar opciones reales
-                    wait.until(lambda d: len(Select(d.find_element(By.CSS_SELECTOR, modelo_css)).options) > 1)
-
-                    # Re-find y pick
-                    modelo_sel = driver.find_element(By.CSS_SELECTOR, modelo_css)
-                    opt, sel_obj = pick_option_by_text(modelo_sel, modelo)
-                    if not opt:
-                        opts = [o.text for o in sel_obj.options]
-                        msg = f"[Obs {observation_id}] Modelo '{modelo}' no encontrado. Opciones: {opts}"
+                    wait.until(lambda d: len(Select(cached_element(d, By.CSS_SELECTOR, modelo_css)).options) > 1)
+
+                    # Pick (el handle de la cache se re-resuelve solo si GeneXus regeneró el select)
+                    modelo_sel = cached_element(driver, By.CSS_SELECTOR, modelo_css)
+                    index = option_index(modelo_sel)
+                    match = index.lookup(modelo, fuzzy=False)
+                    if not match:
+                        msg = f"[Obs {observation_id}] Modelo '{modelo}' no encontrado. Opciones: {index.texts()}"
                         logger.error(msg); obs_errors.append(msg)
                     else:
-                        value = opt.get_attribute("value")
-                        sel_obj.select_by_value(value)
+                        value = match[0]
+                        Select(modelo_sel).select_by_value(value)
                         force_change(driver, modelo_sel, value)
-                        wait.until(lambda d: d.find_element(By.CSS_SELECTOR, modelo_css).get_attribute("value") == value)
+                        wait.until(lambda d: cached_element(d, By.CSS_SELECTOR, modelo_css).get_attribute("value") == value)
                         logger.info(f"Successfully selected modelo: {modelo} (value={value})")
 
             except Exception as e:
@@ -235,28 +230,25 @@ def fill_form_AM(bucket_id, driver, client):
 
                     # 2) Esperar a que aparezca la opción buscada (no solo >1 opción)
                     wait.until(
-                        lambda d: any(
-                            o.text.strip().upper() == tipo.strip().upper()
-                            for o in Select(d.find_element(By.CSS_SELECTOR, tipo_css)).options
-                        )
+                        lambda d: option_index(cached_element(d, By.CSS_SELECTOR, tipo_css)).lookup(tipo, fuzzy=False)
                     )
 
-                    # 3) Re-find (por si el DOM se regeneró)
-                    tipo_sel = driver.find_element(By.CSS_SELECTOR, tipo_css)
+                    # 3) Handle de la cache (se re-resuelve solo si el DOM se regeneró)
+                    tipo_sel = cached_element(driver, By.CSS_SELECTOR, tipo_css)
 
-                    opt, sel_obj = pick_option_by_text(tipo_sel, tipo)
-                    if not opt:
-                        opts = [o.text for o in sel_obj.options]
-                        msg = f"[Obs {observation_id}] Tipo '{tipo}' no encontrado. Opciones: {opts}"
+                    index = option_index(tipo_sel)
+                    match = index.lookup(tipo, fuzzy=False)
+                    if not match:
+                        msg = f"[Obs {observation_id}] Tipo '{tipo}' no encontrado. Opciones: {index.texts()}"
                         logger.error(msg); obs_errors.append(msg)
                     else:
-                        value = opt.get_attribute("value")
-                        sel_obj.select_by_value(value)
+                        value = match[0]
+                        Select(tipo_sel).select_by_value(value)
                         force_change(driver, tipo_sel, value)
 
-                        # 4) Validar con un find_element nuevo para evitar stale
+                        # 4) Validar contra el handle cacheado (si quedó stale se re-resuelve)
                         wait.until(
-                            lambda d: d.find_element(By.CSS_SELECTOR, tipo_css).get_attribute("value") == value
+                            lambda d: cached_element(d, By.CSS_SELECTOR, tipo_css).get_attribute("value") == value
                         )
                         logger.info(f"Successfully selected tipo: {tipo} (value={value})")
 
@@ -268,10 +260,10 @@ def fill_form_AM(bucket_id, driver, client):
             try:
                 if placaMunicipal:
                     logger.info(f"Entering Placa Municipal: {placaMunicipal}")
-                    field = driver.find_element(By.ID, "CTLPLACAMUNICIPALAUTEDIT")
+                    field = cached_element(driver, By.ID, "CTLPLACAMUNICIPALAUTEDIT")
                     human_click(driver, field)
                     field.clear()
-                    human_type(field, placaMunicipal)
+                    type_text(driver, field, placaMunicipal, form="AM", field="CTLPLACAMUNICIPALAUTEDIT")
                     logger.info(f"Successfully entered Placa Municipal: {placaMunicipal}")
             except Exception as e:
                 msg = f"[Obs {observation_id}] Error entering Placa Municipal: {str(e)}"
@@ -282,10 +274,10 @@ def fill_form_AM(bucket_id, driver, client):
             try:
                 if ano:
                     logger.info(f"Entering Año: {ano}")
-                    field = driver.find_element(By.ID, "CTLANOAUTEDIT")
+                    field = cached_element(driver, By.ID, "CTLANOAUTEDIT")
                     human_click(driver, field)
                     field.clear()
-                    human_type(field, ano)
+                    type_text(driver, field, ano, form="AM", field="CTLANOAUTEDIT")
                     logger.info(f"Successfully entered Año: {ano}")
             except Exception as e:
                 msg = f"[Obs {observation_id}] Error entering Año: {str(e)}"
@@ -296,10 +288,10 @@ def fill_form_AM(bucket_id, driver, client):
             try:
                 if padronAnterior1:
                     logger.info(f"Entering Padron Anterior 1: {padronAnterior1}")
-                    field = driver.find_element(By.ID, "CTLPADRONAUT3")
+                    field = cached_element(driver, By.ID, "CTLPADRONAUT3")
                     human_click(driver, field)
                     field.clear()
-                    human_type(field, padronAnterior1)
+                    type_text(driver, field, padronAnterior1, form="AM", field="CTLPADRONAUT3")
                     logger.info(f"Successfully entered Padron Anterior 1: {padronAnterior1}")
             except Exception as e:
                 msg = f"[Obs {observation_id}] Error entering Padron Anterior 1: {str(e)}"
@@ -310,9 +302,9 @@ def fill_form_AM(bucket_id, driver, client):
             try:
                 if departamentoAnterior1:
                     logger.info(f"Selecting Departamento Anterior 1: {departamentoAnterior1}")
-                    select_element = driver.find_element(By.NAME, "_DEPAUT2")
+                    select_element = cached_element(driver, By.NAME, "_DEPAUT2")
                     select = Select(select_element)
-                    human_select(select, departamentoAnterior1)
+                    human_select(select, departamentoAnterior1, cache_key="_DEPAUT2")
                     logger.info(f"Successfully selected Departamento Anterior 1: {departamentoAnterior1}")
             except Exception as e:
                 msg = f"[Obs {observation_id}] Error selecting Departamento Anterior 1: {str(e)}"
@@ -329,7 +321,7 @@ def fill_form_AM(bucket_id, driver, client):
                     )
                     human_click(driver, select_localidad1_element)
                     select = Select(select_localidad1_element)
-                    human_select(select, localidadAnterior1)
+                    human_select(select, localidadAnterior1, cache_key=("localidadAnterior1", departamentoAnterior1))
                     logger.info(f"Successfully selected Localidad Anterior 1: {localidadAnterior1}")
             except Exception as e:
                 msg = f"[Obs {observation_id}] Error selecting Localidad Anterior 1: {str(e)}"
@@ -340,10 +332,10 @@ def fill_form_AM(bucket_id, driver, client):
             try:
                 if placaMunicipal1:
                     logger.info(f"Entering Placa Municipal 1: {placaMunicipal1}")
-                    field = driver.find_element(By.ID, "CTLPLACAMUNICIPALAUT2")
+                    field = cached_element(driver, By.ID, "CTLPLACAMUNICIPALAUT2")
                     human_click(driver, field)
                     field.clear()
-                    human_type(field, placaMunicipal1)
+                    type_text(driver, field, placaMunicipal1, form="AM", field="CTLPLACAMUNICIPALAUT2")
                     logger.info(f"Successfully entered Placa Municipal 1: {placaMunicipal1}")
             except Exception as e:
                 msg = f"[Obs {observation_id}] Error entering Placa Municipal 1: {str(e)}"
@@ -354,10 +346,10 @@ def fill_form_AM(bucket_id, driver, client):
             try:
                 if padronAnterior2:
                     logger.info(f"Entering Padron Anterior 2: {padronAnterior2}")
-                    field = driver.find_element(By.ID, "CTLPADRONAUT4")
+                    field = cached_element(driver, By.ID, "CTLPADRONAUT4")
                     human_click(driver, field)
                     field.clear()
-                    human_type(field, padronAnterior2)
+                    type_text(driver, field, padronAnterior2, form="AM", field="CTLPADRONAUT4")
                     logger.info(f"Successfully entered Padron Anterior 2: {padronAnterior2}")
             except Exception as e:
                 msg = f"[Obs {observation_id}] Error entering Padron Anterior 2: {str(e)}"
@@ -368,9 +360,9 @@ def fill_form_AM(bucket_id, driver, client):
             try:
                 if departamentoAnterior2:
                     logger.info(f"Selecting Departamento Anterior 2: {departamentoAnterior2}")
-                    select_element = driver.find_element(By.NAME, "_DEPAUT3")
+                    select_element = cached_element(driver, By.NAME, "_DEPAUT3")
                     select = Select(select_element)
-                    human_select(select, departamentoAnterior2)
+                    human_select(select, departamentoAnterior2, cache_key="_DEPAUT3")
                     logger.info(f"Successfully selected Departamento Anterior 2: {departamentoAnterior2}")
             except Exception as e:
                 msg = f"[Obs {observation_id}] Error selecting Departamento Anterior 2: {str(e)}"
@@ -387,7 +379,7 @@ def fill_form_AM(bucket_id, driver, client):
                     )
                     human_click(driver, select_localidad2_element)
                     select = Select(select_localidad2_element)
-                    human_select(select, localidadAnterior2)
+                    human_select(select, localidadAnterior2, cache_key=("localidadAnterior2", departamentoAnterior2))
                     logger.info(f"Successfully selected Localidad Anterior 2: {localidadAnterior2}")
             except Exception as e:
                 msg = f"[Obs {observation_id}] Error selecting Localidad Anterior 2: {str(e)}"
@@ -398,10 +390,10 @@ def fill_form_AM(bucket_id, driver, client):
             try:
                 if placaMunicipal2:
                     logger.info(f"Entering Placa Municipal 2: {placaMunicipal2}")
-                    field = driver.find_element(By.ID, "CTLPLACAMUNICIPALAUT3")
+                    field = cached_element(driver, By.ID, "CTLPLACAMUNICIPALAUT3")
                     human_click(driver, field)
                     field.clear()
-                    human_type(field, placaMunicipal2)
+                    type_text(driver, field, placaMunicipal2, form="AM", field="CTLPLACAMUNICIPALAUT3")
                     logger.info(f"Successfully entered Placa Municipal 2: {placaMunicipal2}")
             except Exception as e:
                 msg = f"[Obs {observation_id}] Error entering Placa Municipal 2: {str(e)}"
@@ -409,72 +401,71 @@ def fill_form_AM(bucket_id, driver, client):
                 obs_errors.append(msg)
 
             # —— PRESIONAR “AGREGAR” ——
-            
-            try:
-                logger.info("Clicking the 'Agregar' button...")
+            with span("fill_AM.agregar"):
 
-                # A veces los botones tipo SUBMIT requieren un submit explícito del form.
-                # Buscamos el botón por NAME y verificamos que sea el correcto.
-                button = driver.find_element(By.NAME, "BUTTON2")
-
-                # Intentamos hacer scroll hacia el botón por si no está visible
-                driver.execute_script("arguments[0].scrollIntoView(true);", button)
-
-                # Intentamos clickear con Selenium normal
                 try:
-                    human_click(driver, button)
-                except Exception as click_exc:
-                    logger.warning(f"No se pudo clickear el botón con human_click: {click_exc}. Intentando con JavaScript.")
-                    # Si falla el click normal, probamos con JS
-                    driver.execute_script("arguments[0].click();", button)
-
-                
-                time.sleep(1.2)
-                # Luego de hacer clic en "Agregar", verificamos que el campo CTLPADRONAUT2 haya quedado vacío.
-                try:
-                    padronaut2_field = driver.find_element(By.ID, "CTLPADRONAUT2")
-                    padronaut2_value = padronaut2_field.get_attribute("value")
-                    if padronaut2_value not in ["", None,"0"]:
-                        logger.warning(f"El campo CTLPADRONAUT2 no quedó vacío tras 'Agregar'. Valor actual: '{padronaut2_value}'. Intentando hacer clic nuevamente de otra manera.")
-                        # Intentar hacer clic con JavaScript como alternativa
-                        try:
-                            driver.execute_script("arguments[0].click();", button)
-                            time.sleep(1.5)
-                            padronaut2_value_retry = padronaut2_field.get_attribute("value")
-                            if padronaut2_value_retry not in ["", None,"0"]:
-                                logger.warning(f"El campo CTLPADRONAUT2 sigue sin quedar vacío tras segundo intento. Valor actual: '{padronaut2_value_retry}'")
-                            else:
-                                logger.info("El campo CTLPADRONAUT2 quedó vacío correctamente tras segundo intento de 'Agregar'.")
-                        except Exception as retry_exc:
-                            logger.error(f"Error al intentar hacer clic nuevamente en 'Agregar' con JS: {retry_exc}")
-                    else:
-                        logger.info("El campo CTLPADRONAUT2 quedó vacío correctamente tras 'Agregar'.")
+                    logger.info("Clicking the 'Agregar' button...")
+
+                    # A veces los botones tipo SUBMIT requieren un submit explícito del form.
+                    # Buscamos el botón por NAME y verificamos que sea el correcto.
+                    button = cached_element(driver, By.NAME, "BUTTON2")
+                    mark_submit(driver, "CTLPADRONAUT2")
+
+                    # Intentamos hacer scroll hacia el botón por si no está visible
+                    driver.execute_script("arguments[0].scrollIntoView(true);", button)
+
+                    # Intentamos clickear con Selenium normal
+                    try:
+                        human_click(driver, button)
+                    except Exception as click_exc:
+                        logger.warning(f"No se pudo clickear el botón con human_click: {click_exc}. Intentando con JavaScript.")
+                        # Si falla el click normal, probamos con JS
+                        driver.execute_script("arguments[0].click();", button)
+
+
+                    # Luego de hacer clic en "Agregar", esperamos (hasta 3s) a que el campo CTLPADRONAUT2 quede vacío.
+                    # Si el campo no está en el DOM (recarga en curso o página de error) el valor es None:
+                    # no cuenta como vacío, se sigue esperando y al timeout se reporta como no verificado.
+                    try:
+                        padronaut2_value = wait_for_field_value(driver, "CTLPADRONAUT2", lambda v: v in ("", "0"), timeout=3)
+                        if padronaut2_value is None:
+                            logger.warning("El campo CTLPADRONAUT2 no apareció tras 'Agregar': vaciado no verificado.")
+                        elif padronaut2_value not in ("", "0"):
+                            logger.warning(f"El campo CTLPADRONAUT2 no quedó vacío tras 'Agregar'. Valor actual: '{padronaut2_value}'. Intentando hacer clic nuevamente de otra manera.")
+                            # Intentar hacer clic con JavaScript como alternativa
+                            try:
+                                driver.execute_script("arguments[0].click();", button)
+                                padronaut2_value_retry = wait_for_field_value(driver, "CTLPADRONAUT2", lambda v: v in ("", "0"), timeout=3)
+                                if padronaut2_value_retry is None:
+                                    logger.warning("El campo CTLPADRONAUT2 no apareció tras el segundo intento: vaciado no verificado.")
+                                elif padronaut2_value_retry not in ("", "0"):
+                                    logger.warning(f"El campo CTLPADRONAUT2 sigue sin quedar vacío tras segundo intento. Valor actual: '{padronaut2_value_retry}'")
+                                else:
+                                    logger.info("El campo CTLPADRONAUT2 quedó vacío correctamente tras segundo intento de 'Agregar'.")
+                            except Exception as retry_exc:
+                                logger.error(f"Error al intentar hacer clic nuevamente en 'Agregar' con JS: {retry_exc}")
+                        else:
+                            logger.info("El campo CTLPADRONAUT2 quedó vacío correctamente tras 'Agregar'.")
+                    except Exception as e:
+                        logger.error(f"No se pudo verificar el campo CTLPADRONAUT2 tras 'Agregar': {e}")
+
+                    logger.info("Form submission (Agregar) intentado para esta observación.")
                 except Exception as e:
-                    logger.error(f"No se pudo verificar el campo CTLPADRONAUT2 tras 'Agregar': {e}")
+                    msg = f"[Obs {observation_id}] Error clicking 'Agregar' button: {str(e)}"
+                    logger.error(f"ERROR: {msg}")
+                    obs_errors.append(msg)
 
-                logger.info("Form submission (Agregar) intentado para esta observación.")
-            except Exception as e:
-                msg = f"[Obs {observation_id}] Error clicking 'Agregar' button: {str(e)}"
-                logger.error(f"ERROR: {msg}")
-                obs_errors.append(msg)
-                
-            try:
-            # Esperamos hasta 5 segundos para que aparezca un span.ErrorViewer, si no aparece lanza TimeoutException.
-                error_elem = WebDriverWait(driver, 2).until(
-                    EC.presence_of_element_located((By.CSS_SELECTOR, "span.ErrorViewer"))
-                )
-                # Si llegamos aquí, el elemento apareció:
-                error_text = error_elem.text.strip()   # Ej.: "Debe marcar alguna sección"
+                # Resultado del "Agregar": vuelve apenas aparece un ErrorViewer o la fila queda agregada
+                outcome = wait_for_submit_outcome(driver)
+            if outcome["outcome"] == "error":
+                error_text = outcome["message"]   # Ej.: "Debe marcar alguna sección"
                 logger.error(f"ErrorViewer detectado para bucket_id {bucket_id}: '{error_text}'")
                 # Llamamos a notify_error pasándole el bucket_id y el mensaje de ErrorViewer
                 notify_error(f"bucket_id={bucket_id} → ErrorViewer: {error_text}")
-                
-                # (Opcional: aquí podrías lanzar una excepción o retornar algo para abortar,
-                #  si no quieres continuar con el flujo cuando hay ese error.)
-            
-            except TimeoutException:
-                # No apareció ningún span.ErrorViewer en esos 5 segundos: seguimos normalmente.
-                logger.info(f"No apareció ErrorViewer tras 'Agregar' para bucket_id {bucket_id}. Continuo con el flujo.")
+            elif outcome["outcome"] == "added":
+                logger.info(f"'Agregar' OK para bucket_id {bucket_id} ({outcome['message']}, {outcome['elapsed']}s).")
+            else:
+                logger.info(f"No apareció ErrorViewer tras 'Agregar' para bucket_id {bucket_id} ({outcome['message']}). Continuo con el flujo.")
 
         except Exception as e:
             # Captura cualquier otro fallo inesperado al procesar la observación
@@ -511,7 +502,7 @@ def fill_form_AM(bucket_id, driver, client):
         }
         
     try:
-        nro_automot_field = driver.find_element(By.ID, "_NROAUTOMOT")
+        nro_automot_field = cached_element(driver, By.ID, "_NROAUTOMOT")
         nro_automot_value = nro_automot_field.get_attribute("value")
         print(f"Automotores ingresados segun DGR: {nro_automot_value}")
         
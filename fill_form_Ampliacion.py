@@ -12,8 +12,11 @@ import logging
 from datetime import datetime
 
 
-from human_functions import human_click, human_type, human_select
+from human_functions import human_click, type_text, human_select
 from notify_error import notify_error
+from request_filter import navigate
+from dgr_urls import dgr_url
+from locator_cache import cached_element
 
 # Set up logging
 logger = logging.getLogger()
@@ -80,7 +83,7 @@ def fill_form_Ampliacion(ampliacion_id, driver, client):
         return {"status": "critical_error", "errors": critical_errors}
     
     try:
-        driver.get("https://www.dgr.gub.uy/etimbreapp/servlet/hsolicitudampliacion")
+        navigate(driver, dgr_url("/etimbreapp/servlet/hsolicitudampliacion"))
         logger.info("Navegado al formulario Ampiacion.")
     except Exception as e:
         msg = f"Critical: al cargar página Ampliacion. Error {e} "
@@ -91,8 +94,8 @@ def fill_form_Ampliacion(ampliacion_id, driver, client):
     try:
         
         logger.info(f"  Ingresando numero de solicitud: {numero_solicitud}")
-        fld = driver.find_element(By.ID, "_NROSOLIC")
-        human_type(fld, numero_solicitud)
+        fld = cached_element(driver, By.ID, "_NROSOLIC")
+        type_text(driver, fld, numero_solicitud, form="Ampliacion", field="_NROSOLIC")
         logger.info(f"Se llenó Numero de Solicitud: {numero_solicitud}")
         
            
@@ -103,7 +106,7 @@ def fill_form_Ampliacion(ampliacion_id, driver, client):
         return {"status": "critical_error", "errors": critical_errors}
     try:
         wait.until(EC.presence_of_element_located((By.NAME, "BUTTON1")))
-        button = driver.find_element(By.NAME, "BUTTON1")
+        button = cached_element(driver, By.NAME, "BUTTON1")
         human_click(driver, button)
         logger.info("Click correcto en 'Recuperar'.")
     except Exception as e:
@@ -113,13 +116,13 @@ def fill_form_Ampliacion(ampliacion_id, driver, client):
     
     try:
         logger.info(f"Clicking on ampliacion fecha")
-        field = driver.find_element(By.ID, "_FCHEM")
+        field = cached_element(driver, By.ID, "_FCHEM")
         human_click(driver, field)
         field.send_keys(Keys.END)
         for _ in range(12):
             field.send_keys(Keys.BACKSPACE)
             
-        human_type(field, ampliacion_fecha)
+        type_text(driver, field, ampliacion_fecha, form="Ampliacion", field="_FCHEM")
         logger.info(f"Successfully entered ampliacion: {ampliacion_fecha}")
     except Exception as e:
         msg = f"Error ingresando ampliacion fecha. Error: {e}"
@@ -1,22 +1,25 @@
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import WebDriverWait, Select
-from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.common.keys import Keys
 
 import logging
 import time
-import random
 
-from human_functions import human_click, human_type, human_select
+from human_functions import human_click, type_text, human_select
 from notify_error import notify_error
+from request_filter import navigate
+from tracing import span, traced
+from dgr_urls import dgr_url
+from waits import wait_for_page_idle, mark_submit, wait_for_submit_outcome
+from locator_cache import cached_element
 
 # Set up logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
     
 
-def fill_form_I(bucket_id, driver, client):
+def fill_form_I(bucket_id, driver, client, observaciones=None):
     """
     Rellena el formulario de Inmuebles en DGR para cada observación del bucket_id.
     Devuelve un dict con:
@@ -43,12 +46,10 @@ def fill_form_I(bucket_id, driver, client):
     # 1) Conexión a MongoDB y fetch de observaciones (crítico si falla)
     try:
         logger.info(f"Retrieving observations for bucket_id: {bucket_id}...")
-        # Defino el filtro
-        filtro = {"id_bucket": bucket_id}
-        # 1) Recupero el cursor para iterar (si es que vas a procesar cada documento)
-        observaciones = imuebles_db.find(filtro)
-        total = imuebles_db.count_documents(filtro)
-        logger.info(f"Retrieved {total} observations for bucket_id: {bucket_id}.")
+        # Si el dispatcher ya las trajo (observations.load_bucket) no vuelvo a consultar
+        if observaciones is None:
+            observaciones = list(imuebles_db.find({"id_bucket": bucket_id}))
+        logger.info(f"Retrieved {len(observaciones)} observations for bucket_id: {bucket_id}.")
     except Exception as e:
         msg = f"Critical: Error retrieving observations from MongoDB for bucket_id {bucket_id}: {e}"
         logger.error(msg)
@@ -58,7 +59,7 @@ def fill_form_I(bucket_id, driver, client):
 
     # 2) Navegar a la página de Inmuebles (crítico si falla)
     try:
-        driver.get("https://www.dgr.gub.uy/etimbreapp/servlet/hformauxremotas?4")
+        navigate(driver, dgr_url("/etimbreapp/servlet/hformauxremotas?4"))
         logger.info("Navegado al formulario Inmuebles.")
     except Exception as e:
         msg = f"Critical: al cargar página Inmuebles: {e}"
@@ -87,7 +88,7 @@ def fill_form_I(bucket_id, driver, client):
     }
 
     # 3) Iterar cada observación y completar campos
-    for obs in observaciones:
+    for obs in traced(observaciones, "fill_I.observation"):
         obs_id = obs.get("_id", "desconocido")
         obs_errors = []
         logger.info(f"Procesando observación {obs_id}…")
@@ -100,7 +101,7 @@ def fill_form_I(bucket_id, driver, client):
                 logger.info(f"  Seleccionando Departamento: {dep}")
                 sel = Select(WebDriverWait(driver, 30)
                              .until(EC.element_to_be_clickable((By.NAME, "_DEPINM"))))
-                human_select(sel, dep)
+                human_select(sel, dep, cache_key="_DEPINM")
                 logger.info(f"Se llenó Departamento: {dep}")
         except Exception as e:
             msg = f"[{obs_id}] ERROR Departamento: {e}"
@@ -115,7 +116,7 @@ def fill_form_I(bucket_id, driver, client):
                 logger.info(f"  Seleccionando Localidad: {loc}")
                 sel = Select(WebDriverWait(driver, 10)
                              .until(EC.element_to_be_clickable((By.NAME, "CTLLOCINM2"))))
-                human_select(sel, loc)
+                human_select(sel, loc, cache_key=("CTLLOCINM2", obs.get("departamento", "")))
                 logger.info(f"Se llenó Localidad: {loc}")
         except Exception as e:
             msg = f"[{obs_id}] ERROR Localidad: {e}"
@@ -144,7 +145,7 @@ def fill_form_I(bucket_id, driver, client):
                 time.sleep(0.1)
 
                 # 4) Tipear el número
-                human_type(fld_pad, pad)
+                type_text(driver, fld_pad, pad, form="I", field="_PADONINMAUX")
                 logger.info(f"Se llenó Padrón Actual: {pad}")
         except Exception as e:
             msg = f"[{obs_id}] ERROR Padrón Actual: {e}"
@@ -156,8 +157,8 @@ def fill_form_I(bucket_id, driver, client):
             sec = obs.get("seccionJudicial", "").strip()
             if sec:
                 logger.info(f"  Ingresando Sección Judicial: {sec}")
-                fld = driver.find_element(By.ID, "CTLSJINM")
-                human_type(fld, sec)
+                fld = cached_element(driver, By.ID, "CTLSJINM")
+                type_text(driver, fld, sec, form="I", field="CTLSJINM")
                 logger.info(f"Se llenó Sección Judicial: {sec}")
         except Exception as e:
             msg = f"[{obs_id}] ERROR Sección Judicial: {e}"
@@ -169,8 +170,8 @@ def fill_form_I(bucket_id, driver, client):
             blk = obs.get("block", "").strip()
             if blk:
                 logger.info(f"  Ingresando Block: {blk}")
-                fld = driver.find_element(By.ID, "CTLBLOCKINM2")
-                human_type(fld, blk)
+                fld = cached_element(driver, By.ID, "CTLBLOCKINM2")
+                type_text(driver, fld, blk, form="I", field="CTLBLOCKINM2")
                 logger.info(f"Se llenó Block: {blk}")
         except Exception as e:
             msg = f"[{obs_id}] ERROR Block: {e}"
@@ -182,8 +183,8 @@ def fill_form_I(bucket_id, driver, client):
             niv = obs.get("nivel", "").strip()
             if niv:
                 logger.info(f"  Seleccionando Nivel: {niv}")
-                sel = Select(driver.find_element(By.NAME, "CTLNIVELINM2"))
-                human_select(sel, niv)
+                sel = Select(cached_element(driver, By.NAME, "CTLNIVELINM2"))
+                human_select(sel, niv, cache_key="CTLNIVELINM2")
                 logger.info(f"Se llenó Nivel: {niv}")
         except Exception as e:
             msg = f"[{obs_id}] ERROR Nivel: {e}"
@@ -195,8 +196,8 @@ def fill_form_I(bucket_id, driver, client):
             uni = obs.get("unidad", "").strip()
             if uni:
                 logger.info(f"  Ingresando Unidad: {uni}")
-                fld = driver.find_element(By.ID, "CTLUNIDADINM2")
-                human_type(fld, uni)
+                fld = cached_element(driver, By.ID, "CTLUNIDADINM2")
+                type_text(driver, fld, uni, form="I", field="CTLUNIDADINM2")
                 logger.info(f"Se llenó Unidad: {uni}")
         except Exception as e:
             msg = f"[{obs_id}] ERROR Unidad: {e}"
@@ -229,9 +230,9 @@ def fill_form_I(bucket_id, driver, client):
                     fld_pad = WebDriverWait(driver, 5).until(
                         EC.element_to_be_clickable((By.ID, fld_pad_id))
                     )
-                    human_type(fld_pad, valor_pad)
-                    human_click(driver, driver.find_element(By.ID, "tab4"))
-                    time.sleep(0.2)
+                    type_text(driver, fld_pad, valor_pad, form="I", field=fld_pad_id)
+                    human_click(driver, cached_element(driver, By.ID, "tab4"))
+                    wait_for_page_idle(driver, timeout=2)
                     logger.info(f"Se llenó PadrónAnterior{i} (ID={fld_pad_id}): {valor_pad}")
                 except Exception as e:
                     msg = f"[{obs_id}] ERROR PadrónAnterior{i} (ID={fld_pad_id}): {e}"
@@ -247,9 +248,9 @@ def fill_form_I(bucket_id, driver, client):
                     sel_loc = Select(WebDriverWait(driver, 5).until(
                         EC.element_to_be_clickable((By.NAME, sel_name))
                     ))
-                    human_select(sel_loc, valor_loc)
-                    human_click(driver, driver.find_element(By.ID, "tab4"))
-                    time.sleep(0.2)
+                    human_select(sel_loc, valor_loc, cache_key=(sel_name, obs.get("departamento", "")))
+                    human_click(driver, cached_element(driver, By.ID, "tab4"))
+                    wait_for_page_idle(driver, timeout=2)
                     logger.info(f"Se llenó localidadAnterior{i} (NAME={sel_name}): {valor_loc}")
                 except Exception as e:
                     msg = f"[{obs_id}] ERROR localidadAnterior{i} (NAME={sel_name}): {e}"
@@ -267,7 +268,7 @@ def fill_form_I(bucket_id, driver, client):
                     EC.element_to_be_clickable((By.ID, boton_id))
                 ))
                 logger.info(f"  Clic en '{boton_id}' (HTML idx={idx}).")
-                time.sleep(0.5)
+                wait_for_page_idle(driver, timeout=3)
             except Exception as e:
                 msg = f"[{obs_id}] WARNING No pude clicar '{boton_id}' (fila {idx}): {e}"
                 logger.warning(msg)
@@ -288,9 +289,9 @@ def fill_form_I(bucket_id, driver, client):
                     human_click(driver, fld_pad)
                     fld_pad.send_keys(Keys.END)
                     fld_pad.send_keys(Keys.BACKSPACE)
-                    human_type(fld_pad, valor_pad)
-                    human_click(driver, driver.find_element(By.ID, "tab4"))
-                    time.sleep(random.uniform(0.2, 0.4))
+                    type_text(driver, fld_pad, valor_pad, form="I", field=real_padron_id)
+                    human_click(driver, cached_element(driver, By.ID, "tab4"))
+                    wait_for_page_idle(driver, timeout=2)
                     logger.info(f"Se llenó PadrónAnterior{i} (ID={real_padron_id}): {valor_pad}")
                 except Exception as e:
                     msg = f"[{obs_id}] ERROR PadrónAnterior{i} (ID={real_padron_id}): {e}"
@@ -306,9 +307,9 @@ def fill_form_I(bucket_id, driver, client):
                     sel_loc = Select(WebDriverWait(driver, 5).until(
                         EC.element_to_be_clickable((By.NAME, real_loc_name))
                     ))
-                    human_select(sel_loc, valor_loc)
-                    human_click(driver, driver.find_element(By.ID, "tab4"))
-                    time.sleep(0.2)
+                    human_select(sel_loc, valor_loc, cache_key=(real_loc_name, obs.get("departamento", "")))
+                    human_click(driver, cached_element(driver, By.ID, "tab4"))
+                    wait_for_page_idle(driver, timeout=2)
                     logger.info(f"Se llenó localidadAnterior{i} (NAME={real_loc_name}): {valor_loc}")
                 except Exception as e:
                     msg = f"[{obs_id}] ERROR localidadAnterior{i} (NAME={real_loc_name}): {e}"
@@ -316,32 +317,31 @@ def fill_form_I(bucket_id, driver, client):
                     obs_errors.append(msg)
 
         # h) Clic en "Agregar"
-        try:
-            logger.info(f"  Haciendo clic en 'Agregar' para {obs_id}")
-            btn = WebDriverWait(driver, 10).until(
-                EC.element_to_be_clickable((By.NAME, "BUTTON3"))
-            )
-            human_click(driver, btn)
-            logger.info(f"Observación {obs_id} enviada correctamente.")
-        except Exception as e:
-            msg = f"[{obs_id}] ERROR al enviar observación: {e}"
-            logger.error(msg)
-            obs_errors.append(msg)
-        
-        try:
-            # Esperamos hasta 5 segundos para que aparezca un span.ErrorViewer, si no aparece lanza TimeoutException.
-            error_elem = WebDriverWait(driver, 2).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, "span.ErrorViewer"))
-            )
-            # Si llegamos aquí, el elemento apareció:
-            error_text = error_elem.text.strip()   # Ej.: "Debe marcar alguna sección"
+        with span("fill_I.agregar"):
+            try:
+                logger.info(f"  Haciendo clic en 'Agregar' para {obs_id}")
+                btn = WebDriverWait(driver, 10).until(
+                    EC.element_to_be_clickable((By.NAME, "BUTTON3"))
+                )
+                mark_submit(driver, "_PADONINMAUX")
+                human_click(driver, btn)
+                logger.info(f"Observación {obs_id} enviada correctamente.")
+            except Exception as e:
+                msg = f"[{obs_id}] ERROR al enviar observación: {e}"
+                logger.error(msg)
+                obs_errors.append(msg)
+
+            # Resultado del "Agregar": vuelve apenas aparece un ErrorViewer o la fila queda agregada
+            outcome = wait_for_submit_outcome(driver)
+        if outcome["outcome"] == "error":
+            error_text = outcome["message"]   # Ej.: "Debe marcar alguna sección"
             logger.error(f"ErrorViewer detectado para bucket_id {bucket_id}: '{error_text}'")
             # Llamamos a notify_error pasándole el bucket_id y el mensaje de ErrorViewer
             notify_error(f"bucket_id={bucket_id} → ErrorViewer: {error_text}")
-             
-        except TimeoutException:
-            # No apareció ningún span.ErrorViewer en esos 5 segundos: seguimos normalmente.
-            logger.info(f"No apareció ErrorViewer tras 'Agregar' para bucket_id {bucket_id}. Continuo con el flujo.")
+        elif outcome["outcome"] == "added":
+            logger.info(f"'Agregar' OK para bucket_id {bucket_id} ({outcome['message']}, {outcome['elapsed']}s).")
+        else:
+            logger.info(f"No apareció ErrorViewer tras 'Agregar' para bucket_id {bucket_id} ({outcome['message']}). Continuo con el flujo.")
 
         # Si hubo errores en esta observación, los agrego a la lista de submission_errors
         if obs_errors:
@@ -368,7 +368,7 @@ def fill_form_I(bucket_id, driver, client):
         return {"status": "submission_error", "errors": submission_errors}
     
     try:
-        nro_inmuebles_field = driver.find_element(By.ID, "_NROINM")
+        nro_inmuebles_field = cached_element(driver, By.ID, "_NROINM")
         nro_inmuebles_value = nro_inmuebles_field.get_attribute("value")
         logger.info(f"Automotores ingresados segun DGR: {nro_inmuebles_value}")
         
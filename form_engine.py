@@ -0,0 +1,276 @@
+import os
+import logging
+
+from selenium.webdriver.common.by import By
+from selenium.webdriver.common.keys import Keys
+from selenium.webdriver.support.ui import Select
+from selenium.common.exceptions import StaleElementReferenceException
+
+from human_functions import type_text, human_click, human_select
+from waits import arm_page_idle, wait_for_page_idle
+from tracing import span
+from locator_cache import cached_element, is_cached, remember
+
+# Set up logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Definición declarativa de campos
+#
+# Cada campo es un dict con:
+#   label     -> nombre para logs y mensajes de error
+#   key       -> clave en el documento de Mongo (o value: callable(obs) -> valor)
+#   by        -> "id" o "name"
+#   locator   -> id/name del elemento en la página de DGR
+#   kind      -> "text", "checkbox" o "select"
+#   clear     -> "clear" (element.clear()), un int N (END + N×BACKSPACE, para campos
+#                con máscara de GeneXus) o None (no limpiar)
+#   click     -> si se hace human_click antes de escribir (default True)
+#   when      -> callable(obs) -> bool opcional; si da False el campo se saltea
+#   after_click -> id de un elemento a clickear después de escribir (cierra datepickers)
+#   check_via_body -> para checkboxes que GeneXus marca solo al perder foco el campo previo
+#   error     -> texto del log de error si difiere de "<acción> <label>" (campos que el
+#                filler original agrupaba bajo un solo mensaje, ej: "entering Mandatos")
+# ──────────────────────────────────────────────────────────────────────────────
+
+def text_field(label, key, locator, by="id", clear="clear", **opts):
+    return dict(label=label, key=key, by=by, locator=locator, kind="text", clear=clear, **opts)
+
+
+def masked_field(label, key, locator, backspaces, by="id", **opts):
+    return dict(label=label, key=key, by=by, locator=locator, kind="text", clear=backspaces, **opts)
+
+
+def checkbox_field(label, key, locator, by="name", **opts):
+    return dict(label=label, key=key, by=by, locator=locator, kind="checkbox", **opts)
+
+
+def select_field(label, key, locator, by="name", **opts):
+    return dict(label=label, key=key, by=by, locator=locator, kind="select", **opts)
+
+
+_BY = {"id": By.ID, "name": By.NAME}
+
+# Resuelve todos los locators de una observación en un único round-trip.
+_RESOLVE_JS = """
+return arguments[0].map(function (l) {
+    return l[0] === 'id' ? document.getElementById(l[1]) : (document.getElementsByName(l[1])[0] || null);
+});
+"""
+
+
+# Completa una observación entera en un único round-trip: asigna valores en orden,
+# dispara los handlers de GeneXus (focus/input/gxonchange/change/blur) y devuelve
+# un reporte de verificación por campo.
+_BATCH_FILL_JS = """
+var norm = function (v) { return String(v == null ? '' : v).replace(/[\\s\\/.\\-_]/g, '').toUpperCase(); };
+return arguments[0].map(function (f) {
+    var el = f.by === 'id' ? document.getElementById(f.locator) : (document.getElementsByName(f.locator)[0] || null);
+    if (!el) { return {locator: f.locator, ok: false, error: 'no encontrado'}; }
+    try {
+        if (f.kind === 'checkbox') {
+            if (el.checked !== f.value) { el.click(); }
+            return {locator: f.locator, ok: el.checked === f.value, actual: el.checked};
+        }
+        el.focus();
+        if (f.kind === 'select') {
+            var wanted = norm(f.value);
+            var opt = Array.prototype.find.call(el.options, function (o) { return norm(o.text) === wanted; });
+            if (!opt) { return {locator: f.locator, ok: false, error: 'opción no encontrada'}; }
+            el.value = opt.value;
+        } else {
+            el.value = f.value;
+        }
+        el.dispatchEvent(new Event('input', {bubbles: true}));
+        if (typeof gxonchange === 'function') { gxonchange(el); }
+        el.dispatchEvent(new Event('change', {bubbles: true}));
+        el.blur();
+        var actual = f.kind === 'select' ? el.options[el.selectedIndex].text : el.value;
+        return {locator: f.locator, ok: norm(actual) === norm(f.value), actual: actual};
+    } catch (e) {
+        return {locator: f.locator, ok: false, error: String(e)};
+    }
+});
+"""
+
+
+# Relee los campos del batch una vez que terminaron los AJAX de gxonchange (una respuesta
+# tardía, como el lookup de CI, puede pisar valores ya verificados).
+_BATCH_VERIFY_JS = """
+var norm = function (v) { return String(v == null ? '' : v).replace(/[\\s\\/.\\-_]/g, '').toUpperCase(); };
+return arguments[0].map(function (f) {
+    var el = f.by === 'id' ? document.getElementById(f.locator) : (document.getElementsByName(f.locator)[0] || null);
+    if (!el) { return {locator: f.locator, ok: false, error: 'no encontrado'}; }
+    if (f.kind === 'checkbox') { return {locator: f.locator, ok: el.checked === f.value, actual: el.checked}; }
+    var actual = f.kind === 'select' ? (el.selectedIndex < 0 ? '' : el.options[el.selectedIndex].text) : el.value;
+    return {locator: f.locator, ok: norm(actual) === norm(f.value), actual: actual};
+});
+"""
+
+
+def batched_fill_enabled(form):
+    """Formularios con modo batched habilitado, vía BATCHED_FILL_FORMS (ej: "PF"; por ahora solo PF lo consulta)."""
+    enabled = os.environ.get("BATCHED_FILL_FORMS", "")
+    return form in [f.strip() for f in enabled.split(",") if f.strip()]
+
+
+def field_value(spec, observacion):
+    if "value" in spec:
+        value = spec["value"](observacion)
+    else:
+        value = observacion.get(spec["key"], False if spec["kind"] == "checkbox" else "")
+    if spec["kind"] == "checkbox":
+        return bool(value)
+    return "" if value is None else str(value).strip()
+
+
+def active_fields(fields, observacion):
+    """Devuelve [(spec, valor)] de los campos que hay que tocar en esta observación."""
+    active = []
+    for spec in fields:
+        if "when" in spec and not spec["when"](observacion):
+            continue
+        value = field_value(spec, observacion)
+        # Los checkboxes siempre se ajustan (marcar o desmarcar); los textos solo si hay valor
+        if spec["kind"] != "checkbox" and not value:
+            continue
+        active.append((spec, value))
+    return active
+
+
+def resolve_elements(driver, locators):
+    """Resuelve una lista de (by, locator) con un solo execute_script. Devuelve {locator: element}."""
+    if not locators:
+        return {}
+    elements = driver.execute_script(_RESOLVE_JS, [list(l) for l in locators])
+    return {loc: el for loc, el in zip(locators, elements)}
+
+
+def fill_observation(driver, observacion, fields, form, observation_id):
+    """
+    Completa los campos declarados en fields para una observación.
+    Devuelve la lista de errores (vacía si todo salió bien).
+    """
+    obs_errors = []
+    active = active_fields(fields, observacion)
+
+    locators = []
+    for spec, _ in active:
+        locators.append((spec["by"], spec["locator"]))
+        if spec.get("after_click"):
+            locators.append(("id", spec["after_click"]))
+    # Los que ya están en la cache de la página no hace falta resolverlos de nuevo
+    pending = [l for l in dict.fromkeys(locators) if not is_cached(driver, _BY[l[0]], l[1])]
+    try:
+        for (by, locator), el in resolve_elements(driver, pending).items():
+            if el is not None:
+                remember(driver, _BY[by], locator, el)
+    except Exception as e:
+        logger.warning(f"[{observation_id}] No pude resolver los campos en batch ({e}). Uso find_element.")
+
+    def element_for(by, locator, refresh=False):
+        if refresh:
+            return remember(driver, _BY[by], locator, driver.find_element(_BY[by], locator))
+        return cached_element(driver, _BY[by], locator)
+
+    for spec, value in active:
+        action = "setting" if spec["kind"] == "checkbox" else "entering"
+        error_text = spec.get("error") or f"{action} {spec['label']}"
+        with span(f"fill_{form}.field"):
+            try:
+                try:
+                    _apply_field(driver, spec, value, form, element_for)
+                except StaleElementReferenceException:
+                    # GeneXus re-renderizó el campo tras un evento: re-resuelvo y reintento una vez
+                    logger.info(f"[{observation_id}] {spec['label']} quedó stale. Reintentando.")
+                    _apply_field(driver, spec, value, form,
+                                 lambda by, loc: element_for(by, loc, refresh=True))
+            except Exception as e:
+                msg = f"[{observation_id}] ERROR {error_text}: {e}"
+                logger.error(msg)
+                obs_errors.append(msg)
+
+    return obs_errors
+
+
+def _apply_field(driver, spec, value, form, element_for):
+    label = spec["label"]
+    element = element_for(spec["by"], spec["locator"])
+
+    if spec["kind"] == "checkbox":
+        logger.info(f"Setting {label}: {value}")
+        if element.is_selected() != value:
+            if value and spec.get("check_via_body"):
+                driver.find_element(By.TAG_NAME, "body").click()
+            else:
+                human_click(driver, element)
+        logger.info(f"Successfully set {label} to: {value}")
+        return
+
+    if spec["kind"] == "select":
+        logger.info(f"Selecting {label}: {value}")
+        human_select(Select(element), value)
+        logger.info(f"Successfully selected {label}: {value}")
+        return
+
+    logger.info(f"Entering {label}: {value}")
+    if spec.get("click", True):
+        human_click(driver, element)
+    clear = spec.get("clear")
+    if clear == "clear":
+        element.clear()
+    elif isinstance(clear, int) and clear > 0:
+        # Un único send_keys en vez de END + N llamadas de BACKSPACE
+        element.send_keys(Keys.END + Keys.BACKSPACE * clear)
+    type_text(driver, element, value, form=form, field=spec["locator"])
+    if spec.get("after_click"):
+        human_click(driver, element_for("id", spec["after_click"]))
+    logger.info(f"Successfully entered {label}: {value}")
+
+
+def fill_observation_batched(driver, observacion, fields, form, observation_id):
+    """
+    Variante de fill_observation que manda toda la observación a la página en un solo
+    execute_script. Los campos que no pasen la verificación se vuelven a completar con
+    el runner campo a campo. Devuelve la lista de errores.
+    Los campos con after_click o check_via_body necesitan clicks reales y van siempre
+    por el runner campo a campo.
+    """
+    active = active_fields(fields, observacion)
+    manual = {id(spec) for spec, _ in active if spec.get("after_click") or spec.get("check_via_body")}
+    batched = [(spec, value) for spec, value in active if id(spec) not in manual]
+    payload = [
+        {"by": spec["by"], "locator": spec["locator"], "kind": spec["kind"], "value": value}
+        for spec, value in batched
+    ]
+    try:
+        with span(f"fill_{form}.batch"):
+            arm_page_idle(driver)
+            report = driver.execute_script(_BATCH_FILL_JS, payload)
+            # gxonchange dispara AJAX: verifico recién cuando terminaron
+            wait_for_page_idle(driver)
+            verified = driver.execute_script(_BATCH_VERIFY_JS, payload)
+    except Exception as e:
+        logger.warning(f"[{observation_id}] Batched fill falló ({e}). Completo campo a campo.")
+        return fill_observation(driver, observacion, fields, form, observation_id)
+
+    retry = set(manual)
+    for (spec, value), result, check in zip(batched, report, verified):
+        if result.get("ok") and check.get("ok"):
+            logger.info(f"Batched {spec['label']}: {value}")
+            continue
+        failed = check if result.get("ok") else result
+        logger.warning(
+            f"[{observation_id}] Batched {spec['label']} no verificó "
+            f"(esperado={value!r}, actual={failed.get('actual')!r}, error={failed.get('error')}). Reintento."
+        )
+        retry.add(id(spec))
+
+    if not retry:
+        logger.info(f"[{observation_id}] Batched fill OK: {len(batched)} campos en un round-trip.")
+        return []
+    # Conservo el orden declarado: los campos manuales pueden depender de los anteriores
+    return fill_observation(driver, observacion, [spec for spec in fields if id(spec) in retry],
+                            form, observation_id)
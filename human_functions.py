@@ -1,8 +1,52 @@
 
+import os
+import json
 import time
 import random
+import logging
 from selenium.webdriver.common.action_chains import ActionChains
+from selenium.common.exceptions import StaleElementReferenceException
 from notify_error import notify_error
+from waits import arm_page_idle, wait_for_page_idle
+from tracing import span
+from locator_cache import CachedElement
+from select_index import select_option
+
+logger = logging.getLogger()
+
+# Estrategias de tipeo disponibles:
+#   humanized -> un send_keys por carácter con pausa aleatoria (comportamiento original)
+#   bulk      -> un único send_keys con todo el texto
+#   js        -> asigna el value por JS y dispara los eventos de GeneXus (gxonchange/change)
+TYPING_MODES = ("humanized", "bulk", "js")
+DEFAULT_TYPING_MODE = "humanized"
+
+# Overrides por formulario y por campo. Se leen una sola vez de la variable de entorno
+# TYPING_MODES, un JSON como: {"PF": "bulk", "PF._CITEMP": "humanized", "CTLDD_PJUR": "js"}
+_typing_overrides = None
+
+
+def _load_typing_overrides():
+    global _typing_overrides
+    if _typing_overrides is None:
+        raw = os.environ.get("TYPING_MODES", "")
+        try:
+            overrides = json.loads(raw) if raw else {}
+        except ValueError as e:
+            logger.warning(f"TYPING_MODES no es un JSON válido, lo ignoro: {e}")
+            overrides = {}
+        _typing_overrides = {k: v for k, v in overrides.items() if v in TYPING_MODES}
+    return _typing_overrides
+
+
+def get_typing_mode(form=None, field=None):
+    """Resuelve el modo de tipeo: "FORM.FIELD" > "FIELD" > "FORM" > TYPING_MODE > humanized."""
+    overrides = _load_typing_overrides()
+    for key in (f"{form}.{field}", field, form):
+        if key and key in overrides:
+            return overrides[key]
+    mode = os.environ.get("TYPING_MODE", DEFAULT_TYPING_MODE)
+    return mode if mode in TYPING_MODES else DEFAULT_TYPING_MODE
 
 
 def human_type(element, text, min_delay=0.02, max_delay=0.08):
@@ -10,26 +54,71 @@ def human_type(element, text, min_delay=0.02, max_delay=0.08):
     for char in text:
         element.send_keys(char)
         time.sleep(random.uniform(min_delay, max_delay))
+
+
+def bulk_type(element, text):
+    """Escribe todo el texto con un único send_keys (una sola llamada a WebDriver)."""
+    element.send_keys(text)
+
+
+def js_type(driver, element, text):
+    """Asigna el valor por JS y dispara los eventos que escucha GeneXus, como force_change."""
+    driver.execute_script("""
+        const el = arguments[0];
+        el.value = arguments[1];
+        el.dispatchEvent(new Event('input', {bubbles:true}));
+        if (typeof gxonchange === 'function') { gxonchange(el); }
+        el.dispatchEvent(new Event('change', {bubbles:true}));
+        el.blur();
+    """, element, text)
+
+
+def type_text(driver, element, text, form=None, field=None):
+    """Escribe text en element con la estrategia configurada para ese formulario/campo."""
+    mode = get_typing_mode(form, field)
+    with span(f"fill_{form}.type" if form else "type"):
+        if mode == "bulk":
+            bulk_type(element, text)
+        elif mode == "js":
+            js_type(driver, element, text)
+        else:
+            human_type(element, text)
         
         
 def human_click(driver, element):
     """Mueve el mouse hacia un elemento antes de hacer clic, simulando el movimiento humano."""
 
     try:
-        actions = ActionChains(driver)
-        actions.move_to_element(element).pause(random.uniform(0.1, 0.3)).click().perform()
+        try:
+            actions = ActionChains(driver)
+            actions.move_to_element(element).pause(random.uniform(0.1, 0.3)).click().perform()
+        except StaleElementReferenceException:
+            # Los handles de locator_cache se re-resuelven; ActionChains no pasa por el elemento
+            if not isinstance(element, CachedElement):
+                raise
+            element.refresh()
+            actions = ActionChains(driver)
+            actions.move_to_element(element).pause(random.uniform(0.1, 0.3)).click().perform()
         time.sleep(random.uniform(0.1, 0.3))
     except Exception as e:
         notify_error(f"Error haciendo human click:{e}")
         print(f"Error en human_click: {e}")
         
         
-def human_select(select_element, visible_text):
-    """Selecciona una opción como si fuera un humano (esperando antes de interactuar)."""
+def human_select(select_element, visible_text, cache_key=None):
+    """
+    Selecciona una opción y espera a que GeneXus termine el refresco que dispara el change.
+    La opción se busca con select_index (un round-trip, sin acentos ni mayúsculas); para
+    listas estáticas pasar cache_key: el nombre del select si es de primer nivel, o
+    (nombre, valor del padre) si depende de otro select.
+    """
     try:
-        time.sleep(random.uniform(0.2, 0.4))
-        select_element.select_by_visible_text(visible_text)
-        time.sleep(random.uniform(0.2, 0.4))
+        with span("select"):
+            driver = select_element._el.parent
+            wait_for_page_idle(driver, timeout=3)
+            arm_page_idle(driver)
+            select_option(select_element, visible_text, cache_key)
+            wait_for_page_idle(driver, timeout=5)
     except Exception as e:
         print(f"Error en human_select: {e}")
         notify_error(f"Error en human_select: {e}")
\ No newline at end of file
@@ -0,0 +1,205 @@
+import os
+import sys
+import logging
+import argparse
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING
+
+from mongo import get_mongo_client
+from observations import bucket_pipeline
+from submit import non_active_ampliaciones_pipeline
+
+# Set up logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+# Índices que necesitan las consultas calientes, por colección.
+REQUIRED_INDEXES = {
+    "persona_fisica": [[("id_bucket", ASCENDING)]],
+    "persona_juridica": [[("id_bucket", ASCENDING)]],
+    "automotores": [[("id_bucket", ASCENDING)]],
+    "inmuebles": [[("id_bucket", ASCENDING)]],
+    "ampliacion": [[("id_bucket", ASCENDING)]],
+    # submit: find_one({id_bucket, description: "waiting_lambda"})
+    "status": [[("id_bucket", ASCENDING), ("description", ASCENDING)]],
+    # count_non_active_ampliaciones: último estado por ampliación
+    "status_ampliacion": [[("id_ampliacion", ASCENDING), ("createdAt", DESCENDING)]],
+}
+
+
+# Consultas calientes a verificar con explain(): (nombre, colección, filtro, sort)
+HOT_QUERIES = [
+    ("observaciones PF", "persona_fisica", lambda: {"id_bucket": ObjectId()}, None),
+    ("observaciones PJ", "persona_juridica", lambda: {"id_bucket": ObjectId()}, None),
+    ("observaciones AM", "automotores", lambda: {"id_bucket": ObjectId()}, None),
+    ("observaciones I", "inmuebles", lambda: {"id_bucket": ObjectId()}, None),
+    ("ampliaciones del bucket", "ampliacion", lambda: {"id_bucket": ObjectId()}, None),
+    ("waiting_lambda", "status",
+     lambda: {"id_bucket": ObjectId(), "description": "waiting_lambda"}, None),
+    ("último estado de ampliación", "status_ampliacion",
+     lambda: {"id_ampliacion": ObjectId()}, [("createdAt", DESCENDING)]),
+]
+
+# Agregaciones calientes: (nombre, colección, colección de donde sacar un id_bucket real,
+# pipeline(bucket_id)). Con un id inexistente el $lookup nunca corre y su plan no aparece,
+# así que se usa un id_bucket que tenga documentos en la colección del $lookup.
+HOT_AGGREGATIONS = [
+    ("load_bucket Persona", "bucket", "persona_fisica", lambda bucket_id: bucket_pipeline(bucket_id, "Persona")),
+    ("load_bucket Automotor", "bucket", "automotores", lambda bucket_id: bucket_pipeline(bucket_id, "Automotor")),
+    ("load_bucket Inmueble", "bucket", "inmuebles", lambda bucket_id: bucket_pipeline(bucket_id, "Inmueble")),
+    ("ampliaciones no activas", "ampliacion", "ampliacion", non_active_ampliaciones_pipeline),
+]
+
+
+def _index_name(keys):
+    return "_".join(f"{field}_{direction}" for field, direction in keys)
+
+
+def missing_indexes(db):
+    """Devuelve [(colección, keys)] de los índices requeridos que no existen."""
+    missing = []
+    for collection, indexes in REQUIRED_INDEXES.items():
+        existing = [info["key"] for info in db[collection].index_information().values()]
+        for keys in indexes:
+            if keys not in existing:
+                missing.append((collection, keys))
+    return missing
+
+
+def ensure_indexes(db):
+    """Crea los índices que falten (create_index es idempotente). Devuelve los creados."""
+    created = []
+    for collection, keys in missing_indexes(db):
+        name = db[collection].create_index(keys, name=_index_name(keys), background=True)
+        logger.info(f"[indexes] Creado {collection}.{name}")
+        created.append((collection, name))
+    if not created:
+        logger.info("[indexes] Todos los índices requeridos existen.")
+    return created
+
+
+def _stages(plan):
+    """Recorre el árbol de un winningPlan y devuelve todos los nombres de stage."""
+    if not isinstance(plan, dict):
+        return []
+    found = [plan["stage"]] if "stage" in plan else []
+    for key in ("inputStage", "queryPlan"):
+        found.extend(_stages(plan.get(key)))
+    for child in plan.get("inputStages", []):
+        found.extend(_stages(child))
+    return found
+
+
+def _aggregate_stages(explain):
+    """
+    Stages de un explain de aggregate, en cualquiera de sus formas: "$cursor" con
+    queryPlanner (motor clásico), winningPlan con EQ_LOOKUP (SBE) o un "$lookup" con
+    collectionScans (executionStats). Un $lookup que escaneó la colección se reporta
+    como "COLLSCAN <from>". No entra en rejectedPlans.
+    """
+    found = []
+    if isinstance(explain, list):
+        for item in explain:
+            found.extend(_aggregate_stages(item))
+        return found
+    if not isinstance(explain, dict):
+        return found
+    if "stage" in explain:
+        found.append(explain["stage"])
+        if explain["stage"] == "EQ_LOOKUP" and explain.get("strategy") == "NestedLoopJoin":
+            found.append(f"COLLSCAN {explain.get('foreignCollection', '')}".strip())
+    if explain.get("collectionScans"):
+        found.append(f"COLLSCAN {explain.get('$lookup', {}).get('from', '')}".strip())
+    for key, value in explain.items():
+        if key != "rejectedPlans":
+            found.extend(_aggregate_stages(value))
+    return found
+
+
+def _sample_bucket_id(db, collection):
+    doc = db[collection].find_one({"id_bucket": {"$exists": True}}, {"id_bucket": 1})
+    return doc["id_bucket"] if doc else ObjectId()
+
+
+def _has_collscan(stages):
+    return any(stage.startswith("COLLSCAN") for stage in stages)
+
+
+def collscan_queries(db):
+    """
+    Corre explain sobre HOT_QUERIES y HOT_AGGREGATIONS y devuelve [(nombre, stages)] de
+    las que hacen COLLSCAN.
+    """
+    offenders = []
+    for name, collection, build_filter, sort in HOT_QUERIES:
+        cursor = db[collection].find(build_filter())
+        if sort:
+            cursor = cursor.sort(sort)
+        stages = _stages(cursor.explain().get("queryPlanner", {}).get("winningPlan", {}))
+        logger.info(f"[indexes] {name}: {' <- '.join(stages)}")
+        if _has_collscan(stages):
+            offenders.append((name, stages))
+
+    # executionStats (y no solo queryPlanner) para que cada $lookup informe collectionScans
+    for name, collection, sample_from, build_pipeline in HOT_AGGREGATIONS:
+        pipeline = build_pipeline(_sample_bucket_id(db, sample_from))
+        explain = db.command(
+            "explain", {"aggregate": collection, "pipeline": pipeline, "cursor": {}}, verbosity="executionStats"
+        )
+        stages = _aggregate_stages(explain)
+        logger.info(f"[indexes] {name}: {' <- '.join(stages)}")
+        if _has_collscan(stages):
+            offenders.append((name, stages))
+    return offenders
+
+
+def check_query_plans(db):
+    """Lanza RuntimeError si alguna consulta caliente hace COLLSCAN."""
+    offenders = collscan_queries(db)
+    if offenders:
+        detail = "; ".join(f"{name} ({' <- '.join(stages)})" for name, stages in offenders)
+        raise RuntimeError(f"COLLSCAN en consultas calientes: {detail}")
+
+
+_ensured = False
+
+
+def ensure_indexes_once(db):
+    """Para el arranque de la Lambda: crea los índices una vez por contenedor (ENSURE_INDEXES=1)."""
+    global _ensured
+    if _ensured or os.environ.get("ENSURE_INDEXES") != "1":
+        return
+    try:
+        ensure_indexes(db)
+    except Exception as e:
+        logger.error(f"[indexes] No pude asegurar los índices: {e}")
+    _ensured = True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Crea y verifica los índices de MongoDB que usa la Lambda.")
+    parser.add_argument("--ensure", action="store_true", help="crear los índices que falten")
+    parser.add_argument("--explain", action="store_true", help="fallar si alguna consulta caliente hace COLLSCAN")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    db = get_mongo_client()["production"]
+
+    if args.ensure:
+        ensure_indexes(db)
+    missing = missing_indexes(db)
+    for collection, keys in missing:
+        logger.error(f"[indexes] Falta índice {collection}.{_index_name(keys)}")
+    if args.explain:
+        try:
+            check_query_plans(db)
+        except RuntimeError as e:
+            logger.error(f"[indexes] {e}")
+            return 1
+    return 1 if missing else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,31 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+# Set up logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Pool para sacar del camino crítico la I/O que no depende del navegador (Mongo, S3,
+# SQS): mientras Chrome genera el talón o completa formularios, estas llamadas corren
+# en paralelo. pymongo y boto3 son thread-safe, así que comparten los clientes de siempre.
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="io")
+
+
+def run_in_background(fn, *args, **kwargs):
+    """Lanza fn(*args, **kwargs) en el pool de I/O y devuelve el Future."""
+    return _executor.submit(fn, *args, **kwargs)
+
+
+def wait_all(futures, timeout=60):
+    """
+    Espera un dict {nombre: Future} y devuelve {nombre: excepción} de los que fallaron
+    (vacío si todos salieron bien). Nunca lanza: el llamador decide qué respuesta dar.
+    """
+    errors = {}
+    for name, future in futures.items():
+        try:
+            future.result(timeout=timeout)
+        except Exception as e:
+            logger.error(f"[io] {name} falló: {e}")
+            errors[name] = e
+    return errors
@@ -1,8 +1,10 @@
 import os
-import boto3
+import time
+
+_IMPORT_START = time.time()
+
 import json
 from bson import ObjectId
-from pymongo import MongoClient
 import logging
 
 from fill_form_AM import fill_form_AM
@@ -11,230 +13,353 @@ from fill_form_PF import fill_form_PF
 from fill_form_I import fill_form_I
 from fill_form_Ampliacion import fill_form_Ampliacion
 
-from notify_error import notify_error
+from notify_error import notify_error, flush_notifications
 
-from login import login
+from session_manager import discard_driver, default_session
+from mongo import get_mongo_client
+from observations import load_bucket
+from indexes import ensure_indexes_once
+from io_pipeline import run_in_background
+from tracing import span, bucket_trace
+from webdriver_profiler import profile_bucket
 from submit import submit_form_and_generate_talon
 
-s3_client = boto3.client('s3')
-
 # Set up logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# Tiempo de import del módulo (cuenta en el cold start). Los clientes de AWS y Mongo
+# se crean recién en el primer uso y loguean su propio tiempo.
+logger.info(f"[startup] Módulos importados en {time.time() - _IMPORT_START:.3f}s")
+
 
 def lambda_handler(event, context):
+    """
+    Procesa todos los records del batch de SQS con un único driver y devuelve una
+    respuesta parcial (batchItemFailures) para que SQS reintente solo los que fallaron.
+    Requiere ReportBatchItemFailures habilitado en el event source mapping.
+    """
+    records = event.get('Records', [])
+    results = []
     try:
-        uri = os.environ.get('MONGODB_URI')
-        client = MongoClient(uri)
+        # Cliente compartido: se reutiliza entre invocaciones warm
+        client = get_mongo_client()
         db = client['production']
-        bucket_db = db['bucket']
-        ampliacion_db = db['ampliacion']
-        driver = None  # Initialize driver to None
-        for record in event.get('Records', []):
+        ensure_indexes_once(db)
+        driver = None  # Un solo driver para todo el batch
+        parsed = []
+        for record in records:
             try:
-                payload = json.loads(record['body'])
+                parsed.append((record, json.loads(record['body'])))
             except Exception as e:
                 logger.error("No pude parsear record.body como JSON", exc_info=e)
-                notify_error("No pude parsear record.body como JSON", exc_info=e)
+                notify_error(f"No pude parsear record.body como JSON: {e}")
+                # Un body inválido no se arregla reintentando: no lo reporto como fallo.
+                results.append(_record_result(record, {
+                    "statusCode": 400,
+                    "body": json.dumps("Invalid JSON body")
+                }))
 
-            try:
-                bucket_type = payload.get('bucket_type')
-                
-                # Determine which collection/id to use
-                if bucket_type == "Ampliación":
-                    doc_id_key = 'ampliacion_id'
-                    db_collection = ampliacion_db
-                else:
-                    doc_id_key = 'bucket_id'
-                    db_collection = bucket_db
-
-                doc_id_value = payload.get(doc_id_key)
-                if not doc_id_value:
-                    message = f"ERROR: Falló al pasar a la lambda {doc_id_key}. No se encontro ningun valor."
-                    logger.error(message)
-                    notify_error(message)
-                    return {
-                        "statusCode": 400,
-                        "body": json.dumps(f'Invalid {doc_id_key}')
-                    }
-
-                doc_object_id = ObjectId(doc_id_value)
-                logger.info(f"{doc_id_key}: {doc_object_id}")
-                logger.info(f"Bucket_type: {bucket_type}")
-
-                try:
-                    document = db_collection.find_one({"_id": doc_object_id})
-                    logger.info(f"{doc_id_key} found on collection")
-                    if document is None:
-                        message = f"ERROR: No document found with the provided {doc_id_key} {doc_object_id}"
-                        logger.error(message)
-                        raise Exception(message)
-                    logger.info(f"Document found: {document}")
-                except Exception as e:
-                    message = f"ERROR: An error occurred while trying to find the document: {e}"
-                    logger.error(message)
-                    notify_error(message)
-                    raise
-
-                # Log in to DGR system
-                try:
-                    logger.info("Logging in to DGR system...")
-                    user_dgr = os.environ.get('DGR_USERNAME')
-                    password_dgr = os.environ.get('DGR_PASSWORD')
-                    driver = login(user_dgr, password_dgr)
-                except Exception as e:
-                    message = f"Critical: No se pudo iniciar la sesión. Verifique las credenciales o la conexión: {e}"
-                    logger.error(message)
-                    notify_error(message)
+        prefetched = None
+        for i, (record, payload) in enumerate(parsed):
+            # Mientras este bucket se completa en Chrome, traigo de Mongo las observaciones del siguiente
+            current, prefetched = prefetched, (_prefetch_bucket(db, parsed[i + 1][1]) if i + 1 < len(parsed) else None)
+            resp, driver = process_record(payload, client, db, driver, prefetched=current)
+            results.append(_record_result(record, resp))
+    except Exception as e:
+        discard_driver()
+        logger.error(f"ERROR: An error occurred: {e}")
+        notify_error(f"Error en lambda_handler: {e}")
+        # Todo lo que no llegó a procesarse se reintenta
+        processed = {r["messageId"] for r in results}
+        for record in records:
+            if record.get('messageId') not in processed:
+                results.append(_record_result(record, {
+                    "statusCode": 500,
+                    "body": json.dumps(f'Internal server error: {e}')
+                }))
+
+    failures = [{"itemIdentifier": r["messageId"]} for r in results if r["statusCode"] >= 500]
+    logger.info(f"Batch procesado: {len(results)} records, {len(failures)} fallidos.")
+    for r in results:
+        logger.info(f"  messageId={r['messageId']} statusCode={r['statusCode']} body={r['body']}")
+    # Publicar en SNS lo acumulado antes de que la Lambda congele el hilo de fondo
+    flush_notifications()
+    return {"batchItemFailures": failures}
+
+
+def _prefetched_bucket(future):
+    if future is None:
+        return None
+    try:
+        return future.result(timeout=30)
+    except Exception as e:
+        logger.warning(f"Prefetch del bucket falló ({e}). Lo vuelvo a cargar.")
+        return None
+
+
+def _prefetch_bucket(db, payload):
+    """Lanza en segundo plano el load_bucket del payload (None si es Ampliación o no hay id)."""
+    bucket_type = payload.get('bucket_type')
+    if bucket_type == "Ampliación" or not payload.get('bucket_id'):
+        return None
+    try:
+        bucket_id = ObjectId(payload['bucket_id'])
+    except Exception:
+        return None
+    return run_in_background(load_bucket, db, bucket_id, bucket_type)
+
+
+def _record_result(record, resp):
+    return {
+        "messageId": record.get('messageId'),
+        "statusCode": resp.get('statusCode', 500),
+        "body": resp.get('body')
+    }
+
+
+def process_record(payload, client, db, driver, session=None, prefetched=None):
+    """
+    Procesa un único bucket (o ampliación). Devuelve (respuesta, driver): el driver
+    vuelve en None si hubo que descartarlo, para que el próximo record cree uno nuevo.
+    session es el DriverSession a usar (default: el de la Lambda; worker.py pasa uno por hilo).
+    prefetched es un Future de load_bucket para este mismo bucket, si ya se lanzó.
+    Con TRACING=on emite los tiempos por fase del bucket (ver tracing.py) y con
+    WEBDRIVER_PROFILE=on el ranking de comandos WebDriver (ver webdriver_profiler.py).
+    """
+    doc_id = payload.get('ampliacion_id') or payload.get('bucket_id')
+    with bucket_trace(payload.get('bucket_type'), doc_id) as trace, profile_bucket(doc_id):
+        resp, driver = _process_record(payload, client, db, driver, session, prefetched)
+        trace.set_status(resp.get('statusCode'))
+        return resp, driver
+
+
+def _process_record(payload, client, db, driver, session, prefetched):
+    session = session or default_session()
+    bucket_db = db['bucket']
+    ampliacion_db = db['ampliacion']
+    try:
+        bucket_type = payload.get('bucket_type')
+
+        # Determine which collection/id to use
+        if bucket_type == "Ampliación":
+            doc_id_key = 'ampliacion_id'
+            db_collection = ampliacion_db
+        else:
+            doc_id_key = 'bucket_id'
+            db_collection = bucket_db
+
+        doc_id_value = payload.get(doc_id_key)
+        if not doc_id_value:
+            message = f"ERROR: Falló al pasar a la lambda {doc_id_key}. No se encontro ningun valor."
+            logger.error(message)
+            notify_error(message)
+            return {
+                "statusCode": 400,
+                "body": json.dumps(f'Invalid {doc_id_key}')
+            }, driver
+
+        if not ObjectId.is_valid(doc_id_value):
+            message = f"ERROR: {doc_id_key} inválido: {doc_id_value!r}. No es un ObjectId."
+            logger.error(message)
+            notify_error(message)
+            return {
+                "statusCode": 400,
+                "body": json.dumps(f'Invalid {doc_id_key}')
+            }, driver
+
+        doc_object_id = ObjectId(doc_id_value)
+        logger.info(f"{doc_id_key}: {doc_object_id}")
+        logger.info(f"Bucket_type: {bucket_type}")
+
+        bucket_data = None
+        try:
+            if bucket_type == "Ampliación":
+                document = db_collection.find_one({"_id": doc_object_id})
+            else:
+                # Bucket + observaciones en una sola agregación, compartidas con los fill_form_*
+                with span("mongo_load"):
+                    bucket_data = _prefetched_bucket(prefetched)
+                    if bucket_data is None:
+                        bucket_data = load_bucket(db, doc_object_id, bucket_type)
+                document = bucket_data.bucket if bucket_data else None
+            logger.info(f"{doc_id_key} found on collection")
+            if document is None:
+                message = f"ERROR: No document found with the provided {doc_id_key} {doc_object_id}"
+                logger.error(message)
+                raise Exception(message)
+            logger.info(f"Document found: {document}")
+        except Exception as e:
+            message = f"ERROR: An error occurred while trying to find the document: {e}"
+            logger.error(message)
+            notify_error(message)
+            raise
+
+        # Log in to DGR system. El driver se reutiliza entre records, pero session.get lo
+        # health-checkea y lo vuelve a principal.jsf antes de cada uno: el record anterior
+        # pudo haber fallado a mitad de un formulario.
+        try:
+            logger.info("Logging in to DGR system..." if driver is None else "Verificando la sesión DGR...")
+            user_dgr = os.environ.get('DGR_USERNAME')
+            password_dgr = os.environ.get('DGR_PASSWORD')
+            with span("session"):
+                driver = session.get(user_dgr, password_dgr)
+        except Exception as e:
+            session.discard()
+            message = f"Critical: No se pudo iniciar la sesión. Verifique las credenciales o la conexión: {e}"
+            logger.error(message)
+            notify_error(message)
+            return {
+                "statusCode": 500,
+                "body": json.dumps(message)
+            }, None
+
+        if driver is None:
+            message = "Critical: No se pudo iniciar la sesión. Verifique las credenciales o la conexión."
+            logger.error(message)
+            notify_error(message)
+            return {
+                "statusCode": 500,
+                "body": json.dumps(message)
+            }, None
+
+        logger.info(f"Driver initialized successfully: {driver}")
+
+        # Depending on bucket_type, call the appropriate fill_form_* function
+        form_result = None
+
+        if bucket_type == "Automotor":
+            logger.info("Starting Automotor...")
+            with span("fill_AM"):
+                form_result = fill_form_AM(doc_object_id, driver, client, bucket_data.automotores)
+
+        elif bucket_type == "Inmueble":
+            logger.info("Starting Inmueble...")
+            with span("fill_I"):
+                form_result = fill_form_I(doc_object_id, driver, client, bucket_data.inmuebles)
+
+        elif bucket_type == "Ampliación":
+            logger.info("Starting Ampliacion...")
+            with span("fill_Ampliacion"):
+                form_result = fill_form_Ampliacion(doc_object_id, driver, client)
+
+        elif bucket_type == "ACF":
+            logger.info("Starting ACF (Persona Jurídica)...")
+            with span("fill_PJ"):
+                form_result = fill_form_PJ(doc_object_id, driver, client, fisica_true=False,
+                                           observaciones=bucket_data.persona_juridica)
+
+        elif bucket_type in ["Persona", "Rubrica", "Comercio", "Prendas"]:
+            logger.info(f"Starting {bucket_type} flow...")
+            fisica_count = len(bucket_data.persona_fisica)
+            logger.info(f"Found {fisica_count} documents in persona_fisica for bucket_id: {doc_object_id}")
+
+            form_result = {"status": "success", "errors": []}
+
+            # If there are persona_fisica documents, fill PF first
+            if fisica_count > 0:
+                logger.info("Comenzando llenado Persona Física.")
+                with span("fill_PF"):
+                    result_pf = fill_form_PF(doc_object_id, driver, client, bucket_data.persona_fisica)
+                if result_pf["status"] != "success":
+                    notify_error(f"Error critico en Persona Fisica. Error: {result_pf['errors']}")
                     return {
                         "statusCode": 500,
-                        "body": json.dumps(message)
-                    }
+                        "body": json.dumps({
+                            "stage": "PersonaFísica",
+                            "status": "critical_error",
+                            "errors": result_pf["errors"]
+                        }, default=str)
+                    }, driver
+
+                logger.info("Persona Física llenado")
 
-                if driver is None:
-                    message = "Critical: No se pudo iniciar la sesión. Verifique las credenciales o la conexión."
-                    logger.error(message)
-                    notify_error(message)
+            # If count is not exactly 10 (and ≥ 0), assume PJ is needed
+            if fisica_count != 10:
+                logger.info("Comenzando llenado Persona Jurídica")
+                fisica_true = (fisica_count > 0)
+                with span("fill_PJ"):
+                    result_pj = fill_form_PJ(doc_object_id, driver, client, fisica_true,
+                                             observaciones=bucket_data.persona_juridica)
+                if result_pj["status"] == "critical_error":
                     return {
                         "statusCode": 500,
-                        "body": json.dumps(message)
-                    }
-
-                logger.info(f"Driver initialized successfully: {driver}")
-
-                # Depending on bucket_type, call the appropriate fill_form_* function
-                form_result = None
-
-                if bucket_type == "Automotor":
-                    logger.info("Starting Automotor...")
-                    form_result = fill_form_AM(doc_object_id, driver, client)
-
-                elif bucket_type == "Inmueble":
-                    logger.info("Starting Inmueble...")
-                    form_result = fill_form_I(doc_object_id, driver, client)
-
-                elif bucket_type == "Ampliación":
-                    logger.info("Starting Ampliacion...")
-                    form_result = fill_form_Ampliacion(doc_object_id, driver, client)
-
-                elif bucket_type == "ACF":
-                    logger.info("Starting ACF (Persona Jurídica)...")
-                    form_result = fill_form_PJ(doc_object_id, driver, client, fisica_true=False)
-
-                elif bucket_type in ["Persona", "Rubrica", "Comercio", "Prendas"]:
-                    persona_fisica_coll = db['persona_fisica']
-                    logger.info(f"Starting {bucket_type} flow...")
-                    fisica_count = persona_fisica_coll.count_documents({'id_bucket': doc_object_id})
-                    logger.info(f"Found {fisica_count} documents in persona_fisica for bucket_id: {doc_object_id}")
-
-                    form_result = {"status": "success", "errors": []}
-
-                    # If there are persona_fisica documents, fill PF first
-                    if fisica_count > 0:
-                        logger.info("Comenzando llenado Persona Física.")
-                        result_pf = fill_form_PF(doc_object_id, driver, client)
-                        if result_pf["status"] != "success":
-                            notify_error(f"Error critico en Persona Fisica. Error: {result_pf['errors']}")
-                            return {
-                                "statusCode": 500,
-                                "body": json.dumps({
-                                    "stage": "PersonaFísica",
-                                    "status": "critical_error",
-                                    "errors": result_pf["errors"]
-                                })
-                            }
-                        
-                        logger.info("Persona Física llenado")
-
-                    # If count is not exactly 10 (and ≥ 0), assume PJ is needed
-                    if fisica_count != 10:
-                        logger.info("Comenzando llenado Persona Jurídica")
-                        fisica_true = (fisica_count > 0)
-                        result_pj = fill_form_PJ(doc_object_id, driver, client, fisica_true)
-                        if result_pj["status"] == "critical_error":
-                            return {
-                                "statusCode": 500,
-                                "body": json.dumps({
-                                    "stage": "PersonaJurídica",
-                                    "status": "critical_error",
-                                    "errors": result_pj["errors"]
-                                })
-                            }
-                        if result_pj["status"] == "submission_error":
-                            logger.warning(f"Warnings during PJ: {result_pj['errors']}")
-                        logger.info("Persona Jurídica llenado")
+                        "body": json.dumps({
+                            "stage": "PersonaJurídica",
+                            "status": "critical_error",
+                            "errors": result_pj["errors"]
+                        }, default=str)
+                    }, driver
+                if result_pj["status"] == "submission_error":
+                    logger.warning(f"Warnings during PJ: {result_pj['errors']}")
+                logger.info("Persona Jurídica llenado")
 
-                else:
-                    message = f"ERROR: Bucket Type '{bucket_type}' no encontrado"
-                    logger.error(message)
-                    notify_error(message)
+        else:
+            message = f"ERROR: Bucket Type '{bucket_type}' no encontrado"
+            logger.error(message)
+            notify_error(message)
+            return {
+                "statusCode": 400,
+                "body": json.dumps(message)
+            }, driver
+
+        # Handle form_result errors/warnings
+        if form_result:
+            if form_result["status"] != "success":
+                notify_error(f"Error critico para {doc_id_key} {doc_object_id}. Error(es): {form_result['errors']}")
+                return {
+                    "statusCode": 500,
+                    "body": json.dumps({
+                        "stage": bucket_type,
+                        "status": "critical_error",
+                        "errors": form_result["errors"]
+                    }, default=str)
+                }, driver
+
+        # Submit form and generate talon
+        try:
+            if driver is not None:
+                logger.info(f"Submitting form and generating talon for {doc_id_key}: {doc_object_id}...")
+                with span("submit"):
+                    resp = submit_form_and_generate_talon(driver, doc_object_id, bucket_type, client)
+                if resp.get('statusCode') == 200:
+                    logger.info(f"Talon generated for {doc_id_key}: {doc_object_id}.")
                     return {
-                        "statusCode": 400,
-                        "body": json.dumps(message)
-                    }
-
-                # Handle form_result errors/warnings
-                if form_result:
-                    if form_result["status"] != "success":
-                        notify_error(f"Error critico para {doc_id_key} {doc_object_id}. Error(es): {form_result['errors']}")
-                        return {
-                            "statusCode": 500,
-                            "body": json.dumps({
-                                "stage": bucket_type,
-                                "status": "critical_error",
-                                "errors": form_result["errors"]
-                            })
-                        }
-                    
-                # Submit form and generate talon
-                try:
-                    if driver is not None:
-                        logger.info(f"Submitting form and generating talon for {doc_id_key}: {doc_object_id}...")
-                        resp = submit_form_and_generate_talon(driver, doc_object_id, bucket_type)
-                        if resp.get('statusCode') == 200:
-                            logger.info(f"Talon generated for {doc_id_key}: {doc_object_id}.")
-                            return {
-                                "statusCode": 200,
-                                "body": json.dumps("Processed bucket successfully")
-                            }
-                        else:
-                            error_msg = f"Error submitting talon para {doc_id_key} {doc_object_id}: statusCode {resp.get('statusCode')}"
-                            logger.error(error_msg)
-                            notify_error(error_msg)
-                            return {
-                                "statusCode": resp.get('statusCode', 500),
-                                "body": json.dumps(error_msg)
-                            }
-                    else:
-                        error_msg = "Driver is not initialized, cannot submit form."
-                        logger.error(error_msg)
-                        notify_error(error_msg)
-                        return {
-                            "statusCode": 500,
-                            "body": json.dumps(error_msg)
-                        }
-
-                except Exception as e:
-                    error_msg = f"Critical: Error submitting form or generating talon: {e}"
+                        "statusCode": 200,
+                        "body": json.dumps("Processed bucket successfully")
+                    }, driver
+                else:
+                    error_msg = f"Error submitting talon para {doc_id_key} {doc_object_id}: statusCode {resp.get('statusCode')}"
                     logger.error(error_msg)
                     notify_error(error_msg)
                     return {
-                        "statusCode": 500,
+                        "statusCode": resp.get('statusCode', 500),
                         "body": json.dumps(error_msg)
-                    }
-
-            except Exception as e:
-                logger.error(f"ERROR: An error occurred: {e}")
-                notify_error(f"Error en lambda_handler: {e}")
+                    }, driver
+            else:
+                error_msg = "Driver is not initialized, cannot submit form."
+                logger.error(error_msg)
+                notify_error(error_msg)
                 return {
                     "statusCode": 500,
-                    "body": json.dumps(f'Internal server error: {e}')
-                }
+                    "body": json.dumps(error_msg)
+                }, None
+
+        except Exception as e:
+            session.discard()
+            error_msg = f"Critical: Error submitting form or generating talon: {e}"
+            logger.error(error_msg)
+            notify_error(error_msg)
+            return {
+                "statusCode": 500,
+                "body": json.dumps(error_msg)
+            }, None
+
     except Exception as e:
+        session.discard()
         logger.error(f"ERROR: An error occurred: {e}")
         notify_error(f"Error en lambda_handler: {e}")
         return {
             "statusCode": 500,
             "body": json.dumps(f'Internal server error: {e}')
-        }
+        }, None
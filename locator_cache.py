@@ -0,0 +1,93 @@
+import logging
+
+from selenium.webdriver.remote.webelement import WebElement
+from selenium.common.exceptions import StaleElementReferenceException
+
+# Set up logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+# Cache de locators por página. Los ids de DGR (CTLAPE1FIS, CTLPADRONAUT2, BUTTON9...) son
+# estables, así que cada (by, locator) se resuelve una sola vez por carga de página y los
+# fillers reciben siempre el mismo handle.
+#
+# El handle es un CachedElement: un WebElement que recuerda su locator. Si GeneXus
+# re-renderizó el elemento tras un AJAX y el comando da StaleElementReferenceException,
+# se vuelve a buscar con el mismo locator y se reintenta el comando una vez, sin que el
+# filler se entere. Como es subclase de WebElement sirve igual para Select, ActionChains
+# y como argumento de execute_script (esos dos no pasan por el elemento: human_click
+# reintenta con refresh()).
+#
+# La cache se vacía en cada navegación (request_filter.navigate) y antes de cada
+# Agregar (waits.mark_submit), que es cuando GeneXus recarga el formulario. Si la página
+# cambió por otro camino (un click que navega), los handles viejos dan stale y se re-resuelven.
+
+
+class CachedElement(WebElement):
+    """WebElement que se re-resuelve solo cuando queda stale."""
+
+    def __init__(self, parent, id_, by, locator):
+        super().__init__(parent, id_)
+        self._by = by
+        self._locator = locator
+
+    def refresh(self):
+        """Vuelve a buscar el elemento con su locator (para los comandos que no pasan por él)."""
+        logger.info(f"[locator_cache] {self._locator} quedó stale. Re-resolviendo.")
+        self._id = self._parent.find_element(self._by, self._locator).id
+
+    def _retrying(self, call, *args):
+        try:
+            return call(*args)
+        except StaleElementReferenceException:
+            self.refresh()
+            return call(*args)
+
+    # Casi todos los comandos pasan por _execute; get_attribute e is_displayed van por
+    # execute_script con el elemento como argumento, así que se cubren aparte.
+    def _execute(self, command, params=None):
+        return self._retrying(super()._execute, command, params)
+
+    def get_attribute(self, name):
+        return self._retrying(super().get_attribute, name)
+
+    def is_displayed(self):
+        return self._retrying(super().is_displayed)
+
+
+def _cache_for(driver):
+    cache = getattr(driver, "_locator_cache", None)
+    if cache is None:
+        cache = {}
+        driver._locator_cache = cache
+    return cache
+
+
+def cached_element(driver, by, locator):
+    """find_element con cache por página. Lanza NoSuchElementException igual que find_element."""
+    cache = _cache_for(driver)
+    element = cache.get((by, locator))
+    if element is None:
+        found = driver.find_element(by, locator)
+        element = CachedElement(driver, found.id, by, locator)
+        cache[(by, locator)] = element
+    return element
+
+
+def is_cached(driver, by, locator):
+    return (by, locator) in _cache_for(driver)
+
+
+def remember(driver, by, locator, element):
+    """Guarda en la cache un elemento ya resuelto por otro camino (ej: execute_script en batch)."""
+    cached = CachedElement(driver, element.id, by, locator)
+    _cache_for(driver)[(by, locator)] = cached
+    return cached
+
+
+def invalidate(driver):
+    """Olvida todos los handles: la página cambió o está por recargarse."""
+    cache = getattr(driver, "_locator_cache", None)
+    if cache:
+        cache.clear()
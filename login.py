@@ -9,83 +9,131 @@ from selenium.webdriver.chrome.options import Options
 from selenium import webdriver    
 from selenium.webdriver.common.action_chains import ActionChains
 from tempfile import mkdtemp
+import shutil
 import logging
-from fake_useragent import UserAgent
+from browser_profile import CHROME_BINARY, prepare_profile_dir, get_user_agent, FAST_START_FLAGS
 from human_functions import human_type, human_click
 from notify_error import notify_error
+from request_filter import navigate, apply_rules, configure_options
+from tracing import span
+from webdriver_profiler import install_profiler
+from dgr_urls import dgr_url
 # Set up logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-def login(user_dgr, password_dgr):
+DGR_LOGIN_URL = dgr_url("/sr/principal.jsf")
+# Elemento que solo aparece con la sesión iniciada en principal.jsf
+LOGGED_IN_ELEMENT_ID = "j_id15:j_id30"
+
+
+def create_driver(user_data_dir=None):
+    """Levanta un Chrome headless nuevo, sin iniciar sesión en DGR."""
+    service = Service("/opt/chromedriver")
+
+    options = Options()
+    options.binary_location = CHROME_BINARY
+    options.add_argument("--headless=new")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--window-size=1280x1696")
+    options.add_argument("--single-process")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--disable-dev-tools")
+    options.add_argument("--no-zygote")
+    for flag in FAST_START_FLAGS:
+        options.add_argument(flag)
+    
+    
+    # Directorios temporales del driver: quit_driver los borra (si no se acumulan en /tmp entre invocaciones warm)
+    temp_dirs = [mkdtemp(), mkdtemp()]
+    if user_data_dir is None:
+        user_data_dir = prepare_profile_dir()
+        temp_dirs.append(user_data_dir)
+    options.add_argument(f"--user-data-dir={user_data_dir}")
+    options.add_argument(f"--data-path={temp_dirs[0]}")
+    options.add_argument(f"--disk-cache-dir={temp_dirs[1]}")
+    
+    options.add_argument(f'user-agent={get_user_agent()}')
+    
+    prefs = {
+    "download.default_directory": "/tmp",
+    "download.prompt_for_download": False,
+    "download.directory_upgrade": True,
+    "safebrowsing.enabled": True,
+    "plugins.always_open_pdf_externally": True
+    }
+    options.add_experimental_option("prefs", prefs)
+    configure_options(options)
+    
+
     try:
-        service = Service("/opt/chromedriver")
-
-        options = Options()
-        options.binary_location = '/opt/chrome/chrome'
-        options.add_argument("--headless=new")
-        options.add_argument("--no-sandbox")
-        options.add_argument("--disable-gpu")
-        options.add_argument("--window-size=1280x1696")
-        options.add_argument("--single-process")
-        options.add_argument("--disable-dev-shm-usage")
-        options.add_argument("--disable-dev-tools")
-        options.add_argument("--no-zygote")
-        
-        
-        options.add_argument(f"--user-data-dir={mkdtemp()}")
-        options.add_argument(f"--data-path={mkdtemp()}")
-        options.add_argument(f"--disk-cache-dir={mkdtemp()}")
-        
-        ua = UserAgent()
-        random_user_agent = ua.chrome
-        options.add_argument(f'user-agent={random_user_agent}')
-        
-        prefs = {
-        "download.default_directory": "/tmp",
-        "download.prompt_for_download": False,
-        "download.directory_upgrade": True,
-        "safebrowsing.enabled": True,
-        "plugins.always_open_pdf_externally": True
+        with span("chrome_launch"):
+            driver = webdriver.Chrome(service=service, options=options)
+    except Exception:
+        _remove_dirs(temp_dirs)
+        raise
+    driver._temp_dirs = temp_dirs
+    
+    driver.execute_cdp_cmd(
+        "Page.setDownloadBehavior",
+        {
+            "behavior": "allow",
+            "downloadPath": "/tmp"
         }
-        options.add_experimental_option("prefs", prefs)
-        
+    )
+    # Las reglas de DGR son las mismas para todas sus páginas: se aplican una vez acá
+    apply_rules(driver, DGR_LOGIN_URL)
+    return install_profiler(driver)
+
+
+def _remove_dirs(dirs):
+    for path in dirs:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def quit_driver(driver):
+    """Cierra el driver y borra los directorios temporales que le creó create_driver."""
+    try:
+        driver.quit()
+    finally:
+        _remove_dirs(getattr(driver, "_temp_dirs", []))
+
+
+def authenticate(driver, user_dgr, password_dgr):
+    """Completa el formulario de login de DGR sobre un driver ya creado."""
+    ########## LOGIN ###################
+    with span("login"):
+        navigate(driver, DGR_LOGIN_URL)
 
-        driver = webdriver.Chrome(service=service, options=options)
-        
-        driver.execute_cdp_cmd(
-            "Page.setDownloadBehavior",
-            {
-                "behavior": "allow",
-                "downloadPath": "/tmp"
-            }
-        )
-        ########## LOGIN ###################
-        driver.get("https://www.dgr.gub.uy/sr/principal.jsf")
-        
         # Encuentra y llena el campo de usuario
         username_field = driver.find_element(By.ID, "j_username")
         human_type(username_field,user_dgr)
-        
-        
+
+
         # Encuentra y llena el campo de contraseña
         password_field = driver.find_element(By.ID, "j_password")
         human_type(password_field, password_dgr)
-        
+
         login_button = driver.find_element(By.XPATH, "//input[@value='ingresar' and @type='submit']")
-        human_click(driver,login_button)        
+        human_click(driver,login_button)
         # Defino el wait. 10sec
         wait = WebDriverWait(driver, 20)
-        
+
         # Espera hasta que la página se cargue y el elemento esté disponible
-        wait.until(EC.presence_of_element_located((By.ID, "j_id15:j_id30")))
-        
-        return driver
+        wait.until(EC.presence_of_element_located((By.ID, LOGGED_IN_ELEMENT_ID)))
+    return driver
+
+
+def login(user_dgr, password_dgr):
+    try:
+        driver = create_driver()
+        return authenticate(driver, user_dgr, password_dgr)
         
     except Exception as e:
         logger.error(f"ERROR: An error occurred during login: {e}")
         notify_error(f"ERROR: An error occurred during login: {e}")
         if 'driver' in locals():
-            driver.quit()
+            quit_driver(driver)
         raise
-    
\ No newline at end of file
+    
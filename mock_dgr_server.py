@@ -0,0 +1,506 @@
+import os
+import sys
+import time
+import base64
+import random
+import logging
+import argparse
+import threading
+import uuid
+from html import escape
+from collections import Counter
+from datetime import datetime
+from http.cookies import SimpleCookie
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs, quote
+
+# Set up logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+# Servidor local que se hace pasar por www.dgr.gub.uy para medir los fill_form_* y el
+# submit sin tocar DGR. Arma páginas con los mismos ids, names y estructura (las XPath
+# absolutas de PJ y AM incluidas) y reproduce el comportamiento que usamos:
+#   - /sr/principal.jsf: login (j_username/j_password) y tabla j_id78 de solicitudes
+#   - /etimbreapp/servlet/hpersolicitudform?1/?2, hsolicitudform?3, hformauxremotas?4:
+#     "Agregar" recarga la página con una fila más en la grilla; BUTTON1 envía la solicitud
+#   - /etimbreapp/servlet/hsolicitudampliacion: Recuperar + Confirmar
+#   - j_id78:generarTalon devuelve el talón como PDF adjunto
+#
+#   python mock_dgr_server.py --port 8765 --latency-ms 150 --jitter-ms 50 --error-rate 0.01
+#   DGR_BASE_URL=http://127.0.0.1:8765 python benchmark.py ...
+#
+# Con --recordings DIR, un GET cuyo archivo exista en DIR (ver recording_name) devuelve
+# la página grabada tal cual en lugar de la sintética.
+
+# Opciones de los combos. benchmark.py genera observaciones solo con estos valores.
+DEPARTAMENTOS = ["MONTEVIDEO", "CANELONES", "MALDONADO", "COLONIA", "SALTO"]
+LOCALIDADES = ["MONTEVIDEO", "LAS PIEDRAS", "PUNTA DEL ESTE", "COLONIA DEL SACRAMENTO", "SALTO"]
+MARCAS = ["CHEVROLET", "FIAT", "VOLKSWAGEN", "TOYOTA"]
+MODELOS = ["ONIX", "UNO", "GOL", "COROLLA"]
+TIPOS_AUTOMOTOR = ["AUTOMOVIL", "CAMIONETA", "MOTO"]
+NIVELES = ["PB", "1", "2", "3"]
+
+SUCCESS_MESSAGE = "SOLICITUD PROCESADA CON EXITO"
+VIEWER_ERROR_MESSAGE = "Debe marcar alguna sección"
+
+# PNG de 1x1: algo que request_filter pueda bloquear
+_LOGO_PNG = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg=="
+)
+
+# gxonchange existe en las páginas de GeneXus: form_engine y fill_form_AM lo llaman si está
+_PAGE_JS = """
+function gxonchange(el) { el.setAttribute('data-gx-changed', '1'); }
+function gxautocheck(el, name) { if (el.value) { document.getElementsByName(name)[0].checked = true; } }
+"""
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Controles
+# ──────────────────────────────────────────────────────────────────────────────
+
+def _text(locator, value="", readonly=False, autocheck=None):
+    attrs = " readonly" if readonly else ""
+    if autocheck:
+        attrs += f" onblur=\"gxautocheck(this, '{autocheck}')\""
+    return f'<input type="text" id="{locator}" name="{locator}" value="{escape(str(value))}"{attrs}>'
+
+
+def _select(locator, options, gxrow=False):
+    attrs = ' gxrow="0001"' if gxrow else ""
+    items = ['<option value="0">(Seleccione)</option>']
+    items += [f'<option value="{i}">{escape(o)}</option>' for i, o in enumerate(options, 1)]
+    return f'<select id="{locator}" name="{locator}"{attrs} onchange="gxonchange(this)">{"".join(items)}</select>'
+
+
+def _checkbox(locator):
+    return f'<input type="checkbox" id="{locator}" name="{locator}" value="S">'
+
+
+def _button(name, label, submit=True):
+    kind = "submit" if submit else "button"
+    return f'<input type="{kind}" id="{name}" name="{name}" value="{escape(label)}">'
+
+
+def _persona_rows(form):
+    """Filas de PF/PJ a partir de PF_FIELDS/PJ_FIELDS, así el mock sigue a los fillers."""
+    if form == "PF":
+        from fill_form_PF import PF_FIELDS as fields
+    else:
+        from fill_form_PJ import PJ_FIELDS as fields
+    autocheck = {"CTLANORUBJUR": "CTLRUBJUR"}
+    cells = []
+    for spec in fields:
+        if spec["kind"] == "checkbox":
+            control = _checkbox(spec["locator"])
+        else:
+            control = _text(spec["locator"], autocheck=autocheck.get(spec["locator"]))
+        if spec.get("after_click"):
+            control += f' <span id="{spec["after_click"]}">[cal]</span>'
+        cells.append((spec["label"], control))
+    return [cells[i:i + 2] for i in range(0, len(cells), 2)]
+
+
+def _am_rows(count):
+    # Las localidades anteriores se buscan por XPath: tienen que quedar en la fila 7 y 8, columna 4
+    return [
+        [("Padrón", _text("CTLPADRONAUT2")), ("Departamento", _select("_DEPAUT", DEPARTAMENTOS))],
+        [("Localidad", _select("CTLLOCAUT2", LOCALIDADES)), ("Marca", _select("_MARCASAUT", MARCAS, gxrow=True))],
+        [("Modelo", _select("CTLIDENTRG_MODELOS_AUTOMOTOREDIT", MODELOS, gxrow=True)),
+         ("Tipo", _select("CTLIDENTRG_TIPOS_AUTOMOTOREDIT", TIPOS_AUTOMOTOR, gxrow=True))],
+        [("Placa municipal", _text("CTLPLACAMUNICIPALAUTEDIT")), ("Año", _text("CTLANOAUTEDIT"))],
+        [("Automotores", _text("_NROAUTOMOT", count, readonly=True)), None],
+        [("Padrón anterior 1", _text("CTLPADRONAUT3")), ("Departamento anterior 1", _select("_DEPAUT2", DEPARTAMENTOS))],
+        [("Placa municipal 1", _text("CTLPLACAMUNICIPALAUT2")), ("Localidad anterior 1", _select("CTLLOCAUT3", LOCALIDADES))],
+        [("Departamento anterior 2", _select("_DEPAUT3", DEPARTAMENTOS)), ("Localidad anterior 2", _select("CTLLOCAUT4", LOCALIDADES))],
+        [("Padrón anterior 2", _text("CTLPADRONAUT4")), ("Placa municipal 2", _text("CTLPLACAMUNICIPALAUT3"))],
+    ]
+
+
+# Ids reales de padrón/localidad anterior por índice HTML (mismos mapas que fill_form_I)
+_I_PADRON_IDS = {3: "CTLPADRONINM3", 4: "CTLPADRONINM4", 5: "CTLPADRONINM5", 6: "CTLPADRONINM6",
+                 7: "CTLPADRONINM22", 8: "CTLPADRONINM7", 9: "CTLPADRONINM8", 10: "CTLPADRONINM9",
+                 11: "CTLPADRONINM10", 12: "CTLPADRONINM11"}
+_I_LOC_IDS = {3: "CTLLOCINM3", 4: "CTLLOCINM4", 5: "CTLLOCINM5", 6: "CTLLOCINM12", 7: "CTLLOCINM6",
+              8: "CTLLOCINM7", 9: "CTLLOCINM8", 10: "CTLLOCINM13", 11: "CTLLOCINM10", 12: "CTLLOCINM11"}
+
+
+def _i_rows(count):
+    rows = [
+        [("Departamento", _select("_DEPINM", DEPARTAMENTOS)), ("Localidad", _select("CTLLOCINM2", LOCALIDADES))],
+        [("Padrón", _text("_PADONINMAUX")), ("Sección judicial", _text("CTLSJINM"))],
+        [("Block", _text("CTLBLOCKINM2")), ("Nivel", _select("CTLNIVELINM2", NIVELES))],
+        [("Unidad", _text("CTLUNIDADINM2")), ("Inmuebles", _text("_NROINM", count, readonly=True))],
+    ]
+    for idx in range(3, 13):
+        rows.append([(f"Padrón anterior {idx - 2}", _text(_I_PADRON_IDS[idx])),
+                     (f"Localidad anterior {idx - 2}", _select(_I_LOC_IDS[idx], LOCALIDADES))])
+    return rows
+
+
+_SEND_BUTTONS = '<select id="CTLSEDESOL" name="CTLSEDESOL"><option value="">(Seleccione)</option>' \
+                '<option value="X">MONTEVIDEO</option><option value="Y">INTERIOR</option></select> ' \
+                + _button("BUTTON1", "Enviar Solicitud")
+
+_PERSONA_TABS = [("Persona Física", "hpersolicitudform?1"), ("Persona Jurídica", "hpersolicitudform?2")]
+
+# Formularios de etimbreapp por "página?query". grid = lista de filas en la sesión.
+FORMS = {
+    "hpersolicitudform?1": {"title": "Persona Física", "grid": "persona", "add": "BUTTON5",
+                            "tabs": _PERSONA_TABS, "rows": lambda count: _persona_rows("PF")},
+    "hpersolicitudform?2": {"title": "Persona Jurídica", "grid": "persona", "add": "BUTTON9",
+                            "tabs": _PERSONA_TABS, "rows": lambda count: _persona_rows("PJ")},
+    "hsolicitudform?3": {"title": "Automotores", "grid": "automotores", "add": "BUTTON2",
+                         "tabs": [("Automotores",)], "rows": _am_rows},
+    "hformauxremotas?4": {"title": "Inmuebles", "grid": "inmuebles", "add": "BUTTON3",
+                          "tabs": [("Inmuebles", None, "tab4")], "rows": _i_rows,
+                          "extra": " ".join(_button(f"CargarOtro{i}", "Cargar otro", submit=False)
+                                            for i in range(3, 11))},
+}
+
+
+def _tab(label, href=None, tab_id=None):
+    attrs = f' id="{tab_id}"' if tab_id else ""
+    if href:
+        attrs += f" onclick=\"location.href='{href}'\""
+    return f'<td class="Tab"{attrs}>{escape(label)}</td>'
+
+
+def _layout(title, action, tabs, rows, grid=(), message="", extra="", buttons="", hidden=""):
+    """
+    Esqueleto de tablas de GeneXus. Sin DOCTYPE (quirks, como DGR): así el <table> queda
+    dentro del <p> y las XPath absolutas de los fillers resuelven igual que en producción.
+    """
+    tab_cells = "".join(_tab(*tab) for tab in tabs)
+    field_rows = []
+    for pair in rows:
+        cells = []
+        for cell in pair:
+            cells.append(f"<td>{escape(cell[0])}</td><td>{cell[1]}</td>" if cell else "<td></td><td></td>")
+        field_rows.append(f"<tr>{''.join(cells)}</tr>")
+    grid_rows = "".join(f'<tr class="GridRow"><td>{i}</td><td>{escape(row)}</td></tr>' for i, row in enumerate(grid, 1))
+    viewer = f'<span class="ErrorViewer">{escape(message)}</span>' if message else ""
+    return f"""<html><head><title>{escape(title)}</title><script>{_PAGE_JS}</script></head>
+<body>
+<form name="MAINFORM" method="post" action="{escape(action)}">
+<h2><table><tbody>
+<tr><td><img src="/static/logo.png" alt="DGR"> {escape(title)}</td></tr>
+<tr><td>{viewer}</td></tr>
+<tr><td><table><tbody>
+<tr><td><span><table><tbody><tr>{tab_cells}</tr></tbody></table></span></td></tr>
+<tr><td><table><tbody>
+<tr><td>{hidden}</td></tr>
+<tr><td>{extra}</td></tr>
+<tr><td><div><table><tbody><tr><td><p><table><tbody>{''.join(field_rows)}</tbody></table><table class="Grid"><tbody>{grid_rows}</tbody></table></p></td></tr></tbody></table></div></td></tr>
+<tr><td>{buttons}</td></tr>
+</tbody></table></td></tr>
+</tbody></table></td></tr>
+</tbody></table></h2>
+</form>
+</body></html>"""
+
+
+def talon_pdf(numeros):
+    """PDF mínimo (una página, Helvetica) con los números de solicitud del talón."""
+    text = ("Talon de pago DGR - Solicitud " + ", ".join(numeros)).encode("latin-1")
+    content = b"BT /F1 14 Tf 72 720 Td (" + text + b") Tj ET"
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R "
+        b"/Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + obj + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def recording_name(path, query=""):
+    """Archivo de --recordings para una URL: /etimbreapp/servlet/hsolicitudform?3 -> etimbreapp_servlet_hsolicitudform_3.html"""
+    name = path.strip("/").replace("/", "_")
+    if query:
+        name += "_" + query.replace("&", "_").replace("=", "-")
+    return name + ".html"
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Estado y comportamiento
+# ──────────────────────────────────────────────────────────────────────────────
+
+class MockDGR:
+    """Estado del mock: sesiones (JSESSIONID), solicitudes enviadas y la configuración de fallas."""
+
+    def __init__(self, latency_ms=0, jitter_ms=0, error_rate=0.0, viewer_error_rate=0.0,
+                 recordings=None, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.viewer_error_rate = viewer_error_rate
+        self.recordings = recordings
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.sessions = {}
+        self.solicitudes = []
+        self.next_numero = 1000001
+        self.requests = Counter()
+
+    def delay(self):
+        if self.latency_ms or self.jitter_ms:
+            with self.lock:
+                jitter = self.random.uniform(-self.jitter_ms, self.jitter_ms)
+            time.sleep(max(0.0, self.latency_ms + jitter) / 1000)
+
+    def chance(self, rate):
+        with self.lock:
+            return rate > 0 and self.random.random() < rate
+
+    def session(self, cookie_header):
+        """Devuelve (sid, sesión, nueva)."""
+        cookies = SimpleCookie(cookie_header or "")
+        sid = cookies["JSESSIONID"].value if "JSESSIONID" in cookies else None
+        with self.lock:
+            if sid in self.sessions:
+                return sid, self.sessions[sid], False
+            sid = uuid.uuid4().hex
+            self.sessions[sid] = {"logged_in": False, "grids": {}}
+            return sid, self.sessions[sid], True
+
+    def add_solicitud(self, tipo, numero=None):
+        with self.lock:
+            if numero is None:
+                numero = str(self.next_numero)
+                self.next_numero += 1
+            solicitud = {"numero": numero, "tipo": tipo, "estado": "Pendiente",
+                         "fecha": datetime.now().strftime("%d/%m/%Y %H:%M")}
+            self.solicitudes.append(solicitud)
+            return solicitud
+
+    def ampliaciones_de(self, numero):
+        with self.lock:
+            return sum(1 for s in self.solicitudes if s["numero"] == numero and s["tipo"].startswith("Ampliación"))
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "MockDGR/1.0"
+
+    def log_message(self, fmt, *args):
+        logger.debug("[mock_dgr] " + fmt % args)
+
+    def do_GET(self):
+        self._dispatch({})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length).decode("utf-8", "replace")
+        self._dispatch({k: v[-1] for k, v in parse_qs(body, keep_blank_values=True).items()})
+
+    def _dispatch(self, data):
+        dgr = self.server.dgr
+        url = urlsplit(self.path)
+        dgr.requests[url.path] += 1
+        dgr.delay()
+
+        if url.path == "/static/logo.png":
+            return self._send(200, _LOGO_PNG, "image/png")
+        if dgr.chance(dgr.error_rate):
+            return self._send(500, "<html><body><h1>500 - Error interno (inyectado)</h1></body></html>")
+
+        self.sid, self.session_state, self.new_session = dgr.session(self.headers.get("Cookie"))
+        if self.command == "GET" and dgr.recordings:
+            recorded = os.path.join(dgr.recordings, recording_name(url.path, url.query))
+            if os.path.exists(recorded):
+                with open(recorded, "rb") as f:
+                    return self._send(200, f.read())
+
+        if url.path == "/sr/j_security_check" and self.command == "POST":
+            return self._login(data)
+        if url.path == "/sr/principal.jsf":
+            return self._principal(url, data)
+        if not self.session_state["logged_in"]:
+            return self._redirect("/sr/principal.jsf")
+        if url.path == "/sr/solicitud.jsf":
+            return self._solicitud(url, data)
+        if url.path == "/etimbreapp/servlet/hsolicitudampliacion":
+            return self._ampliacion(data)
+        key = url.path.rsplit("/", 1)[-1] + ("?" + url.query if url.query else "")
+        if url.path.startswith("/etimbreapp/servlet/") and key in FORMS:
+            return self._form(key, url, data)
+        return self._send(404, "<html><body><h1>404</h1></body></html>")
+
+    # —— Respuestas ——
+
+    def _send(self, status, body, content_type="text/html; charset=utf-8", headers=None):
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if getattr(self, "new_session", False):
+            self.send_header("Set-Cookie", f"JSESSIONID={self.sid}; Path=/; HttpOnly")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _redirect(self, location):
+        self._send(302, "", headers={"Location": location})
+
+    def _talon(self, numeros):
+        pdf = talon_pdf(numeros)
+        filename = f"talon_{numeros[0] if numeros else 'vacio'}.pdf"
+        self._send(200, pdf, "application/pdf", {"Content-Disposition": f'attachment; filename="{filename}"'})
+
+    # —— /sr ——
+
+    def _login(self, data):
+        if data.get("j_username") and data.get("j_password"):
+            self.session_state["logged_in"] = True
+        self._redirect("/sr/principal.jsf")
+
+    def _principal(self, url, data):
+        if not self.session_state["logged_in"]:
+            return self._send(200, """<html><head><title>DGR - Ingreso</title></head><body>
+<form method="post" action="/sr/j_security_check">
+<input type="text" id="j_username" name="j_username">
+<input type="password" id="j_password" name="j_password">
+<input type="submit" value="ingresar">
+</form></body></html>""")
+        dgr = self.server.dgr
+        with dgr.lock:
+            solicitudes = list(reversed(dgr.solicitudes))
+        if "j_id78:generarTalon" in data:
+            selected = [s["numero"] for i, s in enumerate(solicitudes) if data.get(f"j_id78:dataTable:{i}:sel")]
+            return self._talon(selected)
+
+        limit = int(parse_qs(url.query).get("rows", ["10"])[0])
+        rows = []
+        for i, s in enumerate(solicitudes[:limit]):
+            prefix = f"j_id78:dataTable:{i}"
+            rows.append(
+                f'<tr><td><input type="checkbox" name="{prefix}:sel" value="on"></td>'
+                + "".join(f'<td><span id="{prefix}:{field}">{escape(s[key])}</span></td>'
+                          for field, key in (("numero", "numero"), ("tipo", "tipo"),
+                                             ("estado_deuda", "estado"), ("fecha_emision", "fecha")))
+                + "</tr>"
+            )
+        self._send(200, f"""<html><head><title>DGR - Principal</title></head><body>
+<img src="/static/logo.png" alt="DGR"> <span id="j_id15:j_id30">Cerrar sesión</span>
+<form id="j_id78" name="j_id78" method="post" action="/sr/principal.jsf">
+<a href="/sr/principal.jsf?rows=10">10</a> <a href="/sr/principal.jsf?rows=50">50</a>
+<table><tbody id="j_id78:dataTable:tb">{''.join(rows)}</tbody></table>
+<input type="submit" id="j_id78:generarTalon" name="j_id78:generarTalon" value="Generar Talón">
+</form></body></html>""")
+
+    def _solicitud(self, url, data):
+        numero = parse_qs(url.query).get("numero", [""])[0]
+        if "j_id78:generarTalon" in data:
+            return self._talon([numero])
+        info = datetime.now().strftime("%d/%m/%Y %H:%M")
+        self._send(200, f"""<html><head><title>DGR - Solicitud</title></head><body>
+<form id="j_id78" name="j_id78" method="post" action="/sr/solicitud.jsf?numero={quote(numero)}">
+<table>
+<tr><td class="colHeader1"><span>Número</span></td><td class="colHeader2">{escape(numero)}</td></tr>
+<tr><td class="colHeader1"><span>Información al día</span></td><td class="colHeader2">{info}</td></tr>
+</table>
+<input type="submit" id="j_id78:generarTalon" name="j_id78:generarTalon" value="Generar Talón">
+</form></body></html>""")
+
+    # —— /etimbreapp ——
+
+    def _form(self, key, url, data):
+        dgr = self.server.dgr
+        form = FORMS[key]
+        grids = self.session_state["grids"]
+        grid = grids.setdefault(form["grid"], [])
+        message = ""
+        if "BUTTON1" in data:
+            # Enviar Solicitud: la sesión arranca de cero y se muestra el número asignado
+            solicitud = dgr.add_solicitud("Solicitud")
+            grids.clear()
+            return self._redirect(f"/sr/solicitud.jsf?numero={solicitud['numero']}")
+        if form["add"] in data:
+            if dgr.chance(dgr.viewer_error_rate):
+                message = VIEWER_ERROR_MESSAGE
+            else:
+                filled = [v for k, v in data.items() if k.startswith(("CTL", "_")) and v not in ("", "0")]
+                grid.append(" / ".join(filled) or "(vacía)")
+
+        action = url.path + ("?" + url.query if url.query else "")
+        self._send(200, _layout(
+            form["title"], action, form["tabs"], form["rows"](len(grid)), grid, message,
+            extra=form.get("extra", ""), buttons=f'{_button(form["add"], "Agregar")} {_SEND_BUTTONS}',
+        ))
+
+    def _ampliacion(self, data):
+        dgr = self.server.dgr
+        message = ""
+        if "BUTTON2" in data:
+            if dgr.chance(dgr.viewer_error_rate):
+                message = VIEWER_ERROR_MESSAGE
+            else:
+                numero = data.get("_NROSOLIC", "").strip()
+                dgr.add_solicitud(f"Ampliación {dgr.ampliaciones_de(numero) + 1}", numero)
+                message = SUCCESS_MESSAGE
+
+        rows = [[("Número de solicitud", _text("_NROSOLIC")), ("Fecha de emisión", _text("_FCHEM"))]]
+        # Recuperar no recarga la página: completa la fecha de emisión propuesta en el lugar
+        recuperar = (
+            '<input type="button" id="BUTTON1" name="BUTTON1" value="Recuperar" '
+            f"onclick=\"document.getElementById('_FCHEM').value = '{datetime.now():%d/%m/%Y}'\">"
+        )
+        self._send(200, _layout(
+            "Ampliación", "/etimbreapp/servlet/hsolicitudampliacion", [("Ampliación",)], rows,
+            message=message, buttons=f'{recuperar} {_button("BUTTON2", "Confirmar")}',
+        ))
+
+
+def start_server(host="127.0.0.1", port=0, **config):
+    """Levanta el mock en un hilo de fondo. Devuelve el server (server.dgr = estado, server.base_url)."""
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    server.dgr = MockDGR(**config)
+    server.base_url = f"http://{host}:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, name="mock-dgr", daemon=True).start()
+    logger.info(f"[mock_dgr] Escuchando en {server.base_url}")
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servidor local que simula www.dgr.gub.uy.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0, help="latencia agregada a cada request")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="variación uniforme ± sobre la latencia")
+    parser.add_argument("--error-rate", type=float, default=0, help="fracción de requests que devuelven 500")
+    parser.add_argument("--viewer-error-rate", type=float, default=0,
+                        help="fracción de Agregar/Confirmar que responden con un ErrorViewer")
+    parser.add_argument("--recordings", metavar="DIR", help="directorio con páginas grabadas a reproducir")
+    parser.add_argument("--seed", type=int, default=None, help="semilla para latencia y fallas")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    server = ThreadingHTTPServer((args.host, args.port), _Handler)
+    server.dgr = MockDGR(args.latency_ms, args.jitter_ms, args.error_rate, args.viewer_error_rate,
+                         args.recordings, args.seed)
+    logger.info(f"[mock_dgr] Escuchando en http://{args.host}:{args.port} (DGR_BASE_URL para apuntar los fillers)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
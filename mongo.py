@@ -0,0 +1,51 @@
+import os
+import time
+import logging
+import threading
+
+from pymongo import MongoClient
+
+# Set up logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Un solo MongoClient por contenedor: vive a nivel de módulo y sobrevive entre
+# invocaciones "warm" de la Lambda, así el handshake TLS y el descubrimiento del
+# cluster se pagan una vez y no en cada bucket.
+_client = None
+_lock = threading.Lock()
+
+
+def _pool_options():
+    """Opciones del pool, ajustables por variables de entorno."""
+    return {
+        # Un contenedor de Lambda procesa un record a la vez: pocas conexiones alcanzan
+        "maxPoolSize": int(os.environ.get("MONGO_MAX_POOL_SIZE", "10")),
+        "minPoolSize": int(os.environ.get("MONGO_MIN_POOL_SIZE", "0")),
+        # Cerrar conexiones ociosas antes de que las corte el NAT/Atlas mientras el contenedor está congelado
+        "maxIdleTimeMS": int(os.environ.get("MONGO_MAX_IDLE_TIME_MS", "240000")),
+        "serverSelectionTimeoutMS": int(os.environ.get("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000")),
+        "connectTimeoutMS": int(os.environ.get("MONGO_CONNECT_TIMEOUT_MS", "5000")),
+        "retryWrites": True,
+    }
+
+
+def get_mongo_client():
+    """Devuelve el MongoClient compartido, creándolo la primera vez."""
+    global _client
+    if _client is None:
+        # Lock: en worker.py varios hilos pueden pedir el cliente a la vez
+        with _lock:
+            if _client is None:
+                start = time.time()
+                _client = MongoClient(os.environ.get("MONGODB_URI"), **_pool_options())
+                logger.info(f"[mongo] MongoClient creado en {time.time() - start:.3f}s")
+    return _client
+
+
+def close_mongo_client():
+    """Cierra el cliente compartido (el próximo get_mongo_client crea uno nuevo)."""
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
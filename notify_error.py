@@ -1,14 +1,126 @@
 import os
-import boto3
+import re
 import json
+import logging
+import threading
+from collections import OrderedDict
 
-sns_client = boto3.client('sns', region_name='us-east-1')
-ERROR_SNS_TOPIC_ARN = os.environ['ERROR_SNS_TOPIC_ARN']
+from aws_clients import get_client
+
+logger = logging.getLogger()
+
+SUBJECT = "Error RedNotarial: fill_forms"
+# SNS acepta hasta 256 KB por mensaje; dejo margen para el encabezado
+MAX_MESSAGE_BYTES = 250 * 1024
+# Cada cuánto el hilo publica lo acumulado aunque nadie llame a flush_notifications
+FLUSH_WINDOW_SECONDS = float(os.environ.get('NOTIFY_FLUSH_WINDOW_SECONDS', '30'))
+
+# Los errores de Selenium traen stacktrace y session info que cambian entre llamadas:
+# los saco para que dos mensajes "iguales" coalescan.
+_NOISE = re.compile(r"(\n?\s*Stacktrace:.*|\(Session info:[^)]*\))", re.DOTALL)
+_SPACES = re.compile(r"\s+")
+
+
+def _coalesce_key(message):
+    return _SPACES.sub(" ", _NOISE.sub("", message)).strip()
+
+
+def _split(text, limit):
+    """Parte un texto en trozos de a lo sumo limit bytes en UTF-8."""
+    data = text.encode("utf-8")
+    return [data[i:i + limit].decode("utf-8", errors="ignore") for i in range(0, len(data), limit)]
+
+
+def _chunks(entries):
+    """Arma los mensajes a publicar, agrupando entradas hasta MAX_MESSAGE_BYTES."""
+    chunks, current, size = [], [], 0
+    for message, count in entries:
+        text = message if count == 1 else f"{message}\n(repetido {count} veces)"
+        for part in _split(text, MAX_MESSAGE_BYTES):
+            part_size = len(part.encode("utf-8")) + 2
+            if current and size + part_size > MAX_MESSAGE_BYTES:
+                chunks.append("\n\n".join(current))
+                current, size = [], 0
+            current.append(part)
+            size += part_size
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+class _Notifier:
+    """
+    Acumula los errores en memoria y los publica en SNS desde un hilo de fondo, así
+    el llenado de formularios nunca espera a SNS. Los mensajes repetidos (mismo texto
+    salvo stacktrace/espacios) se publican una sola vez con la cantidad de repeticiones.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = OrderedDict()  # clave -> [mensaje, repeticiones]
+        self._pending_bytes = 0
+        self._wake = threading.Event()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._thread = None
+
+    def enqueue(self, message):
+        key = _coalesce_key(message)
+        with self._lock:
+            entry = self._pending.get(key)
+            if entry:
+                entry[1] += 1
+            else:
+                self._pending[key] = [message, 1]
+                self._pending_bytes += len(message.encode("utf-8"))
+            self._idle.clear()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="notify_error", daemon=True)
+                self._thread.start()
+            if self._pending_bytes >= MAX_MESSAGE_BYTES:
+                self._wake.set()
+
+    def flush(self, timeout=10):
+        """Pide publicar ya lo pendiente y espera hasta timeout segundos. True si quedó todo enviado."""
+        self._wake.set()
+        return self._idle.wait(timeout)
+
+    def _run(self):
+        while True:
+            self._wake.wait(FLUSH_WINDOW_SECONDS)
+            self._wake.clear()
+            self._publish_pending()
+
+    def _publish_pending(self):
+        with self._lock:
+            entries = list(self._pending.values())
+            self._pending.clear()
+            self._pending_bytes = 0
+        try:
+            if not entries:
+                return
+            # Se lee al publicar (no al importar) para poder importar el módulo sin AWS
+            topic_arn = os.environ['ERROR_SNS_TOPIC_ARN']
+            sns_client = get_client('sns', region_name='us-east-1')
+            for chunk in _chunks(entries):
+                sns_client.publish(TopicArn=topic_arn, Subject=SUBJECT, Message=chunk)
+        except Exception as e:
+            logger.error(f"[notify_error] No pude publicar en SNS: {e}. Mensajes: {json.dumps(entries, default=str)}")
+        finally:
+            with self._lock:
+                if not self._pending:
+                    self._idle.set()
+
+
+_notifier = _Notifier()
 
 
 def notify_error(message):
-    return sns_client.publish(
-        TopicArn=ERROR_SNS_TOPIC_ARN,
-        Subject="Error RedNotarial: fill_forms",
-        Message=message
-    )
+    """Encola el error para SNS; no bloquea. Se publica al llamar flush_notifications o cada ventana."""
+    _notifier.enqueue(str(message))
+
+
+def flush_notifications(timeout=10):
+    """Llamar antes de que termine el handler: la Lambda congela los hilos al retornar."""
+    if not _notifier.flush(timeout):
+        logger.warning(f"[notify_error] Quedaron notificaciones sin publicar tras {timeout}s.")
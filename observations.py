@@ -0,0 +1,92 @@
+import time
+import logging
+from collections import namedtuple
+
+# Set up logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+# Campos que leen los fill_form_* de cada colección. Todo lo demás se queda en Mongo.
+_OBSERVATION_FIELDS = {
+    "persona_fisica": [
+        "_id", "ci", "primerApellido", "segundoApellido", "primerNombre", "segundoNombre",
+        "tercerNombre", "interdicciones", "cesionDerechosHereditariosDesde",
+        "cesionDerechosHereditariosHasta", "negociosExGanancialesDesde", "negociosExGanancialesHasta",
+        "mandatosDia", "mandatosMes", "mandatosAno", "mandatoDesde", "mandatoHasta",
+        "comercio", "prendas", "rubicaYear", "rubrica",
+    ],
+    "persona_juridica": [
+        "_id", "rut", "bps", "nombre", "interdicciones", "mandatosDia", "mandatosMes",
+        "mandatosAno", "mandatoDesde", "mandatoHasta", "sociedadCivilDesde", "sociedadCivilHasta",
+        "comercio", "prendas", "rubricaYear", "rubrica", "acf",
+    ],
+    "automotores": [
+        "_id", "padronActual", "departamento", "localidad", "marca", "modelo", "tipoAutomotor",
+        "placaMunicipal", "year",
+        "padronAnterior1", "departamentoAnterior1", "localidadAnterior1", "placaMunicipal1",
+        "padronAnterior2", "departamentoAnterior2", "localidadAnterior2", "placaMunicipal2",
+    ],
+    "inmuebles": (
+        ["_id", "departamento", "localidad", "padronActual", "seccionJudicial", "block", "nivel", "unidad"]
+        + [f"padronAnterior{i}" for i in range(1, 11)]
+        + [f"localidadAnterior{i}" for i in range(1, 11)]
+    ),
+}
+
+# Colecciones de observaciones que necesita cada bucket_type
+_COLLECTIONS_BY_TYPE = {
+    "Automotor": ["automotores"],
+    "Inmueble": ["inmuebles"],
+    "ACF": ["persona_juridica"],
+    "Persona": ["persona_fisica", "persona_juridica"],
+    "Rubrica": ["persona_fisica", "persona_juridica"],
+    "Comercio": ["persona_fisica", "persona_juridica"],
+    "Prendas": ["persona_fisica", "persona_juridica"],
+}
+
+# El bucket y sus observaciones, ya materializados. Las observaciones son listas de
+# dicts con solo los campos de _OBSERVATION_FIELDS (los fillers usan .get, así que
+# un campo ausente se comporta igual que antes).
+BucketData = namedtuple("BucketData", ["bucket", "persona_fisica", "persona_juridica", "automotores", "inmuebles"])
+
+
+def _lookup_stages(collection):
+    fields = _OBSERVATION_FIELDS[collection]
+    return [
+        {"$lookup": {"from": collection, "localField": "_id", "foreignField": "id_bucket", "as": collection}},
+        # Recorto cada observación a los campos que se usan (los ausentes no aparecen)
+        {"$addFields": {collection: {"$map": {
+            "input": f"${collection}",
+            "as": "o",
+            "in": {field: f"$$o.{field}" for field in fields},
+        }}}},
+    ]
+
+
+def bucket_pipeline(bucket_id, bucket_type):
+    """Agregación sobre bucket que trae las observaciones de bucket_type (también la usa indexes.py)."""
+    pipeline = [{"$match": {"_id": bucket_id}}]
+    for collection in _COLLECTIONS_BY_TYPE.get(bucket_type, []):
+        pipeline.extend(_lookup_stages(collection))
+    return pipeline
+
+
+def load_bucket(db, bucket_id, bucket_type):
+    """
+    Trae el bucket y todas las observaciones que necesita su bucket_type en una sola
+    agregación ($lookup por id_bucket). Devuelve BucketData, o None si el bucket no existe.
+    """
+    start = time.time()
+    collections = _COLLECTIONS_BY_TYPE.get(bucket_type, [])
+    docs = list(db["bucket"].aggregate(bucket_pipeline(bucket_id, bucket_type)))
+    if not docs:
+        return None
+
+    bucket = docs[0]
+    observaciones = {collection: bucket.pop(collection, []) for collection in _OBSERVATION_FIELDS}
+    logger.info(
+        f"[observations] Bucket {bucket_id} cargado en {time.time() - start:.3f}s: "
+        + ", ".join(f"{c}={len(observaciones[c])}" for c in collections)
+    )
+    return BucketData(bucket=bucket, **observaciones)
@@ -0,0 +1,149 @@
+import os
+import json
+import time
+import fnmatch
+import logging
+
+from browser_profile import BLOCKED_URL_PATTERNS, block_resources, blocked_url_patterns
+from dgr_urls import dgr_url
+from locator_cache import invalidate
+
+# Set up logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+# Reglas por página: la primera cuyo "page" (wildcard) matchea la URL a la que se
+# navega define qué se bloquea mientras esa página carga.
+#   block -> categorías de BLOCKED_URL_PATTERNS o patrones wildcard de URL
+#   allow -> patrones que se sacan de la lista (para rehabilitar algo en una página)
+# CSS y JS nunca se bloquean por defecto: GeneXus y JSF los necesitan para mostrar
+# y ocultar los controles con los que interactuamos.
+DEFAULT_RULES = [
+    {"page": dgr_url("/etimbreapp/servlet/*"), "block": ["images", "fonts", "analytics"]},
+    {"page": dgr_url("/sr/*"), "block": ["images", "fonts", "analytics"]},
+    # Cualquier otra página: solo lo que nunca hace falta
+    {"page": "*", "block": ["fonts", "analytics"]},
+]
+
+# Resource Timing de la página actual: qué se descargó y cuánto pesó
+_RESOURCE_STATS_JS = """
+var entries = performance.getEntriesByType('navigation').concat(performance.getEntriesByType('resource'));
+return entries.map(function (e) { return [e.name, e.transferSize || 0]; });
+"""
+
+
+def load_rules():
+    """Reglas desde REQUEST_FILTER_RULES (JSON, mismo formato que DEFAULT_RULES) o las default."""
+    raw = os.environ.get("REQUEST_FILTER_RULES")
+    if not raw:
+        return DEFAULT_RULES
+    try:
+        return json.loads(raw)
+    except ValueError as e:
+        logger.error(f"[request_filter] REQUEST_FILTER_RULES inválido ({e}). Uso las reglas default.")
+        return DEFAULT_RULES
+
+
+def request_filter_enabled():
+    """Con REQUEST_FILTER=off no hay reglas por página: se bloquea lo de CHROME_BLOCKED_RESOURCES."""
+    return os.environ.get("REQUEST_FILTER", "on") != "off"
+
+
+def request_stats_enabled():
+    """
+    Stats por navegación (requests, bytes, bloqueados) con REQUEST_FILTER_STATS=on. Es
+    para diagnóstico: cuestan un execute_script y dos get_log por navegación.
+    """
+    return os.environ.get("REQUEST_FILTER_STATS", "off") == "on"
+
+
+def configure_options(options):
+    """
+    Opciones de Chrome que necesita el filtro. El log de performance es de este módulo
+    (collect_stats lo vacía en cada navegación) y solo se habilita si se piden stats.
+    """
+    if request_stats_enabled():
+        options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+
+
+def patterns_for(url, rules=None):
+    """Patrones de URL a bloquear al navegar a url."""
+    for rule in rules or load_rules():
+        if fnmatch.fnmatch(url, rule.get("page", "*")):
+            patterns = []
+            for item in rule.get("block", []):
+                patterns.extend(BLOCKED_URL_PATTERNS.get(item, [item]))
+            allowed = set(rule.get("allow", []))
+            return [p for p in dict.fromkeys(patterns) if p not in allowed]
+    return []
+
+
+def apply_rules(driver, url):
+    """
+    Bloquea lo que corresponde a url. create_driver lo llama una vez al crear el driver;
+    navigate solo vuelve a llamar a CDP si la página nueva tiene otro conjunto de patrones.
+    """
+    patterns = patterns_for(url) if request_filter_enabled() else blocked_url_patterns()
+    if getattr(driver, "_blocked_patterns", []) != patterns:
+        block_resources(driver, patterns)
+        driver._blocked_patterns = patterns
+    return patterns
+
+
+def _blocked_urls(driver):
+    """URLs bloqueadas desde el último llamado (log de performance o, si no hay, el de consola)."""
+    blocked = []
+    try:
+        urls = {}
+        for entry in driver.get_log("performance"):
+            message = json.loads(entry["message"])["message"]
+            params = message.get("params", {})
+            if message.get("method") == "Network.requestWillBeSent":
+                urls[params.get("requestId")] = params.get("request", {}).get("url")
+            elif message.get("method") == "Network.loadingFailed" and params.get("blockedReason"):
+                blocked.append(urls.get(params.get("requestId"), params.get("requestId")))
+        if blocked:
+            return blocked
+    except Exception:
+        pass
+    try:
+        for entry in driver.get_log("browser"):
+            if "ERR_BLOCKED_BY_CLIENT" in entry.get("message", ""):
+                blocked.append(entry["message"].split(" ")[0])
+    except Exception:
+        pass
+    return blocked
+
+
+def collect_stats(driver, url, started, patterns):
+    """Stats de la navegación: requests y bytes transferidos (Resource Timing) y requests bloqueados."""
+    stats = {"url": url, "elapsed": round(time.time() - started, 3), "blocked_patterns": len(patterns)}
+    try:
+        entries = driver.execute_script(_RESOURCE_STATS_JS) or []
+    except Exception as e:
+        logger.debug(f"[request_filter] Sin Resource Timing: {e}")
+        entries = []
+    stats["requests"] = len(entries)
+    stats["transferred_bytes"] = sum(transfer for _, transfer in entries)
+    stats["blocked_requests"] = len(_blocked_urls(driver))
+    return stats
+
+
+def navigate(driver, url):
+    """
+    driver.get(url) con las reglas de bloqueo de esa página. Devuelve las stats si
+    REQUEST_FILTER_STATS=on, si no None.
+    """
+    patterns = apply_rules(driver, url)
+    invalidate(driver)
+    started = time.time()
+    driver.get(url)
+    if not request_stats_enabled():
+        return None
+    stats = collect_stats(driver, url, started, patterns)
+    logger.info(
+        f"[request_filter] {url}: {stats['requests']} requests, {stats['transferred_bytes']} bytes en "
+        f"{stats['elapsed']}s; {stats['blocked_requests']} bloqueados"
+    )
+    return stats
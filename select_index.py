@@ -0,0 +1,139 @@
+import os
+import difflib
+import logging
+import unicodedata
+
+from selenium.common.exceptions import NoSuchElementException
+
+# Set up logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+# Índice de opciones de los <select> de DGR. Recorrer sel.options pidiendo o.text cuesta
+# un round-trip por opción (cientos en marca/modelo); acá se traen todas las
+# (value, texto) en un solo execute_script y se buscan en memoria, normalizando
+# acentos, mayúsculas y espacios. El match es exacto: si no hay opción se reporta el
+# error y no se selecciona nada (un valor parecido pero distinto, como "SEDAN 3 PTAS"
+# por "SEDAN 5 PTAS", terminaría en el registro). lookup(fuzzy=True) existe solo para
+# diagnóstico, ej. sugerir la opción más parecida en un log.
+#
+# Las listas estáticas se guardan a nivel de módulo, así que se reusan entre
+# observaciones y entre invocaciones de la misma Lambda / worker. La cache_key es el
+# nombre del select para las listas de primer nivel (departamentos, niveles) y
+# (nombre, valor del padre) para las que dependen de otro select (localidades). Una
+# lista dependiente con el padre vacío no se cachea: la página puede estar mostrando
+# cualquier lista y los values de localidad se repiten entre departamentos.
+FUZZY_CUTOFF = float(os.environ.get("SELECT_FUZZY_CUTOFF", "0.85"))
+
+_OPTIONS_JS = """
+return Array.prototype.map.call(arguments[0].options, function (o) { return [o.value, o.text]; });
+"""
+
+_static = {}
+
+
+def normalize(text):
+    """Mayúsculas, sin acentos y con los espacios colapsados: 'Tacuarembó ' -> 'TACUAREMBO'."""
+    text = unicodedata.normalize("NFKD", "" if text is None else str(text))
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(text.upper().split())
+
+
+class OptionIndex:
+    """Opciones de un select indexadas por texto normalizado."""
+
+    def __init__(self, options):
+        self.options = options
+        self._by_text = {}
+        for value, text in options:
+            key = normalize(text)
+            if key and key not in self._by_text:
+                self._by_text[key] = (value, text)
+
+    def __len__(self):
+        return len(self.options)
+
+    def texts(self):
+        return [text for _, text in self.options]
+
+    def lookup(self, text, fuzzy=False):
+        """(value, texto de la opción) para text, o None. Exacto normalizado; con fuzzy=True, difuso si no hay."""
+        wanted = normalize(text)
+        match = self._by_text.get(wanted)
+        if match is not None or not fuzzy or not wanted:
+            return match
+        close = difflib.get_close_matches(wanted, list(self._by_text), n=1, cutoff=FUZZY_CUTOFF)
+        if not close:
+            return None
+        match = self._by_text[close[0]]
+        logger.warning(f"[select_index] '{text}' no está tal cual; uso la opción más parecida '{match[1]}'.")
+        return match
+
+
+def option_index(select_el):
+    """Lee todas las opciones de select_el (WebElement) en un solo round-trip."""
+    options = select_el.parent.execute_script(_OPTIONS_JS, select_el)
+    return OptionIndex([tuple(option) for option in options])
+
+
+def _static_key(cache_key):
+    """Clave de _static para cache_key, o None si no se puede cachear (lista dependiente sin padre)."""
+    if isinstance(cache_key, str):
+        return cache_key, None
+    name, parent = cache_key
+    parent = normalize(parent)
+    return (name, parent) if parent else None
+
+
+def static_index(select_el, cache_key):
+    """
+    option_index cacheado por cache_key. Lee las opciones en vivo si la lista todavía no
+    cargó o si es dependiente y el padre está vacío.
+    """
+    key = _static_key(cache_key)
+    if key is None:
+        return option_index(select_el)
+    index = _static.get(key)
+    if index is None:
+        index = option_index(select_el)
+        # Solo el "(Seleccione)": GeneXus todavía no llenó la lista
+        if len(index) > 1:
+            _static[key] = index
+    return index
+
+
+def forget(cache_key):
+    key = _static_key(cache_key)
+    if key is not None:
+        _static.pop(key, None)
+
+
+def select_option(select, text, cache_key=None):
+    """
+    Selecciona en select (un Select de Selenium) la opción que corresponde a text y
+    devuelve el texto de la opción elegida. Con cache_key (nombre, o (nombre, valor del
+    padre)) usa el índice estático; si el valor cacheado ya no está en la página, lo
+    descarta y vuelve a leer las opciones. Lanza NoSuchElementException si no hay opción.
+    """
+    select_el = select._el
+    if cache_key and _static_key(cache_key) is None:
+        cache_key = None
+    index = static_index(select_el, cache_key) if cache_key else option_index(select_el)
+    match = index.lookup(text, fuzzy=False)
+    if match is None and cache_key:
+        forget(cache_key)
+        return select_option(select, text)
+    if match is None:
+        raise NoSuchElementException(f"No hay opción '{text}'. Opciones: {index.texts()}")
+
+    value, option_text = match
+    try:
+        select.select_by_value(value)
+    except NoSuchElementException:
+        if not cache_key:
+            raise
+        logger.info(f"[select_index] El índice cacheado de {_static_key(cache_key)[0]} quedó viejo. Releo las opciones.")
+        forget(cache_key)
+        return select_option(select, text)
+    return option_text
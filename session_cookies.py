@@ -0,0 +1,127 @@
+import os
+import logging
+from datetime import datetime, timedelta
+
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError
+
+from dgr_urls import DGR_HOST
+
+# Set up logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Cache de cookies de sesión de DGR en Mongo. Cada documento (_id = usuario DGR) guarda
+# las cookies de un login y vence solo por el índice TTL sobre expiresAt.
+#
+# GeneXus guarda el estado de los formularios en la sesión del servidor: dos Chrome
+# usando el mismo JSESSIONID a la vez se pisarían. Por eso el DriverSession que restaura
+# las cookies toma un lease (owner = su id) y los demás hacen login propio mientras dure.
+COLLECTION = "dgr_sessions"
+
+_ttl_index_ready = False
+
+
+def cookie_cache_enabled():
+    return os.environ.get("DGR_COOKIE_CACHE", "on") != "off"
+
+
+def _ttl_seconds():
+    return int(os.environ.get("DGR_COOKIE_TTL_SECONDS", "1200"))
+
+
+def _lease_seconds():
+    return int(os.environ.get("DGR_COOKIE_LEASE_SECONDS", "900"))
+
+
+def _collection(db):
+    global _ttl_index_ready
+    collection = db[COLLECTION]
+    if not _ttl_index_ready:
+        collection.create_index([("expiresAt", ASCENDING)], expireAfterSeconds=0, name="expiresAt_ttl")
+        _ttl_index_ready = True
+    return collection
+
+
+def _available_to(owner, now):
+    """Documentos vigentes sin lease, con lease vencido o con lease de owner."""
+    return {
+        "expiresAt": {"$gt": now},
+        "$or": [
+            {"leaseOwner": None},
+            {"leaseOwner": owner},
+            {"leaseUntil": {"$lt": now}},
+        ],
+    }
+
+
+def claim_cookies(db, user_dgr, owner):
+    """Toma el lease y devuelve las cookies guardadas, o None si no hay o las usa otra sesión."""
+    now = datetime.utcnow()
+    query = {"_id": user_dgr}
+    query.update(_available_to(owner, now))
+    doc = _collection(db).find_one_and_update(
+        query,
+        {"$set": {"leaseOwner": owner, "leaseUntil": now + timedelta(seconds=_lease_seconds())}},
+    )
+    return doc["cookies"] if doc else None
+
+
+def renew_lease(db, user_dgr, owner):
+    now = datetime.utcnow()
+    _collection(db).update_one(
+        {"_id": user_dgr, "leaseOwner": owner},
+        {"$set": {"leaseUntil": now + timedelta(seconds=_lease_seconds())}},
+    )
+
+
+def save_cookies(db, user_dgr, owner, cookies):
+    """Guarda las cookies de un login nuevo (salvo que otra sesión tenga el lease vigente)."""
+    now = datetime.utcnow()
+    query = {"_id": user_dgr}
+    query["$or"] = _available_to(owner, now)["$or"]
+    try:
+        _collection(db).update_one(
+            query,
+            {"$set": {
+                "cookies": cookies,
+                "createdAt": now,
+                "expiresAt": now + timedelta(seconds=_ttl_seconds()),
+                "leaseOwner": owner,
+                "leaseUntil": now + timedelta(seconds=_lease_seconds()),
+            }},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        # Otra sesión tiene el lease: el upsert chocó con su documento
+        logger.info("[session_cookies] Las cookies guardadas las usa otra sesión. No las piso.")
+
+
+def release_cookies(db, user_dgr, owner, invalid=False):
+    """Suelta el lease. Con invalid=True borra las cookies (la sesión ya no sirve)."""
+    query = {"_id": user_dgr, "leaseOwner": owner}
+    if invalid:
+        _collection(db).delete_one(query)
+    else:
+        _collection(db).update_one(query, {"$set": {"leaseOwner": None, "leaseUntil": None}})
+
+
+def read_browser_cookies(driver):
+    """Todas las cookies que el navegador manda a DGR (todas las rutas: /sr, /etimbreapp, ...)."""
+    cookies = driver.execute_cdp_cmd("Network.getAllCookies", {}).get("cookies", [])
+    # Una cookie de ".dgr.gub.uy" también aplica a www.dgr.gub.uy
+    return [c for c in cookies if c.get("domain") and DGR_HOST.endswith(c["domain"].lstrip("."))]
+
+
+def inject_cookies(driver, cookies):
+    """Carga las cookies vía CDP: no hace falta estar navegando el dominio."""
+    params = []
+    for c in cookies:
+        param = {key: c[key] for key in ("name", "value", "domain", "path", "secure", "httpOnly") if key in c}
+        if c.get("sameSite"):
+            param["sameSite"] = c["sameSite"]
+        # Las cookies de sesión vienen con expires -1: se omiten para que sigan siendo de sesión
+        if c.get("expires", -1) > 0:
+            param["expires"] = c["expires"]
+        params.append(param)
+    driver.execute_cdp_cmd("Network.setCookies", {"cookies": params})
@@ -0,0 +1,160 @@
+import logging
+import time
+import uuid
+
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.common.by import By
+
+from request_filter import navigate
+from login import create_driver, quit_driver, authenticate, DGR_LOGIN_URL, LOGGED_IN_ELEMENT_ID
+from mongo import get_mongo_client
+import session_cookies
+from tracing import span
+
+# Set up logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+class DriverSession:
+    """
+    Mantiene un Chrome autenticado en DGR vivo entre invocaciones "warm" de la Lambda.
+    Solo vuelve a loguearse cuando la sesión expiró y solo relanza Chrome cuando el
+    driver murió o fue descartado por un error fatal. Un Chrome nuevo primero prueba
+    las cookies guardadas en session_cookies y solo tipea credenciales si no sirven.
+    """
+
+    def __init__(self):
+        self.driver = None
+        self.started_at = None
+        self.last_login_at = None
+        self.user_dgr = None
+        # Id de lease en el cache de cookies: único por sesión, aunque haya varias por contenedor
+        self.lease_owner = uuid.uuid4().hex
+
+    def get(self, user_dgr, password_dgr):
+        """Devuelve un driver logueado, reutilizando el existente si sigue sano."""
+        if self.driver is not None and not self._is_alive():
+            logger.warning("[session] El driver existente no responde. Lo descarto.")
+            self.discard()
+
+        if self.driver is None:
+            self._start(user_dgr, password_dgr)
+            return self.driver
+
+        if self._is_logged_in():
+            logger.info(f"[session] Reutilizando sesión DGR (login hace {time.time() - self.last_login_at:.0f}s).")
+            self._cookie_cache(session_cookies.renew_lease, user_dgr, self.lease_owner)
+            return self.driver
+
+        logger.info("[session] Sesión DGR expirada. Re-logueando con el mismo driver...")
+        try:
+            authenticate(self.driver, user_dgr, password_dgr)
+            self.last_login_at = time.time()
+            self._save_cookies(self.driver, user_dgr)
+        except Exception as e:
+            logger.warning(f"[session] Re-login falló ({e}). Relanzo Chrome.")
+            self.discard()
+            self._start(user_dgr, password_dgr)
+        return self.driver
+
+    def discard(self):
+        """Cierra el driver actual (si hay) para que el próximo get() arranque de cero."""
+        driver, self.driver = self.driver, None
+        self.started_at = None
+        self.last_login_at = None
+        if self.user_dgr is not None:
+            # Las cookies pueden seguir sirviendo: suelto el lease para otro contenedor
+            self._cookie_cache(session_cookies.release_cookies, self.user_dgr, self.lease_owner)
+            self.user_dgr = None
+        if driver is not None:
+            try:
+                quit_driver(driver)
+            except Exception as e:
+                logger.warning(f"[session] Error cerrando driver: {e}")
+
+    def _start(self, user_dgr, password_dgr):
+        driver = create_driver()
+        try:
+            with span("cookie_restore"):
+                restored = self._restore_cookies(driver, user_dgr)
+            if restored:
+                logger.info("[session] Sesión DGR restaurada desde cookies guardadas.")
+            else:
+                authenticate(driver, user_dgr, password_dgr)
+                self._save_cookies(driver, user_dgr)
+        except Exception:
+            quit_driver(driver)
+            raise
+        self.driver = driver
+        self.user_dgr = user_dgr
+        self.started_at = self.last_login_at = time.time()
+        logger.info("[session] Nuevo driver creado y logueado en DGR.")
+
+    def _cookie_cache(self, operation, *args):
+        """Corre una operación del cache de cookies; si Mongo falla, se sigue sin cache."""
+        if not session_cookies.cookie_cache_enabled():
+            return None
+        try:
+            return operation(get_mongo_client()["production"], *args)
+        except Exception as e:
+            logger.warning(f"[session] Cache de cookies no disponible: {e}")
+            return None
+
+    def _restore_cookies(self, driver, user_dgr):
+        cookies = self._cookie_cache(session_cookies.claim_cookies, user_dgr, self.lease_owner)
+        if not cookies:
+            return False
+        try:
+            session_cookies.inject_cookies(driver, cookies)
+            navigate(driver, DGR_LOGIN_URL)
+            if driver.find_elements(By.ID, LOGGED_IN_ELEMENT_ID):
+                return True
+        except WebDriverException as e:
+            logger.warning(f"[session] No pude restaurar las cookies: {e}")
+        logger.info("[session] Las cookies guardadas ya no son válidas. Login completo.")
+        self._cookie_cache(session_cookies.release_cookies, user_dgr, self.lease_owner, True)
+        return False
+
+    def _save_cookies(self, driver, user_dgr):
+        if not session_cookies.cookie_cache_enabled():
+            return
+        try:
+            cookies = session_cookies.read_browser_cookies(driver)
+        except WebDriverException as e:
+            logger.warning(f"[session] No pude leer las cookies del navegador: {e}")
+            return
+        self._cookie_cache(session_cookies.save_cookies, user_dgr, self.lease_owner, cookies)
+
+    def _is_alive(self):
+        try:
+            self.driver.current_url
+            return True
+        except WebDriverException:
+            return False
+
+    def _is_logged_in(self):
+        try:
+            if not self.driver.get_cookies():
+                return False
+            navigate(self.driver, DGR_LOGIN_URL)
+            return bool(self.driver.find_elements(By.ID, LOGGED_IN_ELEMENT_ID))
+        except WebDriverException as e:
+            logger.warning(f"[session] Health-check de sesión falló: {e}")
+            return False
+
+
+# Sesión a nivel de módulo: sobrevive entre invocaciones mientras el contenedor siga warm.
+_default_session = DriverSession()
+
+
+def default_session():
+    return _default_session
+
+
+def get_driver(user_dgr, password_dgr):
+    return _default_session.get(user_dgr, password_dgr)
+
+
+def discard_driver():
+    _default_session.discard()
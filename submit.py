@@ -1,7 +1,5 @@
 import os
-import boto3
 from bson import ObjectId
-from pymongo import MongoClient
 import time
 from datetime import datetime, timedelta
 
@@ -18,25 +16,28 @@ from selenium.webdriver.support.ui import WebDriverWait, Select
 from selenium.webdriver.support import expected_conditions as EC
 
 from notify_error import notify_error
+from request_filter import navigate
+from dgr_urls import dgr_url
+from waits import wait_for_page_idle
+from downloads import create_download_dir, remove_download_dir, set_download_dir, wait_for_download_to_complete
+from mongo import get_mongo_client
+from aws_clients import get_client
+from io_pipeline import run_in_background, wait_all
+from talon_capture import TALON_BUTTON_ID, TalonNotSent, talon_in_memory_enabled, upload_talon_from_memory
 from human_functions import human_click
-from botocore.config import Config
+from tracing import span
 
 
 # Set up logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-s3_client = boto3.client('s3')
-
-sqs_client = boto3.client('sqs')
-sqs_config = Config(retries={'max_attempts': 3, 'mode': 'standard'})
-sqs_client = boto3.client('sqs', config=sqs_config)
-
 
 SQS_QUEUE_URL = os.environ.get('SQS_QUEUE_URL')
 
-def submit_form_and_generate_talon(driver, bucket_id, bucket_type):
-    client = MongoClient(os.environ.get('MONGODB_URI'))
+def submit_form_and_generate_talon(driver, bucket_id, bucket_type, client=None):
+    if client is None:
+        client = get_mongo_client()
     db = client['production']
     collection = db['bucket']
     if bucket_type != "Ampliación":
@@ -74,13 +75,14 @@ def submit_form_and_generate_talon(driver, bucket_id, bucket_type):
             return { 'statusCode': 500, 'body': json.dumps({'ERROR': f"Error al hacer clic en 'Enviar Solicitud': {e}"}) }
 
         # 4) Esperar y obtener número de consulta (j_id78 → número)
-        try:
-            logger.info("Looking for element with class 'colHeader2' (j_id78)...")
-            element = WebDriverWait(driver, 40).until(EC.presence_of_element_located((By.ID, "j_id78")))
-            logger.info("Element 'j_id78' encontrado.")
-        except TimeoutException:
-            logger.warning("j_id78 no apareció en 40s; espero otros 5s manualmente...")
-            time.sleep(5)
+        with span("submit.wait_result"):
+            try:
+                logger.info("Looking for element with class 'colHeader2' (j_id78)...")
+                element = WebDriverWait(driver, 40).until(EC.presence_of_element_located((By.ID, "j_id78")))
+                logger.info("Element 'j_id78' encontrado.")
+            except TimeoutException:
+                logger.warning("j_id78 no apareció en 40s; espero hasta 5s a que la página termine de cargar...")
+                wait_for_page_idle(driver, timeout=5)
 
         try:
             xpath = (
@@ -103,102 +105,43 @@ def submit_form_and_generate_talon(driver, bucket_id, bucket_type):
             logger.error(f"ERROR: Numero no encontrando. Error: {e}")
             notify_error(f"ERROR: Numero no encontrando para bucket_id {str(bucket_id)}. Error: {e}")
             return { 'statusCode': 500, 'body': json.dumps({'ERROR': f"Error al capturar el número: {e}"}) }
-        try:                    
-            collection.update_one(
-                {"_id": bucket_id},
-                {"$set": {"dgr_id": numero,"informacionAlDia": informacionAlDiaDate}},
-                upsert=True
-            )
-            logger.info(f"Number {numero} saved to MongoDB en el documento {str(bucket_id)}.")
-        except Exception as e:
-            logger.error(f"ERROR: mongo")
-            notify_error(f"ERROR: mongo")
-            return { 'statusCode': 500, 'body': json.dumps({'ERROR': f"Error al guardar en MongoDB: {e}"}) }
-
-        # 5) LIMPIAR cualquier PDF/CRDOWNLOAD viejo en /tmp
-        download_dir = "/tmp"
-        try:
-            for fname in os.listdir(download_dir):
-                if fname.lower().endswith(".pdf") or fname.lower().endswith(".crdownload"):
-                    full_path = os.path.join(download_dir, fname)
-                    os.remove(full_path)
-                    logger.info(f"[cleanup] Borré archivo viejo en /tmp: {fname}")
-        except Exception as e:
-            logger.warning(f"[cleanup] No pude limpiar /tmp antes de generar el talón: {e}")
-            # Aunque falle, continuamos: quizá no haya permisos, pero igual intentamos descargar.
-
-        # 6) Hacer clic en “Generar Talón”
-        try:
-            field = driver.find_element(By.ID, "j_id78:generarTalon")
-            # Tomamos timestamp justo antes de hacer clic:
-            click_time = time.time()
-            logger.info(f"About to click 'Generate PDF' button for bucket_id {str(bucket_id)} (timestamp={click_time})")
-            human_click(driver, field)
-            logger.info(f"Clicked 'Generate PDF' button for bucket_id {str(bucket_id)}")
-        except Exception as e:
-            logger.error(f"ERROR: No pude hacer clic en 'Generar Talón': {e}")
-            notify_error(f"ERROR: No pude hacer clic en 'Generar Talón' para bucket_id {str(bucket_id)}: {e}")
-            return { 'statusCode': 500, 'body': json.dumps({'ERROR': f"Error haciendo clic en 'Generar Talón': {e}"}) }
-
-        # 7) Esperar a que aparezca o se modifique un *.pdf en /tmp DESPUÉS de click_time
-        try:
-            logger.info(f"Waiting for PDF to appear en {download_dir} (timeout=60s)...")
-            downloaded_pdf_path = wait_for_download_to_complete(download_dir, click_time, timeout=60)
-            logger.info(f"wait_for_download_to_complete returned: {downloaded_pdf_path}")
-        except Exception as e:
-            logger.error(f"ERROR inesperado en wait_for_download_to_complete: {e}")
-            notify_error(f"ERROR inesperado en wait_for_download_to_complete para bucket_id {str(bucket_id)}: {e}")
-            return { 'statusCode': 500, 'body': json.dumps({'ERROR': f"Error en esperar descarga de PDF: {e}"}) }
-
-        src_path = downloaded_pdf_path.get("path")
-        if not src_path:
-            logger.error("ERROR: PDF no fue encontrado luego de esperar. Abortando.")
-            notify_error(f"ERROR: PDF no encontrado para bucket_id {str(bucket_id)} después de 60s")
-            return { 'statusCode': 500, 'body': json.dumps({'ERROR': f"Error: PDF file not found en {download_dir}"}) }
-
-        # 8) Renombrar y subir a S3
-        try:
-            new_pdf_path = os.path.join(download_dir, f"{bucket_id}.pdf")
-            os.rename(src_path, new_pdf_path)
-            logger.info(f"Talon descargado y renombrado a: {new_pdf_path}")
-        except Exception as e:
-            logger.error(f"ERROR al renombrar {src_path} a {str(bucket_id)}.pdf: {e}")
-            notify_error(f"ERROR al renombrar PDF para bucket_id {str(bucket_id)}: {e}")
-            return { 'statusCode': 500, 'body': json.dumps({'ERROR': f"Error al renombrar PDF: {e}"}) }
-
         s3_bucket = os.environ.get('S3_BUCKET_NAME')
         if not s3_bucket:
             logger.error("ERROR: S3_BUCKET_NAME no está definido.")
             notify_error("ERROR: S3_BUCKET_NAME no está definido.")
             return { 'statusCode': 500, 'body': json.dumps({'ERROR': "S3_BUCKET_NAME environment variable is not set."}) }
 
+        # Guardar el número en Mongo mientras Chrome genera el talón. El estado waiting_lambda
+        # va recién cuando el talón está en S3: antes no hay PDF que la otra Lambda pueda leer.
+        pending_writes = {
+            "dgr_id": run_in_background(
+                collection.update_one,
+                {"_id": bucket_id},
+                {"$set": {"dgr_id": numero,"informacionAlDia": informacionAlDiaDate}},
+                upsert=True
+            ),
+        }
+
+        # 5) - 8) Generar el talón y subirlo a S3 (en memoria si TALON_CAPTURE=memory, si no por descarga)
+        s3_key = f"bills/{bucket_id}.pdf"
+        with span("submit.talon"):
+            error_resp = talon_to_s3(driver, s3_bucket, s3_key, f"bucket_id {str(bucket_id)}")
+
+        # Las escrituras tienen que terminar antes de responder (la Lambda congela los hilos)
+        with span("submit.mongo_wait"):
+            write_errors = wait_all(pending_writes)
+        if "dgr_id" in write_errors:
+            logger.error(f"ERROR: mongo")
+            notify_error(f"ERROR: mongo")
+            return { 'statusCode': 500, 'body': json.dumps({'ERROR': f"Error al guardar en MongoDB: {write_errors['dgr_id']}"}) }
+        logger.info(f"Number {numero} saved to MongoDB en el documento {str(bucket_id)}.")
+        if error_resp:
+            return error_resp
         try:
-            s3_client.upload_file(new_pdf_path, s3_bucket, f"bills/{os.path.basename(new_pdf_path)}")
-            logger.info(f"Uploaded {os.path.basename(new_pdf_path)} to S3 bucket {s3_bucket} con key bills/{os.path.basename(new_pdf_path)}")
-            # Insertar estado en MongoDB
-            client = MongoClient(os.environ.get('MONGODB_URI'))
-            db = client['production']
-            collection_status = db['status']
-            
-            waiting_lambda_doc = collection_status.find_one({
-            "id_bucket": bucket_id,
-            "description": "waiting_lambda"
-            })
-            
-            if not waiting_lambda_doc:
-                # 2. Insertar waiting_lambda con createdAt un poco antes que pdf_downloaded
-                waiting_time = datetime.utcnow() - timedelta(seconds=3)
-                status_waiting = {
-                    "id_bucket": bucket_id,
-                    "description": "waiting_lambda",
-                    "createdAt": waiting_time
-                }
-                collection_status.insert_one(status_waiting)
-                logger.info(f"Inserted waiting_lambda status for bucket_id {bucket_id}")
-            
+            insert_waiting_lambda(client['production']['status'], bucket_id)
         except Exception as e:
-            logger.error(f"ERROR al subir el PDF a S3 o insertar status: {e}")
-            return { 'statusCode': 500, 'body': json.dumps({'ERROR': f"Error al subir PDF o insertar estado: {e}"}) }
+            logger.error(f"ERROR al insertar status: {e}")
+            return { 'statusCode': 500, 'body': json.dumps({'ERROR': f"Error al insertar estado: {e}"}) }
 
         # 9) Enviar mensaje a SQS
         try:
@@ -207,7 +150,8 @@ def submit_form_and_generate_talon(driver, bucket_id, bucket_type):
                 notify_error("ERROR: No hay SQS_QUEUE_URL")
                 return { 'statusCode': 500, 'body': json.dumps({'ERROR': "SQS_QUEUE_URL environment variable is not set."}) }
             message_body = json.dumps({"bucket_id": str(bucket_id)})
-            sqs_client.send_message(QueueUrl=SQS_QUEUE_URL, MessageBody=message_body)
+            with span("submit.sqs"):
+                get_client('sqs').send_message(QueueUrl=SQS_QUEUE_URL, MessageBody=message_body)
             logger.info(f"Successfully sent bucket_id {str(bucket_id)} a la cola SQS.")
             return {
                 'statusCode': 200,
@@ -246,9 +190,10 @@ def submit_form_and_generate_talon(driver, bucket_id, bucket_type):
             return { 'statusCode': 500, 'body': json.dumps({'ERROR': f"Error al hacer clic en 'Enviar Solicitud': {e}"}) }
               
         try:
-            elem = WebDriverWait(driver, 2).until(
-                EC.visibility_of_element_located((By.CSS_SELECTOR, "span.ErrorViewer"))
-            )
+            with span("submit.error_viewer_wait"):
+                elem = WebDriverWait(driver, 2).until(
+                    EC.visibility_of_element_located((By.CSS_SELECTOR, "span.ErrorViewer"))
+                )
             msg = elem.text.strip()
             if msg == "SOLICITUD PROCESADA CON EXITO":
                 logger.info("Se procesa correctamente la extensión")
@@ -260,7 +205,7 @@ def submit_form_and_generate_talon(driver, bucket_id, bucket_type):
             # No llegó ningún mensaje de error en 2s → asumimos éxito
             pass
             
-        driver.get("https://www.dgr.gub.uy/sr/principal.jsf")
+        navigate(driver, dgr_url("/sr/principal.jsf"))
         try:
             wait.until(EC.element_to_be_clickable((By.LINK_TEXT, "50"))).click()
             tbody = wait.until(EC.presence_of_element_located((By.ID, "j_id78:dataTable:tb")))
@@ -365,16 +310,10 @@ def submit_form_and_generate_talon(driver, bucket_id, bucket_type):
                             
                       # 9) Insertar estado exonerado o generar PDF
                 status_col = db["status_ampliacion"] 
-                download_dir = "/tmp"
-                try:
-                    for fname in os.listdir(download_dir):
-                        if fname.lower().endswith(".pdf") or fname.lower().endswith(".crdownload"):
-                            full_path = os.path.join(download_dir, fname)
-                            os.remove(full_path)
-                            logger.info(f"[cleanup] Borré archivo viejo en /tmp: {fname}")
-                except Exception as e:
-                    logger.warning(f"[cleanup] No pude limpiar /tmp antes de generar el talón: {e}")
-                    # Aunque falle, continuamos: quizá no haya permisos, pero igual intentamos descargar.
+                s3_bucket = os.environ.get('S3_BUCKET_NAME')
+                if not s3_bucket:
+                    logger.error("ERROR: S3_BUCKET_NAME no está definido.")
+                    return { 'statusCode': 500, 'body': json.dumps({'ERROR': "S3_BUCKET_NAME environment variable is not set."}) }
 
                 # 1) Find and click the checkbox in this row
                 try:
@@ -382,62 +321,21 @@ def submit_form_and_generate_talon(driver, bucket_id, bucket_type):
                     checkbox = row.find_element(By.CSS_SELECTOR, "input[type='checkbox']")
                     if not checkbox.is_selected():
                         checkbox.click()
-                        # small pause to allow any JS to register the click
-                        time.sleep(0.5)
+                        # esperar a que el JS registre el click
+                        wait_for_page_idle(driver, timeout=2)
                 except Exception as e:
                     logger.error(f"Error haciendo click en checkbox previo a descargar talon de pago. Error {e}")    
                     notify_error(f"Error haciendo click en checkbox previo a descargar talon de pago. Error {e}")    
 
-                # 6) Hacer clic en “Generar Talón”
-                try:
-                    field = driver.find_element(By.ID, "j_id78:generarTalon")
-                    # Tomamos timestamp justo antes de hacer clic:
-                    click_time = time.time()
-                    logger.info(f"About to click 'Generate PDF' button for ampliacion_id {str(ampliacion_id)} (timestamp={click_time})")
-                    human_click(driver, field)
-                    logger.info(f"Clicked 'Generate PDF' button for ampliacion_id {str(ampliacion_id)}")
-                except Exception as e:
-                    logger.error(f"ERROR: No pude hacer clic en 'Generar Talón': {e}")
-                    notify_error(f"ERROR: No pude hacer clic en 'Generar Talón' para ampliacion_id {str(ampliacion_id)}. Error: {e}")
-                    return { 'statusCode': 500, 'body': json.dumps({'ERROR': f"Error haciendo clic en 'Generar Talón': {e}"}) }
+                # 6) - 8) Generar el talón y subirlo a S3 (en memoria si TALON_CAPTURE=memory, si no por descarga)
+                s3_key = f"bills/ampliacion_{ampliacion_id}.pdf"
+                with span("submit.talon"):
+                    error_resp = talon_to_s3(driver, s3_bucket, s3_key, f"ampliacion_id {str(ampliacion_id)}", prefix="ampliacion_")
+                if error_resp:
+                    return error_resp
 
-                # 7) Esperar a que aparezca o se modifique un *.pdf en /tmp DESPUÉS de click_time
                 try:
-                    logger.info(f"Waiting for PDF to appear en {download_dir} (timeout=60s)...")
-                    downloaded_pdf_path = wait_for_download_to_complete(download_dir, click_time, timeout=60)
-                    logger.info(f"wait_for_download_to_complete returned: {downloaded_pdf_path}")
-                except Exception as e:
-                    logger.error(f"ERROR inesperado en wait_for_download_to_complete: {e}")
-                    notify_error(f"ERROR inesperado en wait_for_download_to_complete para ampliacion_id {str(ampliacion_id)}. Error: {e}")
-                    return { 'statusCode': 500, 'body': json.dumps({'ERROR': f"Error en esperar descarga de PDF: {e}"}) }
-
-                src_path = downloaded_pdf_path.get("path")
-                if not src_path:
-                    logger.error("ERROR: PDF no fue encontrado luego de esperar. Abortando.")
-                    notify_error(f"ERROR: PDF no encontrado para ampliacion_id {str(ampliacion_id)} después de 60s")
-                    return { 'statusCode': 500, 'body': json.dumps({'ERROR': f"Error: PDF file not found en {download_dir}"}) }
-
-                # 8) Renombrar y subir a S3
-                try:
-                    new_pdf_path = os.path.join(download_dir, f"ampliacion_{ampliacion_id}.pdf")
-                    os.rename(src_path, new_pdf_path)
-                    logger.info(f"Talon de ampliación descargado y renombrado a: {new_pdf_path}")
-                except Exception as e:
-                    logger.error(f"ERROR al renombrar {src_path} a {str(ampliacion_id)}.pdf: {e}")
-                    notify_error(f"ERROR al renombrar PDF para ampliacion_id {str(ampliacion_id)}: {e}")
-                    return { 'statusCode': 500, 'body': json.dumps({'ERROR': f"Error al renombrar PDF: {e}"}) }
-
-                s3_bucket = os.environ.get('S3_BUCKET_NAME')
-                if not s3_bucket:
-                    logger.error("ERROR: S3_BUCKET_NAME no está definido.")
-                    return { 'statusCode': 500, 'body': json.dumps({'ERROR': "S3_BUCKET_NAME environment variable is not set."}) }
-                
-                                
-                try:
-                    s3_client.upload_file(new_pdf_path, s3_bucket, f"bills/{os.path.basename(new_pdf_path)}")
-                    logger.info(f"Uploaded {os.path.basename(new_pdf_path)} to S3 bucket {s3_bucket} con key bills/{os.path.basename(new_pdf_path)}")
                     # Insertar estado en MongoDB
-                    client = MongoClient(os.environ.get('MONGODB_URI'))
                     db = client['production']
                     collection_status = db['status_ampliacion']
                     
@@ -464,8 +362,8 @@ def submit_form_and_generate_talon(driver, bucket_id, bucket_type):
                     result = collection_status.insert_one(status_doc)
                     logger.info(f"Inserted document en status con id: {result.inserted_id}")
                 except Exception as e:
-                    logger.error(f"ERROR al subir el PDF a S3 o insertar status: {e}")
-                    return { 'statusCode': 500, 'body': json.dumps({'ERROR': f"Error al subir PDF o insertar estado: {e}"}) }
+                    logger.error(f"ERROR al insertar status: {e}")
+                    return { 'statusCode': 500, 'body': json.dumps({'ERROR': f"Error al insertar estado: {e}"}) }
 
                 # 9) Enviar mensaje a SQS
                 try:
@@ -474,7 +372,8 @@ def submit_form_and_generate_talon(driver, bucket_id, bucket_type):
                         notify_error("ERROR: No hay SQS_QUEUE_URL")
                         return { 'statusCode': 500, 'body': json.dumps({'ERROR': "SQS_QUEUE_URL environment variable is not set."}) }
                     message_body = json.dumps({"ampliacion_id": str(ampliacion_id)})
-                    sqs_client.send_message(QueueUrl=SQS_QUEUE_URL, MessageBody=message_body)
+                    with span("submit.sqs"):
+                        get_client('sqs').send_message(QueueUrl=SQS_QUEUE_URL, MessageBody=message_body)
                     logger.info(f"Successfully sent ampliacion_id {str(ampliacion_id)} a la cola SQS.")
                     return {
                         'statusCode': 200,
@@ -490,80 +389,132 @@ def submit_form_and_generate_talon(driver, bucket_id, bucket_type):
             
                 
                 
-def count_non_active_ampliaciones(bucket_id, ampliacion_coll, db):
-    # 1) Fetch all ampliación _ids for this bucket
-    ampliaciones = ampliacion_coll.find(
-        { "id_bucket": ObjectId(bucket_id) },
-        { "_id": 1 }
-    )
-    ampliacion_ids = [doc["_id"] for doc in ampliaciones]
-    if not ampliacion_ids:
-        return []
-
-    pipeline = [
-        # only statuses for those ampliaciones
-        { "$match": { "id_ampliacion": { "$in": ampliacion_ids } } },
-
-        # sort so that the most recent createdAt is first
-        { "$sort": { "createdAt": -1 } },
-
-        # group by ampliación, taking the first description (i.e. latest)
-        { "$group": {
-            "_id":           "$id_ampliacion",
-            "lastDesc":      { "$first": "$description" }
-        }},
+def insert_waiting_lambda(collection_status, bucket_id):
+    """Inserta el estado waiting_lambda del bucket si todavía no existe."""
+    waiting_lambda_doc = collection_status.find_one({
+    "id_bucket": bucket_id,
+    "description": "waiting_lambda"
+    })
+    
+    if not waiting_lambda_doc:
+        # 2. Insertar waiting_lambda con createdAt un poco antes que pdf_downloaded
+        waiting_time = datetime.utcnow() - timedelta(seconds=3)
+        status_waiting = {
+            "id_bucket": bucket_id,
+            "description": "waiting_lambda",
+            "createdAt": waiting_time
+        }
+        collection_status.insert_one(status_waiting)
+        logger.info(f"Inserted waiting_lambda status for bucket_id {bucket_id}")
 
-        # keep only those whose lastDesc != "active"
-        { "$match": { "lastDesc": { "$ne": "active" } } },
 
-        # count how many
-       
-    ]
+def talon_to_s3(driver, s3_bucket, s3_key, label, prefix="talon_"):
+    """
+    Genera el talón y lo sube a S3: en memoria si TALON_CAPTURE=memory, si no por descarga.
+    Solo cae a la descarga (que vuelve a clickear el botón) si el fetch nunca llegó a DGR.
+    Devuelve None si salió bien o la respuesta de error.
+    """
+    if talon_in_memory_enabled():
+        try:
+            return upload_talon_from_memory(driver, get_client('s3'), s3_bucket, s3_key)
+        except TalonNotSent as e:
+            logger.warning(f"No pude capturar el talón en memoria ({e}). Uso la descarga a disco.")
+    return download_talon_to_s3(driver, s3_bucket, s3_key, label, prefix=prefix)
 
-    cursor = db["status_ampliacion"].aggregate(pipeline)
 
-    return [doc["_id"] for doc in cursor]
-        
-        
-        
-# ──────────────────────────────────────────────────────────────────────────────
+def download_talon_to_s3(driver, s3_bucket, s3_key, label, prefix="talon_"):
+    """
+    Hace clic en "Generar Talón", espera la descarga en un directorio propio del request
+    y sube el PDF a s3_key. Devuelve None si salió bien o la respuesta de error.
+    """
+    # Directorio de descarga exclusivo para este request: nunca se confunde con PDFs viejos
+    try:
+        download_dir = create_download_dir(prefix=prefix)
+        set_download_dir(driver, download_dir)
+        logger.info(f"Descargas dirigidas a {download_dir}")
+    except Exception as e:
+        logger.error(f"ERROR preparando directorio de descarga: {e}")
+        notify_error(f"ERROR preparando directorio de descarga para {label}: {e}")
+        return { 'statusCode': 500, 'body': json.dumps({'ERROR': f"Error preparando directorio de descarga: {e}"}) }
+
+    try:
+        # Hacer clic en “Generar Talón”
+        try:
+            field = driver.find_element(By.ID, TALON_BUTTON_ID)
+            # Tomamos timestamp justo antes de hacer clic:
+            click_time = time.time()
+            logger.info(f"About to click 'Generate PDF' button for {label} (timestamp={click_time})")
+            human_click(driver, field)
+            logger.info(f"Clicked 'Generate PDF' button for {label}")
+        except Exception as e:
+            logger.error(f"ERROR: No pude hacer clic en 'Generar Talón': {e}")
+            notify_error(f"ERROR: No pude hacer clic en 'Generar Talón' para {label}: {e}")
+            return { 'statusCode': 500, 'body': json.dumps({'ERROR': f"Error haciendo clic en 'Generar Talón': {e}"}) }
+
+        # Esperar a que aparezca un *.pdf en el directorio de descarga del request
+        try:
+            logger.info(f"Waiting for PDF to appear en {download_dir} (timeout=60s)...")
+            with span("download"):
+                downloaded_pdf_path = wait_for_download_to_complete(download_dir, click_time, timeout=60)
+            logger.info(f"wait_for_download_to_complete returned: {downloaded_pdf_path}")
+        except Exception as e:
+            logger.error(f"ERROR inesperado en wait_for_download_to_complete: {e}")
+            notify_error(f"ERROR inesperado en wait_for_download_to_complete para {label}: {e}")
+            return { 'statusCode': 500, 'body': json.dumps({'ERROR': f"Error en esperar descarga de PDF: {e}"}) }
+
+        src_path = downloaded_pdf_path.get("path")
+        if not src_path:
+            logger.error("ERROR: PDF no fue encontrado luego de esperar. Abortando.")
+            notify_error(f"ERROR: PDF no encontrado para {label} después de 60s")
+            return { 'statusCode': 500, 'body': json.dumps({'ERROR': f"Error: PDF file not found en {download_dir}"}) }
+
+        # Subir a S3 (la key ya tiene el nombre final: no hace falta renombrar)
+        try:
+            with span("s3_upload"):
+                get_client('s3').upload_file(src_path, s3_bucket, s3_key)
+            logger.info(f"Uploaded {os.path.basename(src_path)} to S3 bucket {s3_bucket} con key {s3_key}")
+        except Exception as e:
+            logger.error(f"ERROR al subir el PDF a S3: {e}")
+            notify_error(f"ERROR al subir el PDF a S3 para {label}: {e}")
+            return { 'statusCode': 500, 'body': json.dumps({'ERROR': f"Error al subir PDF: {e}"}) }
+        return None
+    finally:
+        remove_download_dir(download_dir)
+
 
-def wait_for_download_to_complete(download_dir, click_timestamp, timeout=60):
+def non_active_ampliaciones_pipeline(bucket_id):
     """
-    Espera hasta que aparezca o se modifique un archivo .pdf en download_dir
-    posterior a click_timestamp. Retorna {"path": ruta_del_pdf} o {"path": None, ...} en timeout.
+    Agregación sobre ampliacion: por cada ampliación del bucket el $lookup trae solo su
+    último estado (usa el índice (id_ampliacion, createdAt desc) de status_ampliacion).
     """
-    start_time = time.time()
-    logger.info(f"[wait_for_download] Iniciando. Observando {download_dir} desde timestamp={click_timestamp}")
+    return [
+        { "$match": { "id_bucket": ObjectId(bucket_id) } },
+        { "$project": { "_id": 1 } },
+
+        # último estado de cada ampliación
+        { "$lookup": {
+            "from":     "status_ampliacion",
+            "let":      { "ampliacion_id": "$_id" },
+            "pipeline": [
+                { "$match": { "$expr": { "$eq": ["$id_ampliacion", "$$ampliacion_id"] } } },
+                { "$sort": { "createdAt": -1 } },
+                { "$limit": 1 },
+                { "$project": { "_id": 0, "description": 1 } }
+            ],
+            "as":       "lastStatus"
+        }},
 
-    while time.time() - start_time < timeout:
-        for fname in os.listdir(download_dir):
-            if fname.lower().endswith(".pdf"):
-                file_path = os.path.join(download_dir, fname)
-                try:
-                    mtime = os.path.getmtime(file_path)
-                except Exception as e:
-                    logger.warning(f"[wait_for_download] No pude leer la fecha de '{file_path}': {e}")
-                    continue
-
-                logger.debug(f"[wait_for_download] Archivo '{fname}' con mtime={mtime}, click_timestamp={click_timestamp}")
-
-                if mtime >= click_timestamp:
-                    logger.info(f"[wait_for_download] Encontré PDF nuevo (o modificado): {file_path} (mtime={mtime})")
-                    return {"path": file_path}
-
-        current_listing = os.listdir(download_dir)
-        logger.debug(f"[wait_for_download] Aún no detectado; contenidos: {current_listing}")
-        time.sleep(0.7)
-
-    final_list = os.listdir(download_dir)
-    logger.error(f"[wait_for_download] Timeout tras {timeout}s. Contenido final de {download_dir}: {final_list}")
-    notify_error(f"[wait_for_download] Timeout tras {timeout}s. Contenido final de {download_dir}: {final_list}")
-    return {
-        "path": None,
-        "statusCode": 500,
-        "body": json.dumps({'ERROR': "PDF download timed out"})
-    }
-    
-    
-    
+        # solo las que tienen algún estado y el último no es "active"
+        { "$match": {
+            "lastStatus.0": { "$exists": True },
+            "lastStatus.0.description": { "$ne": "active" }
+        }},
+        { "$project": { "_id": 1 } }
+    ]
+
+
+def count_non_active_ampliaciones(bucket_id, ampliacion_coll, db):
+    """Devuelve los _id de las ampliaciones del bucket cuyo último estado no es "active"."""
+    cursor = ampliacion_coll.aggregate(non_active_ampliaciones_pipeline(bucket_id))
+
+    return [doc["_id"] for doc in cursor]
@@ -0,0 +1,97 @@
+import os
+import json
+import base64
+import logging
+
+from tracing import span
+from notify_error import notify_error
+
+# Set up logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+TALON_BUTTON_ID = "j_id78:generarTalon"
+
+# Repite en la página el POST que haría el click en "Generar Talón" (mismo form, mismo
+# ViewState, mismas cookies) pero con fetch, y devuelve el PDF en base64. Así el talón
+# nunca pasa por /tmp ni por el gestor de descargas de Chrome.
+_FETCH_TALON_JS = """
+var done = arguments[arguments.length - 1];
+var btn = document.getElementById(arguments[0]);
+var form = btn ? (btn.form || btn.closest('form')) : null;
+if (!form) { done({error: 'botón o form no encontrado', sent: false}); return; }
+var data = new FormData(form);
+// Un submit incluye el botón presionado; un commandLink de JSF agrega id=id
+data.append(btn.name || btn.id, btn.value || btn.id);
+fetch(form.action, {
+    method: (form.getAttribute('method') || 'POST').toUpperCase(),
+    body: new URLSearchParams(data),
+    credentials: 'include'
+}).then(function (resp) {
+    return resp.arrayBuffer().then(function (buf) {
+        var bytes = new Uint8Array(buf), chunks = [];
+        for (var i = 0; i < bytes.length; i += 0x8000) {
+            chunks.push(String.fromCharCode.apply(null, bytes.subarray(i, i + 0x8000)));
+        }
+        done({status: resp.status, type: resp.headers.get('content-type'), data: btoa(chunks.join(''))});
+    }).catch(function (e) { done({error: String(e), sent: true}); });
+}, function (e) {
+    // fetch rechaza solo por error de red antes de tener respuesta
+    done({error: String(e), sent: false});
+});
+"""
+
+
+class TalonNotSent(RuntimeError):
+    """El POST del talón nunca llegó a DGR: es seguro reintentarlo con el click."""
+
+
+def talon_in_memory_enabled():
+    """Captura en memoria habilitada con TALON_CAPTURE=memory (por defecto se usa la descarga)."""
+    return os.environ.get("TALON_CAPTURE", "download") == "memory"
+
+
+def capture_talon_pdf(driver, button_id=TALON_BUTTON_ID, timeout=60):
+    """
+    Devuelve los bytes del talón en PDF. Lanza TalonNotSent si el request no llegó a salir
+    y RuntimeError si salió pero la respuesta no es un PDF.
+    """
+    driver.set_script_timeout(timeout)
+    try:
+        result = driver.execute_async_script(_FETCH_TALON_JS, button_id)
+    finally:
+        driver.set_script_timeout(30)
+
+    if result.get("error"):
+        if result.get("sent") is False:
+            raise TalonNotSent(f"fetch del talón no salió: {result['error']}")
+        raise RuntimeError(f"fetch del talón falló: {result['error']}")
+    pdf = base64.b64decode(result.get("data") or "")
+    if result.get("status") != 200 or not pdf.startswith(b"%PDF"):
+        raise RuntimeError(
+            f"La respuesta no es un PDF (status={result.get('status')}, content-type={result.get('type')}, "
+            f"{len(pdf)} bytes)"
+        )
+    return pdf
+
+
+def upload_talon_from_memory(driver, s3_client, s3_bucket, s3_key, button_id=TALON_BUTTON_ID):
+    """
+    Captura el talón en memoria y lo sube con put_object. Devuelve None si quedó en S3 o
+    una respuesta de error si algo falló después de que DGR recibió el POST: repetir el
+    click podría generar un segundo talón, así que el record se reintenta entero.
+    Lanza TalonNotSent si el request nunca salió; ahí el llamador puede usar la descarga.
+    """
+    try:
+        with span("talon_capture"):
+            pdf = capture_talon_pdf(driver, button_id)
+        with span("s3_upload"):
+            s3_client.put_object(Bucket=s3_bucket, Key=s3_key, Body=pdf, ContentType="application/pdf")
+    except TalonNotSent:
+        raise
+    except Exception as e:
+        logger.error(f"ERROR capturando el talón en memoria: {e}")
+        notify_error(f"ERROR capturando el talón en memoria para {s3_key}: {e}")
+        return {'statusCode': 500, 'body': json.dumps({'ERROR': f"Error al capturar el talón: {e}"})}
+    logger.info(f"Talón capturado en memoria ({len(pdf)} bytes) y subido a s3://{s3_bucket}/{s3_key}")
+    return None
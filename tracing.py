@@ -0,0 +1,156 @@
+import os
+import sys
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+# Set up logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+# Tiempos por fase de cada bucket. Con TRACING=on, process_record abre un bucket_trace
+# y cada span(nombre) acumula (cantidad, duración) en el trace del hilo actual. Al cerrar
+# el bucket se escribe una línea en CloudWatch Embedded Metric Format (una métrica por
+# fase, dimensión BucketType) y un resumen legible en el log.
+#
+# Con TRACING apagado (default) span() devuelve siempre el mismo context manager vacío:
+# el costo es una llamada a función. Los spans que corren fuera de un bucket (o en otro
+# hilo, como los del pool de io_pipeline) no se registran.
+_enabled = os.environ.get("TRACING", "off") == "on"
+NAMESPACE = os.environ.get("TRACING_NAMESPACE", "DGRBot")
+
+_local = threading.local()
+
+
+def tracing_enabled():
+    return _enabled
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set_status(self, status):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ("trace", "name", "start")
+
+    def __init__(self, trace, name):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.trace.add(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class BucketTrace:
+    """Acumulado por fase de un bucket: {nombre: [cantidad, segundos]}."""
+
+    def __init__(self, bucket_type, bucket_id):
+        self.bucket_type = bucket_type
+        self.bucket_id = bucket_id
+        self.status = None
+        self.totals = {}
+        self.start = time.perf_counter()
+
+    def add(self, name, seconds):
+        entry = self.totals.get(name)
+        if entry is None:
+            self.totals[name] = [1, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+
+    def set_status(self, status):
+        self.status = status
+
+    def emf(self):
+        """Línea EMF: cada fase es una métrica en milisegundos; las cantidades van como propiedades."""
+        total_ms = round((time.perf_counter() - self.start) * 1000, 1)
+        record = {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [{
+                    "Namespace": NAMESPACE,
+                    "Dimensions": [["BucketType"]],
+                    "Metrics": [{"Name": "total", "Unit": "Milliseconds"}]
+                    + [{"Name": name, "Unit": "Milliseconds"} for name in self.totals],
+                }],
+            },
+            "BucketType": str(self.bucket_type),
+            "bucket_id": str(self.bucket_id),
+            "statusCode": self.status,
+            "total": total_ms,
+            "counts": {name: count for name, (count, _) in self.totals.items()},
+        }
+        for name, (_, seconds) in self.totals.items():
+            record[name] = round(seconds * 1000, 1)
+        return record
+
+    def summary(self):
+        phases = sorted(self.totals.items(), key=lambda item: item[1][1], reverse=True)
+        return ", ".join(f"{name} {seconds:.2f}s ({count})" for name, (count, seconds) in phases)
+
+
+def span(name):
+    """Context manager que suma la duración del bloque a la fase name del bucket en curso."""
+    if not _enabled:
+        return _NOOP
+    trace = getattr(_local, "trace", None)
+    if trace is None:
+        return _NOOP
+    return _Span(trace, name)
+
+
+def traced(iterable, name):
+    """Itera iterable abriendo un span(name) por elemento (para medir cada observación de un loop)."""
+    if not _enabled:
+        return iterable
+    return _traced(iterable, name)
+
+
+def _traced(iterable, name):
+    for item in iterable:
+        with span(name):
+            yield item
+
+
+@contextmanager
+def bucket_trace(bucket_type, bucket_id):
+    """Abre el trace de un bucket en este hilo; al salir emite la línea EMF y el resumen."""
+    if not _enabled:
+        yield _NOOP
+        return
+    trace = BucketTrace(bucket_type, bucket_id)
+    previous = getattr(_local, "trace", None)
+    _local.trace = trace
+    try:
+        yield trace
+    finally:
+        _local.trace = previous
+        record = trace.emf()
+        # EMF tiene que ir solo en la línea: el formatter del logging de Lambda le agrega prefijo
+        sys.stdout.write(json.dumps(record) + "\n")
+        sys.stdout.flush()
+        logger.info(
+            f"[trace] {bucket_type} {bucket_id} status={trace.status} en {record['total'] / 1000:.2f}s: "
+            f"{trace.summary()}"
+        )
@@ -0,0 +1,184 @@
+import logging
+import time
+
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.webdriver.support.ui import WebDriverWait
+
+from tracing import span
+from locator_cache import invalidate
+
+# Set up logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Instala (una vez por documento) un contador de XHR/fetch pendientes y un
+# MutationObserver que registra el último cambio del DOM. GeneXus y JSF hacen sus
+# refrescos parciales por XHR, así que "0 pendientes + DOM quieto" = página lista.
+_INSTALL_HOOKS_JS = """
+if (window.__gxWait) { return false; }
+var state = window.__gxWait = {pending: 0, lastMutation: Date.now()};
+var send = XMLHttpRequest.prototype.send;
+XMLHttpRequest.prototype.send = function () {
+    state.pending++;
+    this.addEventListener('loadend', function () { state.pending = Math.max(0, state.pending - 1); });
+    return send.apply(this, arguments);
+};
+if (window.fetch) {
+    var origFetch = window.fetch;
+    window.fetch = function () {
+        state.pending++;
+        return origFetch.apply(this, arguments).finally(function () {
+            state.pending = Math.max(0, state.pending - 1);
+        });
+    };
+}
+new MutationObserver(function () { state.lastMutation = Date.now(); })
+    .observe(document.documentElement, {childList: true, subtree: true, attributes: true, characterData: true});
+return true;
+"""
+
+_STATE_JS = _INSTALL_HOOKS_JS.replace(
+    "if (window.__gxWait) { return false; }",
+    "if (window.__gxWait) { var s = window.__gxWait; return [document.readyState, s.pending, Date.now() - s.lastMutation]; }",
+).replace(
+    "return true;",
+    "return [document.readyState, 0, 0];",
+)
+
+
+def arm_page_idle(driver):
+    """
+    Instala los hooks antes de la acción que dispara el AJAX, para que el XHR que sale
+    inmediatamente después del click quede contado. Es opcional: wait_for_page_idle
+    también los instala si faltan (por ejemplo tras un submit que recargó la página).
+    """
+    try:
+        driver.execute_script(_INSTALL_HOOKS_JS)
+    except WebDriverException as e:
+        logger.debug(f"[waits] No pude instalar hooks: {e}")
+
+
+def wait_for_page_idle(driver, timeout=5, quiet_ms=150, poll=0.05):
+    """
+    Espera hasta que el documento esté cargado, no haya XHR/fetch pendientes y el DOM
+    lleve quiet_ms sin mutar. Devuelve True si se alcanzó ese estado, False en timeout
+    (no lanza: los llamadores siguen como antes con los sleeps fijos).
+    """
+    start = time.time()
+
+    def idle(d):
+        try:
+            ready, pending, quiet = d.execute_script(_STATE_JS)
+        except WebDriverException:
+            # Navegación en curso: el contexto de JS cambió, seguimos esperando
+            return False
+        return ready == "complete" and pending == 0 and quiet >= quiet_ms
+
+    try:
+        with span("page_idle"):
+            WebDriverWait(driver, timeout, poll_frequency=poll).until(idle)
+        logger.debug(f"[waits] Página lista en {time.time() - start:.2f}s")
+        return True
+    except TimeoutException:
+        logger.warning(f"[waits] La página no quedó quieta en {timeout}s. Sigo igual.")
+        return False
+
+
+def wait_for_field_value(driver, field_id, predicate, timeout=5, poll=0.05):
+    """
+    Espera hasta que predicate(value) sea verdadero para el campo field_id, re-buscándolo
+    en cada poll (sobrevive a recargas de GeneXus). Devuelve el último valor leído.
+    """
+    last = {"value": None}
+
+    def check(d):
+        try:
+            last["value"] = d.execute_script(
+                "var el = document.getElementById(arguments[0]); return el ? el.value : null;", field_id
+            )
+        except WebDriverException:
+            return False
+        return predicate(last["value"])
+
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=poll).until(check)
+    except TimeoutException:
+        pass
+    return last["value"]
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Resultado de "Agregar": ErrorViewer vs. fila agregada / campos reseteados
+# ──────────────────────────────────────────────────────────────────────────────
+
+_MARK_SUBMIT_JS = """
+var field = arguments[0] ? document.getElementById(arguments[0]) : null;
+document.querySelectorAll('span.ErrorViewer').forEach(function (s) { s.setAttribute('data-gx-seen', '1'); });
+window.__gxSubmitMark = {
+    rows: document.getElementsByTagName('tr').length,
+    field: arguments[0],
+    value: field ? field.value : null
+};
+"""
+
+_SUBMIT_OUTCOME_JS = """
+var errors = Array.prototype.filter.call(document.querySelectorAll('span.ErrorViewer'), function (s) {
+    return !s.hasAttribute('data-gx-seen') && s.textContent.trim();
+});
+if (errors.length) {
+    return ['error', errors.map(function (s) { return s.textContent.trim(); }).join(' | ')];
+}
+if (document.readyState !== 'complete') { return null; }
+var mark = window.__gxSubmitMark;
+if (!mark) { return ['added', 'page reloaded']; }
+if (document.getElementsByTagName('tr').length > mark.rows) { return ['added', 'grid row added']; }
+if (mark.field && mark.value && mark.value !== '0') {
+    var field = document.getElementById(mark.field);
+    if (field && (field.value === '' || field.value === '0')) { return ['added', mark.field + ' reset']; }
+}
+return null;
+"""
+
+
+def mark_submit(driver, reset_field_id=None):
+    """
+    Toma la foto "antes" de clickear Agregar: marca los ErrorViewer ya visibles (para no
+    confundirlos con uno nuevo), cuenta filas y guarda el valor del campo que GeneXus
+    vacía cuando la fila se agrega. Vacía además la cache de locators: después del
+    submit GeneXus recarga el formulario.
+    """
+    invalidate(driver)
+    try:
+        driver.execute_script(_MARK_SUBMIT_JS, reset_field_id)
+    except WebDriverException as e:
+        logger.debug(f"[waits] No pude marcar el estado previo al submit: {e}")
+
+
+def wait_for_submit_outcome(driver, timeout=2, poll=0.05):
+    """
+    Corre "apareció un ErrorViewer" contra "se agregó la fila / se resetearon los campos"
+    y vuelve apenas ocurre cualquiera de los dos. Devuelve un dict:
+      - "outcome": "error", "added" o "timeout"
+      - "message": texto del ErrorViewer o la señal de éxito observada
+      - "elapsed": segundos que tomó
+    """
+    start = time.time()
+    result = {}
+
+    def check(d):
+        try:
+            found = d.execute_script(_SUBMIT_OUTCOME_JS)
+        except WebDriverException:
+            return False
+        if found:
+            result["outcome"], result["message"] = found
+            return True
+        return False
+
+    try:
+        with span("error_viewer_wait"):
+            WebDriverWait(driver, timeout, poll_frequency=poll).until(check)
+    except TimeoutException:
+        result = {"outcome": "timeout", "message": f"sin ErrorViewer ni fila nueva en {timeout}s"}
+    result["elapsed"] = round(time.time() - start, 3)
+    return result
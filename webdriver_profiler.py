@@ -0,0 +1,201 @@
+import os
+import sys
+import time
+import glob
+import logging
+import argparse
+import threading
+from contextlib import contextmanager
+
+# Set up logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+# Profiler de comandos WebDriver. Con WEBDRIVER_PROFILE=on, create_driver envuelve
+# driver.execute: por ahí pasan todos los round-trips (find_element, send_keys,
+# get_attribute, is_selected, ActionChains.perform, execute_script...). Cada comando se
+# registra con su duración, el call site (primer frame de nuestro código), el fill_form_*
+# que lo originó y la observación en curso (variable observation_id / obs_id del filler).
+#
+# Al terminar cada bucket se loguea un ranking de hotspots y se escribe un archivo
+# "folded" (formato de flamegraph.pl / speedscope, peso en microsegundos) en
+# WEBDRIVER_PROFILE_DIR. Para rankear varios buckets juntos:
+#
+#   python webdriver_profiler.py /tmp/webdriver-profile --top 30
+_enabled = os.environ.get("WEBDRIVER_PROFILE", "off") == "on"
+PROFILE_DIR = os.environ.get("WEBDRIVER_PROFILE_DIR", "/tmp/webdriver-profile")
+TOP = int(os.environ.get("WEBDRIVER_PROFILE_TOP", "15"))
+
+_REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+_THIS_FILE = os.path.abspath(__file__)
+# Variables con el id de la observación en curso en cada filler
+_OBSERVATION_VARS = ("observation_id", "obs_id")
+
+_local = threading.local()
+
+
+def profiler_enabled():
+    return _enabled
+
+
+class BucketProfile:
+    """Comandos de un bucket agregados por call site, formulario, observación y stack."""
+
+    def __init__(self, bucket_id):
+        self.bucket_id = bucket_id
+        self.commands = 0
+        self.seconds = 0.0
+        self.by_site = {}
+        self.by_form = {}
+        self.by_observation = {}
+        self.folded = {}
+
+    @staticmethod
+    def _add(table, key, seconds):
+        entry = table.get(key)
+        if entry is None:
+            table[key] = [1, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+
+    def record(self, command, seconds, frame):
+        stack, form, observation = _inspect_stack(frame)
+        site = stack[-1] if stack else "?"
+        self.commands += 1
+        self.seconds += seconds
+        self._add(self.by_site, (form, site, command), seconds)
+        self._add(self.by_form, form, seconds)
+        if observation is not None:
+            self._add(self.by_observation, (form, str(observation)), seconds)
+        folded = ";".join(stack + [command])
+        self.folded[folded] = self.folded.get(folded, 0.0) + seconds
+
+    def report(self, top=TOP):
+        lines = [f"[wdprof] bucket {self.bucket_id}: {self.commands} comandos WebDriver en {self.seconds:.2f}s"]
+        lines.append("  por formulario: " + ", ".join(
+            f"{form} {count} ({seconds:.2f}s)" for form, (count, seconds) in _ranked(self.by_form)
+        ))
+        for (form, observation), (count, seconds) in _ranked(self.by_observation)[:top]:
+            lines.append(f"  obs {observation} [{form}]: {count} comandos, {seconds:.2f}s")
+        for (form, site, command), (count, seconds) in _ranked(self.by_site)[:top]:
+            lines.append(f"  {count:5d}x {seconds:7.2f}s  {command:<24} {site} [{form}]")
+        return "\n".join(lines)
+
+    def write_folded(self, directory=PROFILE_DIR):
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{self.bucket_id}.folded")
+        with open(path, "w") as f:
+            for stack, seconds in sorted(self.folded.items()):
+                f.write(f"{stack} {int(seconds * 1e6)}\n")
+        return path
+
+
+def _ranked(table):
+    return sorted(table.items(), key=lambda item: item[1][1], reverse=True)
+
+
+def _inspect_stack(frame):
+    """(frames de nuestro código de afuera hacia adentro, fill_form_* de origen, observación en curso)."""
+    stack = []
+    form = "other"
+    observation = None
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename != _THIS_FILE and os.path.dirname(os.path.abspath(filename)) == _REPO_DIR:
+            module = os.path.splitext(os.path.basename(filename))[0]
+            stack.append(f"{module}.{frame.f_code.co_name}:{frame.f_lineno}")
+            if form == "other" and module.startswith("fill_form_"):
+                form = module
+                for name in _OBSERVATION_VARS:
+                    if name in frame.f_locals:
+                        observation = frame.f_locals[name]
+                        break
+            elif form == "other" and module in ("submit", "login", "session_manager"):
+                form = module
+        frame = frame.f_back
+    stack.reverse()
+    return stack, form, observation
+
+
+def install_profiler(driver):
+    """Envuelve driver.execute para registrar cada comando en el perfil del bucket en curso."""
+    if not _enabled or getattr(driver, "_wdprof_installed", False):
+        return driver
+    original = driver.execute
+
+    def execute(driver_command, params=None):
+        profile = getattr(_local, "profile", None)
+        if profile is None:
+            return original(driver_command, params)
+        start = time.perf_counter()
+        try:
+            return original(driver_command, params)
+        finally:
+            profile.record(driver_command, time.perf_counter() - start, sys._getframe(1))
+
+    # WebElement y ActionChains llaman a parent.execute: con el atributo de instancia alcanza
+    driver.execute = execute
+    driver._wdprof_installed = True
+    return driver
+
+
+@contextmanager
+def profile_bucket(bucket_id):
+    """Perfila los comandos de este hilo mientras dura el bloque; al salir loguea y escribe el folded."""
+    if not _enabled:
+        yield None
+        return
+    profile = BucketProfile(bucket_id)
+    previous = getattr(_local, "profile", None)
+    _local.profile = profile
+    try:
+        yield profile
+    finally:
+        _local.profile = previous
+        if profile.commands:
+            logger.info(profile.report())
+            try:
+                logger.info(f"[wdprof] Stacks en {profile.write_folded()}")
+            except OSError as e:
+                logger.warning(f"[wdprof] No pude escribir el folded: {e}")
+
+
+def rank_folded(paths, top=30):
+    """Suma varios archivos folded y devuelve [(call site;comando, microsegundos, cantidad de buckets)]."""
+    totals = {}
+    for path in paths:
+        seen = set()
+        with open(path) as f:
+            for line in f:
+                stack, _, weight = line.rstrip("\n").rpartition(" ")
+                frames = stack.split(";")
+                key = ";".join(frames[-2:])
+                entry = totals.setdefault(key, [0, 0])
+                entry[0] += int(weight)
+                if key not in seen:
+                    entry[1] += 1
+                    seen.add(key)
+    ranked = sorted(totals.items(), key=lambda item: item[1][0], reverse=True)
+    return [(key, micros, buckets) for key, (micros, buckets) in ranked[:top]]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ranking de hotspots WebDriver a partir de los archivos folded.")
+    parser.add_argument("directory", nargs="?", default=PROFILE_DIR)
+    parser.add_argument("--top", type=int, default=30)
+    args = parser.parse_args(argv)
+
+    paths = sorted(glob.glob(os.path.join(args.directory, "*.folded")))
+    if not paths:
+        print(f"No hay archivos .folded en {args.directory}")
+        return 1
+    print(f"{len(paths)} buckets")
+    for key, micros, buckets in rank_folded(paths, args.top):
+        print(f"{micros / 1e6:9.2f}s  {buckets:4d} buckets  {key}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,186 @@
+import os
+import sys
+import json
+import queue
+import signal
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from aws_clients import get_client
+from mongo import get_mongo_client
+from indexes import ensure_indexes_once
+from notify_error import notify_error, flush_notifications
+from session_manager import DriverSession
+from lambda_function import process_record
+
+# Set up logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+# Modo worker: un contenedor de larga vida que consume SQS directo y procesa varios
+# buckets en paralelo, cada uno en su propio Chrome (DriverSession). Reusa
+# process_record de la Lambda, así el despacho por bucket_type es el mismo.
+#
+#   python worker.py --queue-url https://sqs.../cola --workers 4
+#
+# Las descargas no chocan entre workers: cada talón baja a su propio directorio
+# (downloads.create_download_dir) configurado en el Chrome de ese worker.
+#
+# Un bucket tarda minutos; para que SQS no vuelva a entregar un mensaje que sigue en
+# proceso (y otro slot lo mande de nuevo a DGR), un hilo de heartbeat extiende la
+# visibilidad de los mensajes en curso cada visibility_timeout / 3 segundos.
+
+
+class _Slot:
+    """Estado aislado de un worker: su DriverSession y el último driver que devolvió."""
+
+    def __init__(self, index):
+        self.index = index
+        self.session = DriverSession()
+        self.driver = None
+
+
+def default_workers():
+    return int(os.environ.get("WORKER_CONCURRENCY", os.cpu_count() or 1))
+
+
+def default_visibility_timeout():
+    return int(os.environ.get("WORKER_VISIBILITY_TIMEOUT", "120"))
+
+
+class Worker:
+    def __init__(self, queue_url, workers, wait_seconds=20, visibility_timeout=None):
+        self.queue_url = queue_url
+        self.workers = workers
+        self.wait_seconds = wait_seconds
+        self.visibility_timeout = visibility_timeout or default_visibility_timeout()
+        self.stopping = threading.Event()
+        # Se setea cuando el pool terminó los buckets en curso: ahí para el heartbeat
+        self.drained = threading.Event()
+        # ReceiptHandle -> MessageId de los mensajes que se están procesando
+        self.in_flight = {}
+        self.in_flight_lock = threading.Lock()
+        # Pool acotado: un record solo arranca cuando hay un slot (un Chrome) libre
+        self.slots = queue.Queue()
+        for i in range(workers):
+            self.slots.put(_Slot(i))
+
+    def run(self):
+        db = get_mongo_client()['production']
+        ensure_indexes_once(db)
+        sqs = get_client('sqs')
+        logger.info(f"[worker] Consumiendo {self.queue_url} con {self.workers} workers "
+                    f"(visibilidad {self.visibility_timeout}s con heartbeat).")
+        heartbeat = threading.Thread(target=self._heartbeat, args=(sqs,), name="heartbeat", daemon=True)
+        heartbeat.start()
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bucket") as pool:
+            while not self.stopping.is_set():
+                free = self.slots.qsize()
+                if free == 0:
+                    # Todos ocupados: espero a que se libere uno antes de pedir más mensajes
+                    slot = self.slots.get()
+                    self.slots.put(slot)
+                    continue
+                params = {
+                    "QueueUrl": self.queue_url,
+                    "MaxNumberOfMessages": min(10, free),
+                    "WaitTimeSeconds": self.wait_seconds,
+                    "VisibilityTimeout": self.visibility_timeout,
+                }
+                try:
+                    messages = sqs.receive_message(**params).get("Messages", [])
+                except Exception as e:
+                    logger.error(f"[worker] Error leyendo SQS: {e}")
+                    self.stopping.wait(5)
+                    continue
+                # Desde que se reciben (aunque esperen un slot libre) el heartbeat los mantiene ocultos
+                with self.in_flight_lock:
+                    for message in messages:
+                        self.in_flight[message["ReceiptHandle"]] = message.get("MessageId")
+                for message in messages:
+                    slot = self.slots.get()
+                    pool.submit(self._handle, slot, message, db, sqs)
+
+        self.drained.set()
+        heartbeat.join()
+        self._shutdown()
+
+    def _heartbeat(self, sqs):
+        """Extiende la visibilidad de los mensajes en curso hasta que el pool termina."""
+        interval = max(1, self.visibility_timeout // 3)
+        while not self.drained.wait(interval):
+            with self.in_flight_lock:
+                in_flight = list(self.in_flight.items())
+            for receipt_handle, message_id in in_flight:
+                try:
+                    sqs.change_message_visibility(
+                        QueueUrl=self.queue_url,
+                        ReceiptHandle=receipt_handle,
+                        VisibilityTimeout=self.visibility_timeout,
+                    )
+                except Exception as e:
+                    logger.warning(f"[worker] No pude extender la visibilidad de {message_id}: {e}")
+
+    def _handle(self, slot, message, db, sqs):
+        try:
+            try:
+                payload = json.loads(message["Body"])
+            except Exception as e:
+                notify_error(f"No pude parsear el body del mensaje {message.get('MessageId')} como JSON: {e}")
+                resp = {"statusCode": 400}
+            else:
+                resp, slot.driver = process_record(payload, get_mongo_client(), db, slot.driver, session=slot.session)
+
+            status = resp.get("statusCode", 500)
+            logger.info(f"[worker {slot.index}] messageId={message.get('MessageId')} statusCode={status}")
+            # Igual que batchItemFailures: solo los 5xx se dejan para que SQS los reintente
+            if status < 500:
+                sqs.delete_message(QueueUrl=self.queue_url, ReceiptHandle=message["ReceiptHandle"])
+        except Exception as e:
+            logger.error(f"[worker {slot.index}] Error inesperado: {e}")
+            notify_error(f"Error inesperado en worker {slot.index}: {e}")
+            slot.session.discard()
+            slot.driver = None
+        finally:
+            with self.in_flight_lock:
+                self.in_flight.pop(message["ReceiptHandle"], None)
+            self.slots.put(slot)
+
+    def stop(self, *_):
+        logger.info("[worker] Deteniendo: termino los buckets en curso y salgo.")
+        self.stopping.set()
+
+    def _shutdown(self):
+        while not self.slots.empty():
+            self.slots.get().session.discard()
+        flush_notifications()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Consume SQS y procesa buckets en paralelo.")
+    parser.add_argument("--queue-url", default=os.environ.get("WORKER_QUEUE_URL"), help="cola de entrada")
+    parser.add_argument("--workers", type=int, default=default_workers(),
+                        help="Chrome en paralelo (default: WORKER_CONCURRENCY o la cantidad de CPUs)")
+    parser.add_argument("--wait-seconds", type=int, default=20, help="long polling de SQS")
+    parser.add_argument("--visibility-timeout", type=int, default=default_visibility_timeout(),
+                        help="visibilidad que se pide y se renueva por heartbeat mientras un mensaje "
+                             "se procesa (default: WORKER_VISIBILITY_TIMEOUT o 120)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(threadName)s %(message)s")
+
+    if not args.queue_url:
+        parser.error("falta --queue-url (o WORKER_QUEUE_URL)")
+
+    worker = Worker(args.queue_url, args.workers, args.wait_seconds, args.visibility_timeout)
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    worker.run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())